@@ -7,6 +7,9 @@
 
 Command::Command(Stream* _port) {
   port = _port;
+  status_seq = 0;
+  status_stream_interval = 0;
+  status_stream_last = 0;
   cmd = new SerialCommand(port);
   cmd->addCommand("set_var", [this] () -> void { this->command_set_var();});
   cmd->addCommand("ra_set_speed", [this] () { this->command_ra_set_speed(); } );
@@ -15,6 +18,8 @@ Command::Command(Stream* _port) {
   cmd->addCommand("autoguide_enable", [this] () { this->command_autoguide_enable(); });
   cmd->addCommand("status", [this] () { this->command_status(); });
   cmd->addCommand("qs", [this] () { this->command_qs(); });
+  cmd->addCommand("qsb", [this] () { this->command_qsb(); });
+  cmd->addCommand("qs_stream", [this] () { this->command_qs_stream(); });
   cmd->setDefaultHandler([this] (const char *cmd) -> void { this->command_help(cmd); });
   print_prompt();
 }
@@ -142,6 +147,65 @@ void Command::command_qs() {
   print_prompt();
 }
 
+static uint16_t fletcher16(const uint8_t *data, size_t len) {
+  uint16_t sum1 = 0;
+  uint16_t sum2 = 0;
+  for (size_t i = 0; i < len; i++) {
+    sum1 = (sum1 + data[i]) % 255;
+    sum2 = (sum2 + sum1) % 255;
+  }
+  return (sum2 << 8) | sum1;
+}
+
+void Command::write_status_frame() {
+  uint8_t frame[3 + sizeof(status_frame_body_t) + 2];
+  status_frame_body_t body;
+  stepper_encoder_t raEnc, decEnc;
+  uint16_t checksum;
+
+  body.seq = status_seq++;
+  body.rs = raStepper->getSpeed();
+  body.ds = decStepper->getSpeed();
+  body.rp = raStepper->getPosition();
+  body.dp = decStepper->getPosition();
+  raStepper->getEncoder(raEnc);
+  decStepper->getEncoder(decEnc);
+  body.re = raEnc.value;
+  body.de = decEnc.value;
+  body.ri = raEnc.steps_in_pulse;
+  body.di = decEnc.steps_in_pulse;
+  body.rl = raEnc.prev_steps_in_pulse;
+  body.dl = decEnc.prev_steps_in_pulse;
+
+  frame[0] = STATUS_FRAME_MAGIC1;
+  frame[1] = STATUS_FRAME_MAGIC2;
+  frame[2] = sizeof(status_frame_body_t);
+  memcpy(frame + 3, &body, sizeof(status_frame_body_t));
+  checksum = fletcher16(frame + 2, 1 + sizeof(status_frame_body_t));
+  frame[3 + sizeof(status_frame_body_t)] = checksum & 0xFF;
+  frame[4 + sizeof(status_frame_body_t)] = checksum >> 8;
+  port->write(frame, sizeof(frame));
+}
+
+void Command::command_qsb() {
+  write_status_frame();
+  print_prompt();
+}
+
+void Command::command_qs_stream() {
+  char *argVal;
+
+  argVal = cmd->next();
+  if (argVal == NULL) {
+    port->println("ERROR: Missing [ms] argument.");
+    print_prompt();
+    return;
+  }
+  status_stream_interval = atol(argVal);
+  status_stream_last = millis();
+  print_prompt();
+}
+
 void Command::command_status() {
   long raPos, decPos;
   stepper_encoder_t raEnc, decEnc;
@@ -279,6 +343,8 @@ void Command::command_help(const char *cmd) {
     "  autoguide_enable             Enables Autoguiding prot input");
   port->println("  status                       Shows status/variable info");
   port->println("  qs                           Shows speed/position info");
+  port->println("  qsb                          Binary speed/position frame");
+  port->println("  qs_stream [ms]               Push qsb frames every ms, 0 stops");
   port->println("  help                         This help info");
   print_prompt();
 }
@@ -297,4 +363,8 @@ void Command::command_autoguide_enable() {
 
 void Command::read() {
   cmd->readSerial();
+  if (status_stream_interval > 0 && millis() - status_stream_last >= status_stream_interval) {
+    status_stream_last = millis();
+    write_status_frame();
+  }
 }
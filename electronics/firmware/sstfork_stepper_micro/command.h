@@ -3,6 +3,25 @@
 
 #include "SerialCommand.h"
 
+// Binary status frame sent by qsb and qs_stream, all little endian:
+//   0xA5 0x5A, length of body, body, fletcher16 checksum of length and body.
+static const uint8_t STATUS_FRAME_MAGIC1 = 0xA5;
+static const uint8_t STATUS_FRAME_MAGIC2 = 0x5A;
+
+struct __attribute__((packed)) status_frame_body_t {
+  uint16_t seq;
+  float rs;
+  float ds;
+  int32_t rp;
+  int32_t dp;
+  int32_t re;
+  int32_t de;
+  int32_t ri;
+  int32_t di;
+  int32_t rl;
+  int32_t dl;
+};
+
 class Command {
 public:
   Command(Stream* _port);
@@ -16,10 +35,16 @@ private:
   void command_autoguide_enable();
   void command_status();
   void command_qs();
+  void command_qsb();
+  void command_qs_stream();
+  void write_status_frame();
   void command_help(const char *cmd);
   void print_prompt();
   Stream* port;
   SerialCommand* cmd;
+  uint16_t status_seq;
+  unsigned long status_stream_interval;
+  unsigned long status_stream_last;
 };
 
 #endif
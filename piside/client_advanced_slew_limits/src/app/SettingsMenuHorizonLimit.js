@@ -41,6 +41,7 @@ class SettingsMenuHorizonLimit {
             this._graph.points = pcopy;
         });
 
+        const belowHorizon = $('#horizonLimitCurrentBelow', this._selfDiv);
         const doStatus = () => {
             $.ajax({
                 url: '/api/status',
@@ -49,6 +50,7 @@ class SettingsMenuHorizonLimit {
                     if (status.hasOwnProperty('alt') && status.alt) {
                         this._lastAltAz = {alt: status.alt, az: status.az};
                     }
+                    belowHorizon.toggle(!!status.below_horizon);
                 },
                 error: (jq, errorstatus, errortxt) => {
                     console.error(errorstatus, errortxt, jq.responseText);
@@ -28,7 +28,12 @@ class ObjectSearch extends React.Component {
     rowClicked(event, index) {
         const result = state.goto.object_search.results[index];
         state.goto.objectdialog.all_frames = null;
-        state.goto.objectdialog.wanted_coord = {frame: 'icrs', ra: result['ra'], dec: result['dec']}
+        const wanted_coord = {frame: 'icrs', ra: result['ra'], dec: result['dec']};
+        if (result.type === 'planet') {
+            // Server follows the planet's own motion when slewing
+            wanted_coord.body = result.name.toLowerCase();
+        }
+        state.goto.objectdialog.wanted_coord = wanted_coord;
         if (result.type !== 'planet') {
             state.goto.objectdialog.mag = result['mag'];
         } else {
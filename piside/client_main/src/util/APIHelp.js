@@ -144,34 +144,64 @@ function getCordConversions(wanted_coord) {
 
 const APIHelp = {
     statusUpdate: function () {
-        return getStatus().then(mobxaction((s) => {
-            Object.keys(s).forEach((key) => {
-                if (state.status[key] !== s[key]) {
-                    state.status[key] = s[key];
-                }
-            });
-        })).catch(mobxaction((e) => {
+        return getStatus().then((s) => {
+            this.applyStatus(s);
+        }).catch(mobxaction((e) => {
             console.error('Failed to get status.', e);
             state.snack_bar = 'Error: Failed to get status, check network';
             state.snack_bar_error = true;
         }));
     },
 
+    applyStatus: mobxaction((s) => {
+        Object.keys(s).forEach((key) => {
+            if (state.status[key] !== s[key]) {
+                state.status[key] = s[key];
+            }
+        });
+    }),
+
+    startStatusStream: function () {
+        if (!window.EventSource) {
+            return false;
+        }
+        const source = new EventSource('/api/status_stream?interval=' + (STATUS_DELAY / 1000.0) + '&client_id=' + state.client_id);
+        source.addEventListener('status', (e) => {
+            this.applyStatus(JSON.parse(e.data).status);
+        });
+        source.onerror = mobxaction((e) => {
+            if (source.readyState === EventSource.CLOSED) {
+                console.error('Status stream closed, polling instead.', e);
+                this.startStatusPolling();
+            } else {
+                state.snack_bar = 'Error: Failed to get status, check network';
+                state.snack_bar_error = true;
+            }
+        });
+        return true;
+    },
+
     startStatusUpdateInterval: function () {
         console.log('this', this);
         if (!statusUpdateIntervalStarted) {
             statusUpdateIntervalStarted = true;
-            const f = () => {
-                this.statusUpdate().finally(() => {
-                    setTimeout(() => {
-                        f();
-                    }, STATUS_DELAY)
-                })
-            };
-            f();
+            if (!this.startStatusStream()) {
+                this.startStatusPolling();
+            }
         }
     },
 
+    startStatusPolling: function () {
+        const f = () => {
+            this.statusUpdate().finally(() => {
+                setTimeout(() => {
+                    f();
+                }, STATUS_DELAY)
+            })
+        };
+        f();
+    },
+
     startSettingsUpdateInterval: function () {
         if (!settingsUpdateIntervalStarted) {
             settingsUpdateIntervalStarted = true;
@@ -107,27 +107,82 @@ def affine_fit(from_pts, to_pts):
     return Transformation()
 
 
+# Fits with a larger condition number are treated as singular, the points are nearly collinear.
+MAX_CONDITION = 1e10
+
+
+class AffineTransform:
+    """
+    Affine transformation from affine_fit_np, has the same To_Str and Transform as affine_fit results and transform
+    for arrays of points.
+    """
+
+    def __init__(self, matrix):
+        """
+        :param matrix: (dim + 1) x dim matrix, pt' = [pt, 1] . matrix
+        :type matrix: numpy.ndarray
+        """
+        self.matrix = matrix
+        self.dim = matrix.shape[1]
+
+    def To_Str(self):
+        res = ""
+        for j in range(self.dim):
+            str = "x%d' = " % j
+            for i in range(self.dim):
+                str += "x%d * %f + " % (i, self.matrix[i][j])
+            str += "%f" % self.matrix[self.dim][j]
+            res += str + "\n"
+        return res
+
+    def Transform(self, pt):
+        res = [0.0 for a in range(self.dim)]
+        for j in range(self.dim):
+            for i in range(self.dim):
+                res[j] += pt[i] * self.matrix[i][j]
+            res[j] += self.matrix[self.dim][j]
+        return res
+
+    def transform(self, pts):
+        """
+        :param pts: n x dim array of points
+        :type pts: numpy.ndarray
+        :return: n x dim array of transformed points
+        :rtype: numpy.ndarray
+        """
+        pts = np.asarray(pts, dtype=float)
+        return np.dot(pts, self.matrix[: self.dim]) + self.matrix[self.dim]
+
+
 def affine_fit_np(from_npa, to_mpa):
     """
-    Create affine transfrom from data using least squares.
+    Same fit as affine_fit with a numpy least squares solve.
     Based from hunse's answer in
     https://stackoverflow.com/questions/20546182/how-to-perform-coordinates-affine-transformation-using-python-part-2
     :param from_npa: Array of starting coordinates
+    :type from_npa: numpy.ndarray
     :param to_mpa: Array of wanted end coordinates that match from_npa
-    :return: transform, A - transform function and matrix A transform is based on.
+    :type to_mpa: numpy.ndarray
+    :return: The transform or False if points don't determine one.
+    :rtype: Union[AffineTransform, bool]
     """
+    from_npa = np.asarray(from_npa, dtype=float)
+    to_mpa = np.asarray(to_mpa, dtype=float)
+    if from_npa.shape != to_mpa.shape or from_npa.shape[0] < 1:
+        print("from_pts and to_pts must be of same size.")
+        return False
+    dim = from_npa.shape[1]
+    if from_npa.shape[0] < dim:
+        print("Too few points => under-determined system.")
+        return False
 
     # Pad the data with ones, so that our transformation can do translations too
-    n = from_npa.shape[0]
-    pad = lambda x: np.hstack([x, np.ones((x.shape[0], 1))])
-    unpad = lambda x: x[:, :-1]
-    X = pad(from_npa)
-    Y = pad(to_mpa)
+    X = np.hstack([from_npa, np.ones((from_npa.shape[0], 1))])
 
-    # Solve the least squares problem X * A = Y
-    # to find our transformation matrix A
-    A, res, rank, s = np.linalg.lstsq(X, Y)
-
-    transform = lambda x: unpad(np.dot(pad(x), A))
-
-    return transform, A
+    # Solve the least squares problem X * D = Y - X for the difference from identity, small when the model is
+    # close to no change and exactly zero with no change.
+    D, res, rank, s = np.linalg.lstsq(X, to_mpa - from_npa, rcond=None)
+    if rank < dim + 1 or s[0] > MAX_CONDITION * s[-1]:
+        print("Error: singular matrix. Points are probably coplanar.")
+        return False
+    return AffineTransform(D + np.vstack([np.identity(dim), np.zeros((1, dim))]))
@@ -0,0 +1,491 @@
+"""
+Times coordinate conversions, pointing models, LX200 command handling, db searches and send_status and saves the
+results as JSON so runs can be compared between versions.
+
+    python benchmark.py [--output results.json] [--compare old_results.json] [--label fw-1.2]
+                        [--port /dev/ttyACM0 | --vmc] [--only skyconv,pointing_model] [--repeat 5]
+
+send_status needs a microcontroller, either a serial port running the firmware or simulator with --port, or --vmc to
+start the virtual motor controller. It is skipped otherwise. db searches need ssteq.sqlite made with sql/makedb.notes
+and are skipped if its tables aren't there. Each benchmark runs its function enough times to take --min-time seconds,
+repeat times, and reports seconds per call.
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import pickle
+import platform
+import sqlite3
+import statistics
+import sys
+import time
+import traceback
+
+import astropy
+import astropy.units as u
+import numpy
+import pendulum
+from astropy.coordinates import AltAz, EarthLocation, ICRS, TETE
+from astropy.time import Time as AstroTime
+
+import affine_fit
+import control
+import lx200_benchmark
+import metrics
+import pointing_model
+import settings
+import sky_index
+import skyconv
+import target_ephemeris
+from skyconv_hadec import HADec
+
+FORMAT_VERSION = 1
+FRAMES = ('icrs', 'tete', 'altaz', 'hadec')
+# Fixed time and place so runs are comparable, same as the unit tests.
+EARTH_LOCATION = EarthLocation(lat=38.9369 * u.deg, lon=-95.242 * u.deg, height=266.0 * u.m)
+OBSTIME = AstroTime(pendulum.parse("2019-07-18T05:35:23.053Z"))
+# M75
+SYNC_ICRS = ICRS(ra=301.52017083 * u.deg, dec=-21.92226111 * u.deg)
+DB_FILE = 'ssteq.sqlite'
+DB_TABLES = {'dso', 'stars', 'uscities'}
+
+benchmarks = []
+
+
+def benchmark(group, name, needs_stepper=False, needs_db=False):
+    """
+    Registers a setup function that returns the function to time.
+    :param group: Group name for --only
+    :type group: str
+    :param name: Benchmark name, unique in group
+    :type name: str
+    :param needs_stepper: If it needs control.stepper
+    :type needs_stepper: bool
+    :param needs_db: If it needs the DB_TABLES in DB_FILE
+    :type needs_db: bool
+    """
+
+    def decorator(setup):
+        benchmarks.append({'group': group, 'name': name, 'setup': setup, 'needs_stepper': needs_stepper,
+                           'needs_db': needs_db})
+        return setup
+
+    return decorator
+
+
+def setup_sky():
+    settings.runtime_settings['earth_location'] = EARTH_LOCATION
+    settings.settings['ra_ticks_per_degree'] = 450
+    settings.settings['dec_ticks_per_degree'] = 200
+    settings.settings['pointing_model'] = 'single'
+    hadec = skyconv.to_hadec(SYNC_ICRS, obstime=OBSTIME)
+    settings.runtime_settings['sync_info'] = {'coord': hadec, 'steps': {'ha': 0, 'dec': 0}}
+    skyconv.model_real_stepper = pointing_model.PointingModelBuie()
+
+
+def frame_coord(frame):
+    """
+    :return: SYNC_ICRS offset a bit in the frame
+    """
+    hadec = skyconv.to_hadec(SYNC_ICRS, obstime=OBSTIME)
+    if frame == 'icrs':
+        return ICRS(ra=(SYNC_ICRS.ra.deg + 1.0) * u.deg, dec=(SYNC_ICRS.dec.deg + 1.0) * u.deg)
+    elif frame == 'tete':
+        tete = skyconv.to_tete(SYNC_ICRS, obstime=OBSTIME)
+        return TETE(ra=(tete.ra.deg + 1.0) * u.deg, dec=(tete.dec.deg + 1.0) * u.deg,
+                    **skyconv.get_frame_init_args('tete', obstime=OBSTIME))
+    elif frame == 'altaz':
+        altaz = skyconv.to_altaz(SYNC_ICRS, obstime=OBSTIME)
+        return AltAz(alt=(altaz.alt.deg + 1.0) * u.deg, az=(altaz.az.deg + 1.0) * u.deg,
+                     **skyconv.get_frame_init_args('altaz', obstime=OBSTIME))
+    return HADec(ha=(hadec.ha.deg + 1.0) * u.deg, dec=(hadec.dec.deg + 1.0) * u.deg,
+                 **skyconv.get_frame_init_args('hadec', obstime=OBSTIME))
+
+
+def _register_skyconv():
+    for frame in FRAMES:
+        def to_steps_setup(frame=frame):
+            setup_sky()
+            coord = frame_coord(frame)
+            return lambda: skyconv.to_steps(coord, obstime=OBSTIME)
+
+        def steps_to_coord_setup(frame=frame):
+            setup_sky()
+            return lambda: skyconv.steps_to_coord({'ha': 450, 'dec': 200}, frame=frame, obstime=OBSTIME)
+
+        benchmark('skyconv', 'to_steps_' + frame)(to_steps_setup)
+        benchmark('skyconv', 'steps_to_coord_' + frame)(steps_to_coord_setup)
+
+
+_register_skyconv()
+
+
+@benchmark('skyconv', 'to_steps_altaz_array_100')
+def setup_to_steps_array():
+    setup_sky()
+    altaz = skyconv.to_altaz(SYNC_ICRS, obstime=OBSTIME)
+    offsets = numpy.linspace(-10.0, 10.0, 100)
+    coords = AltAz(alt=(altaz.alt.deg + offsets) * u.deg, az=(altaz.az.deg + offsets) * u.deg,
+                   **skyconv.get_frame_init_args('altaz', obstime=OBSTIME))
+    return lambda: skyconv.to_steps(coords, obstime=OBSTIME)
+
+
+@benchmark('skyconv', 'target_ephemeris_fit')
+def setup_target_ephemeris_fit():
+    setup_sky()
+    return lambda: target_ephemeris.TargetEphemeris.from_coord(SYNC_ICRS, obstime=OBSTIME)
+
+
+@benchmark('skyconv', 'target_ephemeris_steps')
+def setup_target_ephemeris_steps():
+    setup_sky()
+    ephemeris = target_ephemeris.TargetEphemeris.from_coord(SYNC_ICRS, obstime=OBSTIME)
+    return lambda: ephemeris.steps(ephemeris.start + 12.5)
+
+
+def model_points(frame, count=10):
+    """
+    :return: sync, stepper point pairs with a small rotation and scale error.
+    :rtype: List[Tuple[Union[HADec, AltAz], Union[HADec, AltAz]]]
+    """
+    points = []
+    for i in range(count):
+        a = 20.0 + i * 30.0
+        b = 10.0 + (i * 37.0) % 60.0
+        error_a = a * 1.002 + 0.05
+        error_b = b * 0.998 - 0.03
+        if frame == 'hadec':
+            points.append((HADec(ha=a * u.deg, dec=b * u.deg), HADec(ha=error_a * u.deg, dec=error_b * u.deg)))
+        else:
+            points.append((AltAz(alt=b * u.deg, az=a * u.deg), AltAz(alt=error_b * u.deg, az=error_a * u.deg)))
+    return points
+
+
+def _register_pointing_model():
+    for name, model_class, frame in [('buie', pointing_model.PointingModelBuie, 'hadec'),
+                                     ('affine', pointing_model.PointingModelAffine, 'altaz')]:
+        def add_point_setup(model_class=model_class, frame=frame):
+            points = model_points(frame)
+
+            def run():
+                model = model_class()
+                for sync_point, stepper_point in points:
+                    model.add_point(sync_point, stepper_point)
+
+            return run
+
+        def model_and_point(model_class=model_class, frame=frame):
+            model = model_class()
+            for sync_point, stepper_point in model_points(frame):
+                model.add_point(sync_point, stepper_point)
+            if frame == 'hadec':
+                point = HADec(ha=95.0 * u.deg, dec=50.0 * u.deg)
+            else:
+                point = AltAz(alt=50.0 * u.deg, az=95.0 * u.deg)
+            return model, point
+
+        def transform_point_setup(model_and_point=model_and_point):
+            model, point = model_and_point()
+            return lambda: model.transform_point(point)
+
+        def load_setup(model_and_point=model_and_point):
+            # Load saved model and use it like at boot
+            model, point = model_and_point()
+            f = io.BytesIO()
+            pointing_model.save_model(model, f)
+            data = f.getvalue()
+            return lambda: pointing_model.load_model(io.BytesIO(data)).transform_point(point)
+
+        def load_pickle_setup(model_and_point=model_and_point):
+            # Format models were saved in before
+            model, point = model_and_point()
+            data = pickle.dumps(model)
+            return lambda: pickle.loads(data).transform_point(point)
+
+        benchmark('pointing_model', name + '_add_10_points')(add_point_setup)
+        benchmark('pointing_model', name + '_transform_point')(transform_point_setup)
+        benchmark('pointing_model', name + '_load')(load_setup)
+        benchmark('pointing_model', name + '_load_pickle')(load_pickle_setup)
+
+
+_register_pointing_model()
+
+
+def projection_points(count=50):
+    """
+    :return: from, to projected point lists for affine fits.
+    :rtype: (List[List[float]], List[List[float]])
+    """
+    from_pts = []
+    to_pts = []
+    for sync_point, stepper_point in model_points('altaz', count):
+        from_proj = pointing_model.alt_az_projection(sync_point)
+        to_proj = pointing_model.alt_az_projection(stepper_point)
+        from_pts.append([float(from_proj['x']), float(from_proj['y'])])
+        to_pts.append([float(to_proj['x']), float(to_proj['y'])])
+    return from_pts, to_pts
+
+
+def sky_points(count=500):
+    """
+    :return: lon, lat degree arrays spread over the sky.
+    :rtype: (numpy.ndarray, numpy.ndarray)
+    """
+    i = numpy.arange(count)
+    return (i * 137.508) % 360.0, numpy.degrees(numpy.arcsin(1.0 - 2.0 * (i + 0.5) / count))
+
+
+@benchmark('pointing_model', 'separation_argmin_500')
+def setup_separation_argmin():
+    lon, lat = sky_points()
+    points = AltAz(alt=lat * u.deg, az=lon * u.deg)
+    point = AltAz(alt=41.0 * u.deg, az=123.0 * u.deg)
+    return lambda: points.separation(point).argmin()
+
+
+@benchmark('pointing_model', 'sky_index_nearest_500')
+def setup_sky_index_nearest():
+    index = sky_index.SkyIndex()
+    for lon, lat in zip(*sky_points()):
+        index.add(lon, lat)
+    return lambda: index.nearest(123.0, 41.0)
+
+
+@benchmark('pointing_model', 'affine_fit_gauss_jordan_50')
+def setup_affine_fit_gauss_jordan():
+    from_pts, to_pts = projection_points()
+    return lambda: affine_fit.affine_fit(from_pts, to_pts)
+
+
+@benchmark('pointing_model', 'affine_fit_np_50')
+def setup_affine_fit_np():
+    from_pts, to_pts = projection_points()
+    return lambda: affine_fit.affine_fit_np(from_pts, to_pts)
+
+
+def affine_model_array(count=100):
+    model = pointing_model.PointingModelAffine()
+    for sync_point, stepper_point in model_points('altaz'):
+        model.add_point(sync_point, stepper_point)
+    offsets = numpy.linspace(0.0, 60.0, count)
+    return model, AltAz(alt=(20.0 + offsets) * u.deg, az=(10.0 + 3 * offsets) * u.deg)
+
+
+@benchmark('pointing_model', 'affine_transform_point_loop_100')
+def setup_affine_transform_loop():
+    model, points = affine_model_array()
+
+    def run():
+        for i in range(len(points)):
+            model.transform_point(points[i])
+
+    return run
+
+
+@benchmark('pointing_model', 'affine_transform_point_array_100')
+def setup_affine_transform_array():
+    model, points = affine_model_array()
+    return lambda: model.transform_point(points)
+
+
+@benchmark('lx200', 'default_stream')
+def setup_lx200():
+    client = lx200_benchmark.LX200Client(("benchmark", 0))
+    control.last_status = {"alt": 45.0, "az": 180.0, "tete_ra": 83.8, "tete_dec": -5.39, "slewing": False}
+    return lambda: lx200_benchmark.replay(client, lx200_benchmark.DEFAULT_STREAM)
+
+
+def has_db():
+    """
+    :return: True if DB_FILE has DB_TABLES. Opened read only, db creates an empty file when imported.
+    :rtype: bool
+    """
+    try:
+        with contextlib.closing(sqlite3.connect('file:%s?mode=ro' % DB_FILE, uri=True)) as conn:
+            tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+    except sqlite3.Error:
+        return False
+    return DB_TABLES <= tables
+
+
+def _register_db():
+    searches = [('search_dso', ('M 31',)), ('search_stars', ('Vega',)), ('search_cities', ('Lawrence',)),
+                ('search_planets', ('mars', OBSTIME, EARTH_LOCATION))]
+    for name, args in searches:
+        def setup(name=name, args=args):
+            # Imported only when run, importing db creates DB_FILE.
+            import db
+            setup_sky()
+            func = getattr(db, name)
+            return lambda: func(*args)
+
+        benchmark('db', name, needs_db=True)(setup)
+
+
+_register_db()
+
+
+@benchmark('control', 'send_status', needs_stepper=True)
+def setup_send_status():
+    setup_sky()
+    settings.settings['pointing_model_remember'] = False
+    settings.runtime_settings['tracking'] = True
+    control.sync(SYNC_ICRS)
+    return control.send_status
+
+
+def measure(func, repeat=5, min_time=0.2):
+    """
+    :param func: Function to time
+    :type func: Callable
+    :param repeat: Number of timed runs
+    :type repeat: int
+    :param min_time: Seconds each run should at least take, decides calls per run.
+    :type min_time: float
+    :return: number of calls per run and min, median, mean, stdev seconds per call
+    :rtype: dict
+    """
+    func()  # Warm up caches
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for i in range(number):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        number = max(number * 2, int(number * min_time / max(elapsed, 1e-9) * 1.1))
+    per_call = [elapsed / number]
+    for r in range(repeat - 1):
+        start = time.perf_counter()
+        for i in range(number):
+            func()
+        per_call.append((time.perf_counter() - start) / number)
+    return {
+        'number': number,
+        'repeat': repeat,
+        'min': min(per_call),
+        'median': statistics.median(per_call),
+        'mean': statistics.mean(per_call),
+        'stdev': statistics.stdev(per_call) if len(per_call) > 1 else 0.0
+    }
+
+
+def run(only=None, repeat=5, min_time=0.2, stepper=None, label=None):
+    """
+    Benchmarks that need the db are skipped if DB_FILE doesn't have DB_TABLES.
+    :param only: Groups or group.name to run, all if None.
+    :type only: Union[None, List[str]]
+    :param stepper: StepperControl for benchmarks that need a microcontroller, they are skipped if None.
+    :type stepper: Union[None, stepper_control.StepperControl]
+    :param label: Name for this run, like firmware version
+    :type label: str
+    :return: Results dict that can be saved as JSON
+    :rtype: dict
+    """
+    results = {}
+    errors = {}
+    skipped = []
+    control.stepper = stepper
+    db_ready = has_db()
+    for b in benchmarks:
+        key = b['group'] + '.' + b['name']
+        if only and b['group'] not in only and key not in only:
+            continue
+        if (b['needs_stepper'] and stepper is None) or (b['needs_db'] and not db_ready):
+            skipped.append(key)
+            continue
+        print(key, end=' ', flush=True)
+        try:
+            # Some code paths print a lot, keep output to results.
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                result = measure(b['setup'](), repeat, min_time)
+        except Exception as e:
+            traceback.print_exc()
+            errors[key] = repr(e)
+            print('ERROR')
+            continue
+        results[key] = result
+        print('%.6f ms' % (result['median'] * 1000.0))
+    return {
+        'format_version': FORMAT_VERSION,
+        'label': label,
+        'version': control.version,
+        'date': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'python': platform.python_version(),
+        'numpy': numpy.__version__,
+        'astropy': astropy.__version__,
+        'metrics_enabled': metrics.enabled,
+        'results': results,
+        'errors': errors,
+        'skipped': skipped
+    }
+
+
+def compare(old, new, threshold=1.1):
+    """
+    :param old: Results from run() to compare against
+    :type old: dict
+    :param new: Results from run()
+    :type new: dict
+    :param threshold: New median / old median above this is a regression.
+    :type threshold: float
+    :return: Keys that regressed
+    :rtype: List[str]
+    """
+    regressions = []
+    print('%-45s %12s %12s %8s' % ('benchmark', 'old ms', 'new ms', 'ratio'))
+    for key, result in new['results'].items():
+        if key not in old['results']:
+            continue
+        old_median = old['results'][key]['median']
+        ratio = result['median'] / old_median if old_median else float('inf')
+        flag = ''
+        if ratio > threshold:
+            regressions.append(key)
+            flag = ' REGRESSION'
+        print('%-45s %12.6f %12.6f %8.2f%s' % (key, old_median * 1000.0, result['median'] * 1000.0, ratio, flag))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='SSTEQ benchmarks')
+    parser.add_argument('--output', '-o', help='Save results JSON to this file')
+    parser.add_argument('--compare', '-c', help='Results JSON to compare against, exits 1 on regression')
+    parser.add_argument('--threshold', type=float, default=1.1, help='Slowdown ratio counted as a regression')
+    parser.add_argument('--label', help='Name for this run, like the firmware version')
+    parser.add_argument('--only', help='Comma separated groups or group.name to run')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--min-time', type=float, default=0.2, help='Seconds each repeat should take at least')
+    parser.add_argument('--port', help='Serial port of microcontroller or simulator for send_status')
+    parser.add_argument('--baud', type=int, default=115200)
+    parser.add_argument('--vmc', action='store_true', help='Start virtual motor controller for send_status')
+    args = parser.parse_args()
+
+    import stepper_control
+    stepper = None
+    port = args.port
+    if args.vmc:
+        import vmc_simulator
+        port = vmc_simulator.VirtualMotorController().port
+    if port:
+        stepper = stepper_control.StepperControl(port, args.baud)
+    only = args.only.split(',') if args.only else None
+    results = run(only, args.repeat, args.min_time, stepper, args.label)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+        if compare(old, results, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
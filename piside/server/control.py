@@ -2,6 +2,7 @@
 control methods for the mount.
 """
 
+import sys
 import threading
 from functools import partial
 import time
@@ -9,16 +10,17 @@ import traceback
 import os
 
 import psutil
-import random
 
 # from sstutil import ProfileTimer as PT
 
 import datetime
 from astropy.coordinates import EarthLocation, AltAz, TETE, ICRS
 from skyconv_hadec import HADec
+import skyconv_hadec
 from astropy.time import Time as AstroTime
 import astropy.units as u
 import math
+import numpy
 import socket
 import json
 import stepper_control
@@ -30,9 +32,15 @@ from timezonefinder import TimezoneFinder
 
 import skyconv
 import settings
+import horizon_limit
+import status_stream
+import metrics
+import position_service
+import scheduler
 import motion
+import target_ephemeris
+import model_fitter
 import typing
-import simple_pid
 
 version = "0.0.37"
 version_short = "0.0"
@@ -45,9 +53,22 @@ AXIS_DEC = 2
 timers = {}
 OPPOSITE_MANUAL = {"left": "right", "right": "left", "up": "down", "down": "up"}
 DEFAULT_PARK = {"az": 180, "alt": 0}
+# Slew path checks sample about every SLEW_PATH_SAMPLE_DEG of travel.
+SLEW_PATH_SAMPLE_DEG = 0.5
+SLEW_PATH_MAX_SAMPLES = 720
+# Slews stream speeds every SLEW_CONTROL_PERIOD seconds along a planned path.
+SLEW_CONTROL_PERIOD = 0.1
+# Speed added per step of position error against the planned path, 1/s.
+SLEW_POSITION_GAIN = 2.0
+# Speed changes smaller than this times close enough steps are not sent.
+SLEW_SPEED_DEADBAND = 0.5
+# Seconds after planned path ends to get on target.
+SLEW_SETTLE_TIMEOUT = 5.0
 slew_lock = threading.RLock()
 set_last_slew_lock = threading.RLock()
 manual_lock = threading.RLock()
+# Guide pulses end on their own scheduler, not late behind manual control's status reads on the default one.
+guide_scheduler = scheduler.Scheduler(name="guide_scheduler")
 time_location_lock = threading.RLock()
 status_interval = None
 inited = False
@@ -75,6 +96,10 @@ encoder_logging_enabled = False
 encoder_logging_file: typing.Optional[typing.TextIO] = None
 encoder_logging_clear = False
 encoder_logging_interval = None
+current_horizon_limit: typing.Optional[horizon_limit.HorizonLimit] = None
+status_publisher = status_stream.StatusStream()
+# Position extrapolated between status updates
+positions = position_service.PositionService()
 
 # Last sync or slew info, if tracking sets radec, else altaz.
 last_slew: typing.Dict[str, typing.Union[None, TETE, ICRS, AltAz]] = {
@@ -138,8 +163,7 @@ def _set_last_slew_none_run():
 def set_last_slew_none():
     global sls_debounce
     if sls_debounce is None:
-        sls_debounce = threading.Timer(0.5, _set_last_slew_none_run)
-        sls_debounce.start()
+        sls_debounce = scheduler.call_later(0.5, _set_last_slew_none_run)
 
 
 def _ra_aminpsec_to_stppsec(arcmin_per_second):
@@ -182,9 +206,12 @@ def _dec_asecpsec_to_stppsec(arcsec_per_second):
     return steps_per_degree * arcsec_per_second / (60.0 * 60.0)
 
 
-def sync(coord):
+def sync(coord, fit=True):
     """
     :param coord:
+    Points for a multiple point model are fitted and saved in the background by model_fitter.
+    :param fit: If False point is added to pointing model without refitting, call fit_pointing_model after.
+    :type fit: bool
     :return:
     """
     global park_sync
@@ -206,13 +233,11 @@ def sync(coord):
                 obstime=obstime,
             )
             if skyconv.model_real_stepper.frame() == "hadec":
-                skyconv.model_real_stepper.add_point(hadec, stepper_coord)
+                model_fitter.default_fitter.add_point(hadec, stepper_coord, fit=fit)
             else:  # AltAz model frame
                 print(hadec, stepper_coord)
                 altaz = skyconv.to_altaz(hadec)
-                skyconv.model_real_stepper.add_point(altaz, stepper_coord)
-            if settings.settings["pointing_model_remember"]:
-                settings.save_pointing_model(skyconv.model_real_stepper)
+                model_fitter.default_fitter.add_point(altaz, stepper_coord, fit=fit)
         else:
             park_sync = False
             sync_info = {
@@ -221,49 +246,55 @@ def sync(coord):
             }
             print("Setting sync_info", sync_info)
             settings.runtime_settings["sync_info"] = sync_info
+            # New model is built then published, queued points for the old one are dropped.
+            model_fitter.default_fitter.reset()
             if settings.settings["pointing_model"] in ["single", "buie"]:
                 print(settings.settings["pointing_model"], "sync")
-                if not isinstance(
-                    skyconv.model_real_stepper, pointing_model.PointingModelBuie
-                ):
-                    skyconv.model_real_stepper = pointing_model.PointingModelBuie(
-                        max_points=settings.settings["pointing_model_points"]
-                    )
-                skyconv.model_real_stepper.clear()
-                if settings.settings["pointing_model_remember"]:
-                    try:
-                        loaded_model = settings.load_pointing_model()
-                        if loaded_model is not None:
-                            skyconv.model_real_stepper = loaded_model
-                    except Exception as e:
-                        print("WARNING: failed to load pointing model: " + str(e))
-                skyconv.model_real_stepper.add_point(hadec, hadec)
+                model = pointing_model.PointingModelBuie(
+                    max_points=settings.settings["pointing_model_points"]
+                )
+                point = hadec
             else:  # affine model
                 print("affine sync")
-                if not isinstance(
-                    skyconv.model_real_stepper, pointing_model.PointingModelAffine
-                ):
-                    skyconv.model_real_stepper = pointing_model.PointingModelAffine(
-                        max_points=settings.settings["pointing_model_points"]
-                    )
-                altaz = skyconv.to_altaz(hadec)
-                skyconv.model_real_stepper.clear()
-                if settings.settings["pointing_model_remember"]:
-                    try:
-                        loaded_model = settings.load_pointing_model()
-                        if loaded_model is not None:
-                            skyconv.model_real_stepper = loaded_model
-                    except Exception as e:
-                        print("WARNING: failed to load pointing model: " + str(e))
-                skyconv.model_real_stepper.add_point(altaz, altaz)
+                model = pointing_model.PointingModelAffine(
+                    max_points=settings.settings["pointing_model_points"]
+                )
+                point = skyconv.to_altaz(hadec)
+            loaded_model = None
+            if settings.settings["pointing_model_remember"]:
+                try:
+                    loaded_model = settings.load_pointing_model()
+                except Exception as e:
+                    print("WARNING: failed to load pointing model: " + str(e))
+            if loaded_model is not None:
+                # Refitting a loaded model with the new point can be slow, done in background.
+                skyconv.model_real_stepper = loaded_model
+                model_fitter.default_fitter.add_point(point, point)
+            else:
+                model.add_point(point, point)
+                skyconv.model_real_stepper = model
+
+
+def fit_pointing_model(wait=False):
+    """
+    Fits pointing model to its points in the background, for after syncs with fit=False.
+    :param wait: If True returns once the fit is published or has failed.
+    :type wait: bool
+    """
+    model_fitter.default_fitter.fit()
+    if wait:
+        model_fitter.default_fitter.wait()
 
 
-def slew(coord, parking=False):
+def slew(coord, parking=False, body=None):
     """
     Slews after going through model
     :param coord: HaDec, ICRS, TETE, AltAz astropy.coordinates or dictionary with ha, dec steps
     :param parking: True if parking slew
-    :return:
+    :param body: Solar system body name if coord is one, its motion is followed.
+    :type body: str
+    :return: Thread slewing, done when slew is.
+    :rtype: threading.Thread
     """
     global cancel_slew
     if (
@@ -275,170 +306,156 @@ def slew(coord, parking=False):
     settings.not_parked()
     cancel_slew = True
     # If not TETE altaz or step lets make this ICRS so it recalculated every loop
-    thread = threading.Thread(target=move_to_coord_threadf, args=(coord, parking))
+    thread = threading.Thread(target=move_to_coord_threadf, args=(coord, parking, body))
     thread.start()
+    return thread
 
 
-def _move_to_coord_threadf(wanted_skycoord, axis="ra", parking=False, close_enough=1):
-    steps = False
-    if type(wanted_skycoord) is dict and "ha" in wanted_skycoord:
-        need_step_position = {
-            "ha": wanted_skycoord["ha"],
-            "dec": wanted_skycoord["dec"],
-        }
-        # close_enough = 1
-        steps = True
-    elif wanted_skycoord.name in ["hadec", "altaz"]:
-        need_step_position = skyconv.to_steps(wanted_skycoord)
-        # close_enough = 1
-        steps = True
+def _slew_trajectory(axis, delta, v_0, v_target=0.0):
+    """
+    Plans an axis slew with the microcontroller acceleration and max speed.
+    :param axis: 'ra' or 'dec'
+    :type axis: str
+    :param delta: Steps to target at start
+    :type delta: float
+    :param v_0: Current speed of axis in steps/s
+    :type v_0: float
+    :param v_target: Speed target moves at in steps/s
+    :type v_target: float
+    :return: Planned path
+    :rtype: motion.AxisTrajectory
+    """
+    if axis == "ra":
+        return motion.AxisTrajectory(
+            delta,
+            v_0,
+            settings.settings["micro"]["ra_accel_tpss"],
+            _ra_aminpsec_to_stppsec(settings.settings["ra_slew_fastest"]),
+            v_target,
+        )
     else:
-        need_step_position = skyconv.to_steps(wanted_skycoord)
-    count = 0
-    close_timer = None
-    while not cancel_slew:
-        # print('_move_to_coord_threadf', axis)
-        if close_timer is not None and (time.time() - close_timer) > 10.0:
-            # For some reason we are never getting there
-            # print('WARNING: close_time slew giving up', file=sys.stderr)
-            break
-        count += 1
-        if not steps and count != 1 and not parking:
-            need_step_position = skyconv.to_steps(wanted_skycoord)
-            if settings.is_simulation():
-                time.sleep(0.2 + random.random() / 10.0)
-        loop_start = datetime.datetime.now()
-        status = calc_status(stepper.get_status())
+        return motion.AxisTrajectory(
+            delta,
+            v_0,
+            settings.settings["micro"]["dec_accel_tpss"],
+            _dec_aminpsec_to_stppsec(settings.settings["dec_slew_fastest"]),
+            v_target,
+        )
 
-        if axis == "ra":
-            delta = need_step_position["ha"] - status["rep"]
-            status_pos_key = "rep"
-        else:
-            delta = need_step_position["dec"] - status["dep"]
-            status_pos_key = "dep"
 
-        if abs(round(delta)) <= 10.0 * close_enough and close_timer is None:
-            close_timer = time.time()
+def _slew_target(wanted_skycoord, parking=False, body=None):
+    """
+    Predicted step position of slew target over the slew.
+    :param wanted_skycoord: HaDec, ICRS, TETE, AltAz astropy.coordinates or dictionary with ha, dec steps
+    :param parking: True if parking slew, target doesn't move.
+    :type parking: bool
+    :param body: Solar system body name, position is recomputed for each sample time.
+    :type body: str
+    :return: Target steps at a time
+    :rtype: target_ephemeris.TargetEphemeris
+    """
+    if type(wanted_skycoord) is dict and "ha" in wanted_skycoord:
+        return target_ephemeris.TargetEphemeris.fixed(wanted_skycoord)
+    if wanted_skycoord.name in ["hadec", "altaz"] or parking:
+        return target_ephemeris.TargetEphemeris.fixed(skyconv.to_steps(wanted_skycoord))
+    if body is not None:
+        import db
 
-        if abs(round(delta)) <= close_enough:
-            break
+        return target_ephemeris.TargetEphemeris.from_coord(partial(db.planet_coord, body))
+    return target_ephemeris.TargetEphemeris.from_coord(wanted_skycoord)
 
-        if axis == "ra":
-            pos = 0
-            if delta > 0:
-                pos = 1
-            settle_speed = math.copysign(
-                (pos + 4) * settings.settings["ra_track_rate"], delta
-            )
-            settle_thresh = 10 * settings.settings["ra_track_rate"]
-        else:
-            settle_speed = math.copysign(
-                4 * settings.settings["dec_ticks_per_degree"] * SIDEREAL_RATE, delta
-            )
-            settle_thresh = (
-                10 * settings.settings["dec_ticks_per_degree"] * SIDEREAL_RATE
-            )
 
-        if abs(delta) < settle_thresh:
-            # print('Settle Threshold', axis)
-            if axis == "ra":
-                stepper.set_speed_ra(settle_speed)
-            else:
-                stepper.set_speed_dec(settle_speed)
-            if axis == "ra":
-                sp = need_step_position["ha"]
-            else:
-                sp = need_step_position["dec"]
-            pid = simple_pid.PID(0.5, 0.1, 0.1, setpoint=sp)
-            pid.output_limits = (-abs(settle_speed), abs(settle_speed))
-            pid.sample_time = 0.1
-            pid.auto_mode = False
-            pid.set_auto_mode(True, last_output=settle_speed)
-            error = delta
-            last_output = -9999999999
-            settling_start = time.time()
-            while (
-                abs(error) > close_enough
-                and not cancel_slew
-                and time.time() - settling_start < 5
-            ):
+def _follow_slew_trajectory(wanted_skycoord, parking, ha_close_enough, dec_close_enough, body=None):
+    """
+    Plans both axes paths to the target once and follows them. Ramps are commanded when they start, the
+    microcontroller accelerates like the plan. Otherwise speeds are streamed every SLEW_CONTROL_PERIOD with a
+    correction for position error against the plan. Returns when both axes are on the moving target, on cancel_slew or
+    timeout.
+    """
+    ephemeris = _slew_target(wanted_skycoord, parking, body)
+    status = calc_status(stepper.get_status(0))
+    start = time.monotonic()
+    target = ephemeris.steps(start)
+    drift = ephemeris.velocity(start)
+    axes = []
+    for axis, pos_key, speed_key, need_key, close_enough in [
+        ("ra", "rep", "rs", "ha", ha_close_enough),
+        ("dec", "dep", "ds", "dec", dec_close_enough),
+    ]:
+        x_0 = status[pos_key]
+        delta = target[need_key] - x_0
+        axes.append(
+            {
+                "axis": axis,
+                "pos_key": pos_key,
+                "need_key": need_key,
+                "x_0": x_0,
+                "trajectory": _slew_trajectory(axis, delta, status[speed_key], drift[need_key]),
+                "close_enough": close_enough,
+                "last_speed": None,
+            }
+        )
+    deadline = start + max([a["trajectory"].duration for a in axes]) + SLEW_SETTLE_TIMEOUT
+    iteration = metrics.histogram("slew_control_iteration_seconds")
+    tick = start
+    while not cancel_slew:
+        with iteration.time():
+            now = time.monotonic()
+            t = now - start
+            if now > deadline:
+                print("WARNING: slew did not settle on target", file=sys.stderr)
+                break
+            ramping = [a["trajectory"].ramping(t) for a in axes]
+            # While both axes ramp the microcontroller follows the plan on its own, no need for status.
+            if t > 0 and not all(ramping):
                 status = calc_status(stepper.get_status())
-                if axis == "ra":
-                    pv = status["rep"]
+            # Plan assumes target moves at a constant speed, after it ends follow the target itself.
+            late = [t > a["trajectory"].duration for a in axes]
+            if any(late):
+                target = ephemeris.steps(now)
+                target_velocity = ephemeris.velocity(now)
+            done = True
+            for a, axis_ramping, axis_late in zip(axes, ramping, late):
+                trajectory = a["trajectory"]
+                if axis_ramping:
+                    # Microcontroller ramps to commanded speed at the planned acceleration
+                    speed = trajectory.command_velocity(t)
+                    done = False
+                elif axis_late:
+                    error = target[a["need_key"]] - status[a["pos_key"]]
+                    if abs(error) > a["close_enough"]:
+                        done = False
+                    speed = target_velocity[a["need_key"]] + SLEW_POSITION_GAIN * error
+                    speed = max(-trajectory.v_max, min(trajectory.v_max, speed))
                 else:
-                    pv = status["dep"]
-                if not steps and axis == "ra" and not parking:
-                    new_sp = (
-                        sp
-                        + ((datetime.datetime.now() - loop_start).total_seconds() + 0.1)
-                        * settings.settings["ra_track_rate"]
-                    )
-                    pid.setpoint = new_sp
-                else:
-                    new_sp = sp
-                output = pid(pv)
-                if output != last_output:
-                    last_output = output
-                    # print('pid output:', axis, output)
-                    if axis == "ra":
-                        stepper.set_speed_ra(output)
+                    done = False
+                    pos = status[a["pos_key"]] - a["x_0"]
+                    speed = trajectory.velocity(t) + SLEW_POSITION_GAIN * (trajectory.position(t) - pos)
+                    speed = max(-trajectory.v_max, min(trajectory.v_max, speed))
+                if a["last_speed"] is None or abs(speed - a["last_speed"]) > SLEW_SPEED_DEADBAND * a["close_enough"]:
+                    if a["axis"] == "ra":
+                        stepper.set_speed_ra(speed)
                     else:
-                        stepper.set_speed_dec(output)
-                error = new_sp - pv
-            # print('End Settle Loop', axis)
-        else:
-            if axis == "ra":
-                if not parking and settings.runtime_settings["tracking"]:
-                    v_track = settings.settings["ra_track_rate"]
-                else:
-                    v_track = 0
-
-                times = motion.calc_speed_sleeps(
-                    delta,
-                    settings.settings["micro"]["ra_accel_tpss"],
-                    status["rs"],
-                    _ra_aminpsec_to_stppsec(settings.settings["ra_slew_fastest"]),
-                    v_track,
-                    "ra",
-                )
-            else:
-                times = motion.calc_speed_sleeps(
-                    delta,
-                    settings.settings["micro"]["dec_accel_tpss"],
-                    status["ds"],
-                    _dec_aminpsec_to_stppsec(settings.settings["dec_slew_fastest"]),
-                    0,
-                    "dec",
-                )
-
-            # print('dec_times', dec_times)
-
-            for t in times:
-                if t["speed"] is not None:
-                    if axis == "ra":
-                        stepper.set_speed_ra(t["speed"])
-                    else:
-                        stepper.set_speed_dec(t["speed"])
-                st = t["sleep"]
-                while st > 2.0:
-                    st -= 2.0
-                    time.sleep(2)
-                    if cancel_slew:
-                        break
-                if cancel_slew:
-                    break
-                time.sleep(st)
-
-    if axis == "ra":
-        rspeed = 0
-        if not parking and settings.runtime_settings["tracking"]:
-            rspeed = settings.settings["ra_track_rate"]
-        stepper.set_speed_ra(rspeed)
-    else:
-        stepper.set_speed_dec(0.0)
-
-
-def move_to_coord_threadf(wanted_skycoord, parking=False):
+                        stepper.set_speed_dec(speed)
+                    a["last_speed"] = speed
+            if done:
+                break
+        tick += SLEW_CONTROL_PERIOD
+        if tick < time.monotonic():
+            tick = time.monotonic()
+        # Planned speed changes happen on time, not at the next tick.
+        wake = tick
+        for a in axes:
+            change = a["trajectory"].next_change(t)
+            if change is not None:
+                wake = min(wake, start + change)
+        sleep = wake - time.monotonic()
+        if sleep > 0:
+            time.sleep(sleep)
+        tick = min(tick, wake)
+
+
+def move_to_coord_threadf(wanted_skycoord, parking=False, body=None):
     global cancel_slew, slewing
 
     ha_close_enough = settings.settings["ra_track_rate"]
@@ -450,21 +467,9 @@ def move_to_coord_threadf(wanted_skycoord, parking=False):
         stepper.autoguide_disable()
         slewing = True
         cancel_slew = False
+        wake_status()
 
-        # Threads
-        ra_thread = threading.Thread(
-            target=_move_to_coord_threadf,
-            args=(wanted_skycoord, "ra", parking, ha_close_enough),
-        )
-        ra_thread.start()
-        dec_thread = threading.Thread(
-            target=_move_to_coord_threadf,
-            args=(wanted_skycoord, "dec", parking, dec_close_enough),
-        )
-        dec_thread.start()
-
-        ra_thread.join()
-        dec_thread.join()
+        _follow_slew_trajectory(wanted_skycoord, parking, ha_close_enough, dec_close_enough, body)
 
         rspeed = 0
         if settings.runtime_settings["tracking"]:
@@ -491,78 +496,125 @@ def move_to_coord_threadf(wanted_skycoord, parking=False):
             slew_lock.release()
 
 
-class SimpleInterval:
-    def __init__(self, func, sec):
-        # print('Simple Interval')
+class AdaptiveInterval:
+    """
+    Calls func on one persistent thread, waiting period_func() seconds between starts.
+    """
+    def __init__(self, func, period_func, name=None):
+        """
+        :param func: Function to call
+        :type func: Callable
+        :param period_func: Returns seconds until next call, called after each call.
+        :type period_func: Callable[[], float]
+        :param name: Thread name
+        :type name: str
+        """
         self._func = func
-        self._sec = sec
-        self._timer = threading.Timer(self._sec, self._run)
-        self._timer.start()
+        self._period_func = period_func
+        self._wake = threading.Event()
+        self._cancelled = False
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def wake(self):
+        """
+        Recomputes wait now, call when period_func would return something shorter.
+        """
+        self._wake.set()
 
     def cancel(self):
-        self._timer.cancel()
-        self._timer = None
-        self._func = None
-        self._sec = None
+        self._cancelled = True
+        self._wake.set()
 
     def _run(self):
-        self._timer = threading.Timer(self._sec, self._run)
-        self._timer.start()
-        self._func()
+        while not self._cancelled:
+            start = time.monotonic()
+            try:
+                self._func()
+            except Exception:
+                traceback.print_exc()
+            while not self._cancelled:
+                try:
+                    period = self._period_func()
+                except Exception:
+                    traceback.print_exc()
+                    period = 1.0
+                wait = start + period - time.monotonic()
+                if wait <= 0:
+                    break
+                self._wake.clear()
+                if not self._wake.wait(wait):
+                    break
+
+
+def clients_alive():
+    """
+    :return: True if a client is using status, per is_alive or a connected handpad.
+    :rtype: bool
+    """
+    if any(is_alive.values()):
+        return True
+    # Not imported if handpad server isn't running
+    handpad_server = sys.modules.get("handpad_server")
+    return bool(handpad_server and handpad_server.handpad_server and handpad_server.handpad_server.serial is not None)
+
+
+def status_period():
+    """
+    :return: Seconds between send_status calls, shorter when moving, longer when parked or nobody is watching.
+    :rtype: float
+    """
+    intervals = settings.settings["status_interval"]
+    if slewing or timers:
+        return intervals["active"]
+    if not clients_alive():
+        return intervals["no_clients"]
+    if not settings.runtime_settings["tracking"] and settings.last_parked():
+        return intervals["parked"]
+    return intervals["tracking"]
+
+
+def wake_status():
+    """
+    Call when starting to move so status speeds up now.
+    """
+    if status_interval:
+        status_interval.wake()
+
+
+def update_horizon_limit():
+    """
+    Rebuilds the horizon limit from settings, call when horizon limit settings have changed.
+    :return: The new horizon limit
+    :rtype: horizon_limit.HorizonLimit
+    """
+    global current_horizon_limit
+    current_horizon_limit = horizon_limit.from_settings(settings.settings)
+    return current_horizon_limit
+
+
+def get_horizon_limit():
+    """
+    :return: Horizon limit built from settings.
+    :rtype: horizon_limit.HorizonLimit
+    """
+    if current_horizon_limit is None:
+        return update_horizon_limit()
+    return current_horizon_limit
 
 
 # TODO: Should we really use hadec's DEC instead of tete for dec?
 def below_horizon_limit(altaz, tete):
     """
     If horizon limit is enabled and earth location is set, it will set if coordinates are below the horizon limits set.
-    :param altaz: altaz coordinate
+    :param altaz: altaz coordinate, can be an array coordinate.
     :type altaz: AltAz
     :param tete: tete coordinate to check dec limit.
     :type tete: TETE
-    :return: true if below horizon limit
-    :rtype: bool
+    :return: true if below horizon limit, array of bool if array coordinates.
+    :rtype: Union[bool, numpy.ndarray]
     """
-    az = altaz.az.deg
-    alt = altaz.alt.deg
-    dec = tete.dec.deg
-    if settings.settings["horizon_limit_enabled"]:
-        dec_gt = settings.settings["horizon_limit_dec"]["greater_than"]
-        dec_lt = settings.settings["horizon_limit_dec"]["less_than"]
-        # print('below_horizon_limit', dec, dec_lt, dec_gt)
-        if dec > dec_lt or dec < dec_gt:
-            return True
-        if (
-            "horizon_limit_points" in settings.settings
-            and settings.settings["horizon_limit_points"]
-        ):
-            if len(settings.settings["horizon_limit_points"]) == 1:
-                if alt <= settings.settings["horizon_limit_points"][0]["alt"]:
-                    return True
-                else:
-                    return False
-            else:
-                for i in range(len(settings.settings["horizon_limit_points"]) - 1):
-                    point1 = settings.settings["horizon_limit_points"][i]
-                    if i + 1 < len(settings.settings["horizon_limit_points"]):
-                        point2 = settings.settings["horizon_limit_points"][i + 1]
-                    else:
-                        point2 = settings.settings["horizon_limit_points"][0]
-                    p1az = point1["az"]
-                    if (
-                        point2["az"] < p1az
-                        or len(settings.settings["horizon_limit_points"]) == 1
-                    ):
-                        p1az -= 360.0
-
-                    point2 = settings.settings["horizon_limit_points"][i + 1]
-                    if p1az <= az < point2["az"]:
-                        m = (point2["alt"] - point1["alt"]) / (point2["az"] - p1az)
-                        b = point1["alt"]
-                        if alt < (m * (az - p1az) + b):
-                            return True
-                        else:
-                            return False
-    return False
+    return get_horizon_limit().below(altaz.alt.deg, altaz.az.deg, tete.dec.deg)
 
 
 def slewtocheck(coord):
@@ -582,6 +634,71 @@ def slewtocheck(coord):
         return True
 
 
+def slew_path_check(coord, status=None, parking=False, body=None):
+    """
+    Predicts the path of a slew to coord with the axis trajectories the slew will follow and checks samples along it
+    against the horizon limit. The pointing model is not applied to the samples, its corrections are small compared to
+    limits.
+    :param coord: Slew target, HaDec, ICRS, TETE, AltAz astropy.coordinates or dictionary with ha, dec steps
+    :param status: Stepper status from calc_status, if None gets current status.
+    :type status: dict
+    :param parking: True if parking slew.
+    :type parking: bool
+    :param body: Solar system body name if coord is one.
+    :type body: str
+    :return: true if path is okay to slew
+    :rtype: bool
+    """
+    hl = get_horizon_limit()
+    if not hl.enabled or settings.runtime_settings["sync_info"] is None:
+        return True
+    if status is None:
+        status = calc_status(stepper.get_status())
+    context = skyconv.FastContext()
+    ha, dec = _slew_path_samples(status, _slew_target(coord, parking, body))
+    alt, az = skyconv.fast_hadec_to_altaz(ha, dec, context=context)
+    tete_ra, tete_dec = skyconv.fast_hadec_to_tete(ha, dec, context=context)
+    below = numpy.atleast_1d(hl.below(alt, az, tete_dec))
+    # Mount starting in the limit, parked at alt 0 for example, has to be able to leave it. Only going back in after
+    # leaving counts, the target itself is checked by slewtocheck.
+    above = numpy.flatnonzero(~below)
+    if len(above) == 0:
+        return True
+    return not numpy.any(below[above[0]:])
+
+
+def _slew_path_samples(status, ephemeris):
+    """
+    Samples a predicted slew path, planned like _follow_slew_trajectory plans it.
+    :param status: Stepper status from calc_status
+    :type status: dict
+    :param ephemeris: Target steps over time from _slew_target
+    :type ephemeris: target_ephemeris.TargetEphemeris
+    :return: (ha degrees, dec degrees) arrays of positions along path
+    :rtype: (numpy.ndarray, numpy.ndarray)
+    """
+    start = time.monotonic()
+    target = ephemeris.steps(start)
+    drift = ephemeris.velocity(start)
+    axes = []
+    for axis, pos_key, speed_key, need_key, ticks_key in [
+        ("ra", "rep", "rs", "ha", "ra_ticks_per_degree"),
+        ("dec", "dep", "ds", "dec", "dec_ticks_per_degree"),
+    ]:
+        delta = target[need_key] - status[pos_key]
+        trajectory = _slew_trajectory(axis, delta, status[speed_key], drift[need_key])
+        axes.append((status[pos_key], trajectory, delta / settings.settings[ticks_key]))
+    total_time = max([a[1].duration for a in axes])
+    travel_deg = max([abs(a[2]) for a in axes])
+    # Peak speed is at most twice the average speed, so twice the samples keep spacing under SLEW_PATH_SAMPLE_DEG
+    count = int(min(SLEW_PATH_MAX_SAMPLES, max(2, math.ceil(2 * travel_deg / SLEW_PATH_SAMPLE_DEG) + 1)))
+    t = numpy.linspace(0, total_time, count)
+    steps = {}
+    for (pos, trajectory, delta_deg), axis_name in zip(axes, ["ha", "dec"]):
+        steps[axis_name] = pos + trajectory.position(t)
+    return skyconv.steps_to_hadec_deg(steps, use_model=False)
+
+
 # We are going to sync based on altaz coordinates, this will be the default location if not set. We'll
 # sync on pretend altaz locations.
 DEFAULT_ELEVATION_M = 405.0
@@ -610,6 +727,7 @@ def update_location(from_gps=False):
             lon=DEFAULT_LON_DEG * u.deg,
             height=DEFAULT_ELEVATION_M * u.m,
         )
+        skyconv_hadec.clear_apco_cache()
         return
     if "elevation" not in settings.settings["location"]:
         elevation = DEFAULT_ELEVATION_M
@@ -622,6 +740,7 @@ def update_location(from_gps=False):
     )
     settings.runtime_settings["earth_location"] = el
     settings.runtime_settings["earth_location_from_gps"] = from_gps
+    skyconv_hadec.clear_apco_cache()
     if do_altaz_sync:
         set_sync(alt=alt, az=az, frame="altaz")
     try:
@@ -696,7 +815,7 @@ def start_stop_encoder_logger(enabled):
         encoder_logging_file.write(
             "Time,step_ra,step_dec,enc_ra,enc_dec,ra_over_raenc,dec_over_decenc\n"
         )
-        encoder_logging_interval = SimpleInterval(encoder_log, 0.25)
+        encoder_logging_interval = scheduler.call_every(0.25, encoder_log)
     elif not enabled and encoder_logging_enabled:
         encoder_logging_enabled = False
         if encoder_logging_file:
@@ -751,6 +870,7 @@ def get_cpustats():
     return ret
 
 
+@metrics.timed("send_status_seconds")
 def send_status():
     """
     Calculates and sets last_status global
@@ -831,6 +951,7 @@ def send_status():
             status["az"] = altaz.az.deg
             status["last_target"] = last_target
             below_horizon = below_horizon_limit(altaz, tete)
+            status["below_horizon"] = below_horizon
             if below_horizon and settings.runtime_settings["tracking"]:
                 cancel_slew = True
                 settings.runtime_settings["tracking"] = False
@@ -854,8 +975,17 @@ def send_status():
                 dec_encoder_error = dec_encoder_error + " "
         status["slewing"] = slewing
         status["tracking"] = settings.runtime_settings["tracking"]
+        if status["synced"]:
+            positions.update(
+                status,
+                settings.settings["ra_ticks_per_degree"],
+                settings.settings["dec_ticks_per_degree"],
+                settings.runtime_settings["earth_location"].lat.deg,
+            )
+        else:
+            positions.clear()
         last_status = status
-        # socketio.emit('status', status)
+        status_publisher.publish(status)
     except:
         traceback.print_exc()
 
@@ -924,12 +1054,26 @@ def init():
         settings.settings["microserial"]["port"],
         settings.settings["microserial"]["baud"],
     )
+    metrics.register_collector(
+        "status_cache", stepper.status_cache.stats, "Stepper status cache counts"
+    )
+    metrics.register_collector(
+        "scheduler", scheduler.default_scheduler.stats, "Timer scheduler counts and lateness seconds"
+    )
+    metrics.register_collector(
+        "guide_scheduler", guide_scheduler.stats, "Guide pulse scheduler counts and lateness seconds"
+    )
+    metrics.register_collector(
+        "model_fitter", model_fitter.default_fitter.stats, "Background pointing model fit counts"
+    )
     skyconv.model_real_stepper = pointing_model.PointingModelBuie(
         max_points=settings.settings["pointing_model_points"]
     )
     # Handpad will set time/location from GPS eventually
     update_location()
     micro_update_settings()
+    if settings.settings["stepper_status_stream_ms"]:
+        stepper.start_status_stream(settings.settings["stepper_status_stream_ms"])
 
     frame_args = skyconv.get_frame_init_args("altaz")
     if settings.settings["park_position"]:
@@ -952,8 +1096,8 @@ def init():
     sync(coord)
     park_sync = True
     send_status()
-    status_interval = SimpleInterval(send_status, 1)
-    SimpleInterval(alive_check, 3)
+    status_interval = AdaptiveInterval(send_status, status_period, name="status")
+    scheduler.call_every(3, alive_check)
     time.sleep(0.5)
 
 
@@ -978,33 +1122,25 @@ def guide_control(direction, time_ms):
                 status["ds"]
                 + _dec_asecpsec_to_stppsec(settings.settings["micro"]["dec_guide_rate"])
             )
-            threading.Timer(
-                time_ms / 1000.0, partial(stepper.set_speed_dec, status["ds"])
-            )
+            guide_scheduler.call_later(time_ms / 1000.0, partial(stepper.set_speed_dec, status["ds"]))
         elif direction == "s":
             stepper.set_speed_dec(
                 status["ds"]
                 - _dec_asecpsec_to_stppsec(settings.settings["micro"]["dec_guide_rate"])
             )
-            threading.Timer(
-                time_ms / 1000.0, partial(stepper.set_speed_dec, status["ds"])
-            )
+            guide_scheduler.call_later(time_ms / 1000.0, partial(stepper.set_speed_dec, status["ds"]))
         elif direction == "w":
             stepper.set_speed_ra(
                 status["rs"]
                 + _ra_asecpsec_to_stppsec(settings.settings["micro"]["ra_guide_rate"])
             )
-            threading.Timer(
-                time_ms / 1000.0, partial(stepper.set_speed_ra, status["rs"])
-            )
+            guide_scheduler.call_later(time_ms / 1000.0, partial(stepper.set_speed_ra, status["rs"]))
         elif direction == "e":
             stepper.set_speed_ra(
                 status["rs"]
                 - _ra_asecpsec_to_stppsec(settings.settings["micro"]["ra_guide_rate"])
             )
-            threading.Timer(
-                time_ms / 1000.0, partial(stepper.set_speed_ra, status["rs"])
-            )
+            guide_scheduler.call_later(time_ms / 1000.0, partial(stepper.set_speed_ra, status["rs"]))
     except:
         traceback.print_exc()
         raise
@@ -1076,10 +1212,9 @@ def manual_control(direction, speed, client_id):
                         recall = True
                 # Keep calling until we are settled
                 if recall:
-                    timers[direction] = threading.Timer(
+                    timers[direction] = scheduler.call_later(
                         1, partial(manual_control, direction, speed, client_id)
                     )
-                    timers[direction].start()
             else:
                 # If not current manually going other direction
                 if OPPOSITE_MANUAL[direction] in timers:
@@ -1105,18 +1240,18 @@ def manual_control(direction, speed, client_id):
                     )
                 # We call this periodically if not alive it will cancel the slewing, if alive it will continue at
                 # speed we are at.
-                timers[direction] = threading.Timer(
+                timers[direction] = scheduler.call_later(
                     1, partial(manual_control, direction, speed, client_id)
                 )
-                timers[direction].start()
+                wake_status()
         except:
             traceback.print_exc()
             raise
         finally:
             set_last_slew_none()
             # TODO: none it after 5 seconds if slow acceleration, really should we wait for speed to settle?
-            threading.Timer(5, set_last_slew_none)
-            threading.Timer(10, set_last_slew_none)
+            scheduler.call_later(5, set_last_slew_none)
+            scheduler.call_later(10, set_last_slew_none)
             slew_lock.release()
 
 
@@ -1154,7 +1289,7 @@ def clear_sync():
             alt=last_status["alt"] * u.deg, az=last_status["az"] * u.deg, **frame_args
         )
     pointing_logger.debug(json.dumps({"func": "control.clear_sync"}))
-    settings.rm_pointing_model()
+    model_fitter.default_fitter.remove_saved()
     park_sync = True
     sync(scord)
     park_sync = True
@@ -1221,6 +1356,7 @@ def set_time(iso_timestr, from_gps=False):
         d = d + (datetime.datetime.now() - s)
         time_s = d.isoformat()
         daterun = subprocess.run(["/usr/bin/sudo", "/bin/date", "-s", time_s])
+        skyconv_hadec.clear_apco_cache()
         set_sync(alt=alt, az=az)
         if daterun.returncode == 0:
             settings.runtime_settings["time_from_gps"] = from_gps
@@ -1262,7 +1398,7 @@ def set_location(lat, long, elevation, name, from_gps=False):
     settings.write_settings(settings.settings)
 
 
-def set_sync(ra=None, dec=None, alt=None, az=None, ha=None, frame="icrs"):
+def set_sync(ra=None, dec=None, alt=None, az=None, ha=None, frame="icrs", body=None):
     """
     Sync the mount to coordinates given acceptable parameters and defined frame.
     :param ra: RA in degrees
@@ -1277,10 +1413,16 @@ def set_sync(ra=None, dec=None, alt=None, az=None, ha=None, frame="icrs"):
     :type ha: float
     :param frame: defaults 'icrs'. which frame, needs to go with parameters, 'icrs', 'tete', 'altaz', 'hadec'
     :type frame: str
+    :param body: Solar system body name, syncs on its position now instead of ra, dec.
+    :type body: str
     :return: Model point size.
     :rtype: int
     """
-    if alt is not None and az is not None:
+    if body is not None:
+        import db
+
+        coord = db.planet_coord(body)
+    elif alt is not None and az is not None:
         frame_args = skyconv.get_frame_init_args("altaz")
         coord = AltAz(alt=alt * u.deg, az=az * u.deg, **frame_args)
     elif ra is not None and dec is not None:
@@ -1297,7 +1439,7 @@ def set_sync(ra=None, dec=None, alt=None, az=None, ha=None, frame="icrs"):
     if settings.runtime_settings["calibration_logging"] and len(calibration_log) > 0:
         calibration_log[-1]["sync"] = coord
     sync(coord)
-    return skyconv.model_real_stepper.size()
+    return model_fitter.default_fitter.size()
 
 
 def set_slew(
@@ -1310,6 +1452,7 @@ def set_slew(
     parking=False,
     ha=None,
     frame="icrs",
+    body=None,
 ):
     """
     Slew to ra-dec, alt-az or, ra_steps-dec_steps.
@@ -1331,7 +1474,10 @@ def set_slew(
     :type ha: float
     :param frame: Frame given defaults 'icrs'
     :type frame: str
-    :return:
+    :param body: Solar system body name, slews to its position now and follows its motion, ra, dec not needed.
+    :type body: str
+    :return: Thread slewing, done when slew is.
+    :rtype: threading.Thread
     """
     global last_target
     target = locals()
@@ -1339,8 +1485,11 @@ def set_slew(
         target["frame"] = "parking"
     if ra_steps is not None and dec_steps is not None:
         last_target = target
-        slew({"ha": ra_steps, "dec": dec_steps})
-        return
+        return slew({"ha": ra_steps, "dec": dec_steps})
+    elif body is not None:
+        import db
+
+        coord = db.planet_coord(body)
     elif alt is not None and az is not None:
         frame_args = skyconv.get_frame_init_args("altaz")
         coord = AltAz(alt=float(alt) * u.deg, az=float(az) * u.deg, **frame_args)
@@ -1358,6 +1507,8 @@ def set_slew(
     if not slewtocheck(coord):
         # print('NNNNNNNNNNNNNNNNNNNNNNNOOOOOOOOOOOOOOOOOTTTT')
         raise Exception("Slew position is below horizon or in keep-out area.")
+    elif not slew_path_check(coord, parking=parking, body=body):
+        raise Exception("Slew path goes through horizon limit or keep-out area.")
     else:
         if settings.runtime_settings["calibration_logging"]:
             frame_args = skyconv.get_frame_init_args(
@@ -1374,7 +1525,7 @@ def set_slew(
                 }
             )
         last_target = target
-        slew(coord, parking)
+        return slew(coord, parking, body)
 
 
 def set_shutdown():
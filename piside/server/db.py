@@ -30,6 +30,27 @@ def to_list_of_dicts(tuple_of_tuples, keys):
     return b
 
 
+def planet_coord(body, obstime=None, location=None):
+    """
+    :param body: Solar system body name, see astropy solar_system_ephemeris.bodies
+    :type body: str
+    :param obstime: Time of position, default now.
+    :type obstime: AstroTime
+    :param location: Observer location, default runtime earth_location.
+    :type location: EarthLocation
+    :return: Apparent body position as ICRS
+    :rtype: ICRS
+    """
+    if obstime is None:
+        obstime = AstroTime.now()
+    if location is None:
+        location = settings.runtime_settings['earth_location']
+    coord = astropy.coordinates.get_body(body, obstime, location=location)
+    # get_body() gives in GCRS. GCRS is good for solar system bodies. We don't
+    # want to convert just take it as is.
+    return ICRS(ra=coord.ra, dec=coord.dec)
+
+
 def search_planets(search, obstime=AstroTime.now(), location=None):
     do_altaz = True
     planet_search = search.lower()
@@ -39,13 +60,7 @@ def search_planets(search, obstime=AstroTime.now(), location=None):
         if body.find('earth') != -1:
             continue
         if body.find(planet_search) != -1:
-            if location is None:
-                location = settings.runtime_settings['earth_location']
-            coord = astropy.coordinates.get_body(body, obstime,
-                                                 location=location)
-            # get_body() gives in GCRS. GCRS is good for solar system bodies. We don't
-            # want to convert just take it as is.
-            coord = ICRS(ra=coord.ra, dec=coord.dec)
+            coord = planet_coord(body, obstime, location)
             if do_altaz:
                 altaz = skyconv.to_altaz(coord, obstime)
                 altaz = {'alt': altaz.alt.deg, 'az': altaz.az.deg}
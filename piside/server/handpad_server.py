@@ -49,6 +49,7 @@ import traceback
 import handpad_menu
 from handpad_menu import Menu, menu_structure, GPSMenu
 import db
+import serial_reader
 
 MAX_BUFFER = 255
 kill = False
@@ -57,23 +58,57 @@ handpad_server = None
 tried_gps_once = False
 
 
+class CommandParser:
+    """
+    Splits handpad output into @...! responses.
+    """
+    def __init__(self):
+        self.buffer = ''
+
+    def reset(self):
+        """
+        Drops partial input, called by SerialReader on resync.
+        """
+        self.buffer = ''
+
+    def feed(self, data):
+        """
+        :param data: Bytes read from serial
+        :type data: bytes
+        :return: Responses
+        :rtype: List[str]
+        """
+        self.buffer += data.decode(errors='replace')
+        responses = []
+        while True:
+            idx = self.buffer.find('@')
+            if idx < 0:
+                self.buffer = ''
+                break
+            end = self.buffer.find('!', idx)
+            if end < 0:
+                self.buffer = self.buffer[idx:]
+                break
+            responses.append(self.buffer[idx:end + 1])
+            self.buffer = self.buffer[end + 1:]
+        return responses
+
+
 class HandpadServer:
     def __init__(self):
         self.serial_lock = threading.RLock()
         self.serial = None
+        self.reader = None
         self.last_devices = []
-        self.buffer = ""
 
     def write_line(self, line_num, line_str):
         with self.serial_lock:
-            self.serial.write(('@D{line_num:d}{line_str:s}!' % line_num, line_str).encode())
-            s=self.__read_serial_cmd()
+            s = self.__command(('@D{line_num:d}{line_str:s}!' % line_num, line_str))
             # print('write_line', s)
 
     def get_buttons(self):
         with self.serial_lock:
-            self.serial.write('@B!'.encode())
-            s = self.__read_serial_cmd()
+            s = self.__command('@B!')
             # print('get_buttons', s)
             ret = []
             for i in range(1, len(s), 2):
@@ -95,52 +130,47 @@ class HandpadServer:
         self.last_devices = all_devices
         return diff_devices
 
-    def __read_serial_cmd(self, timeout=2):
-        s = self.buffer
-        found_at = False
-        with self.serial_lock:
-            start = time.time()
-            while time.time() - start < timeout:
-                if self.serial.in_waiting > 0:
-                    s += self.serial.read(self.serial.in_waiting).decode()
-                    start = time.time()
-                if not found_at:
-                    idx = s.find('@')
-                    if idx >= 0:
-                        s = s[idx:]
-                        found_at = True
-                if found_at:
-                    idx = s.find('!')
-                    if idx >= 0:
-                        s = s[:idx + 1]
-                        # print(s)
-                        return s
-                time.sleep(0.01)
-        # print(s)
-        # print('timed out')
-        return ''
+    def __command(self, cmd, timeout=2):
+        """
+        :param cmd: Command to send like @B!
+        :type cmd: str
+        :param timeout: Seconds to wait for response.
+        :type timeout: float
+        :return: Response or '' if timed out.
+        :rtype: str
+        """
+        try:
+            return self.reader.request(cmd.encode(), timeout)[-1]
+        except TimeoutError:
+            return ''
+
+    def __close_reader(self):
+        if self.reader:
+            self.reader.close()
+            self.reader = None
 
     def reset(self):
         with self.serial_lock:
+            self.__close_reader()
             self.serial = None
             self.last_devices = []
-            self.buffer = ""
 
     def test(self, device):
         try:
             ser = serial.Serial(device, 115200, timeout=2)
             self.serial = ser
-            if self.serial.in_waiting > 0:
-                self.serial.read(serial.in_waiting)
-            self.serial.write('@SSTHP!'.encode())
-            s = self.__read_serial_cmd()
+            self.reader = serial_reader.SerialReader(self.serial, CommandParser(), lambda response: True,
+                                                     name='handpad_serial')
+            s = self.__command('@SSTHP!')
             # print('test', s)
             if re.match('@SSTHP_\d{3}!', s):
                 return True
             else:
+                self.__close_reader()
                 self.serial.close()
                 self.serial = None
         except:
+            self.__close_reader()
             if self.serial:
                 self.serial.close()
                 self.serial = None
@@ -148,6 +178,7 @@ class HandpadServer:
 
     def close(self):
         with self.serial_lock:
+            self.__close_reader()
             if self.serial:
                 self.serial.close()
                 self.serial = None
@@ -156,8 +187,7 @@ class HandpadServer:
         with self.serial_lock:
             i = 20 - len(text[0:20])
             text += ' '*i
-            self.serial.write('@D{line:d}{text:s}!'.format(text=text, line=line).encode())
-            s = self.__read_serial_cmd()
+            s = self.__command('@D{line:d}{text:s}!'.format(text=text, line=line))
             # print('println', s)
 
     def clearall(self):
@@ -166,20 +196,17 @@ class HandpadServer:
 
     def clearln(self, line):
         with self.serial_lock:
-            self.serial.write('@D{line:d}{text:s}!'.format(text=' ' * 20, line=line).encode())
-            s = self.__read_serial_cmd()
+            s = self.__command('@D{line:d}{text:s}!'.format(text=' ' * 20, line=line))
             # print('clearln', s)
 
     def set_brightness(self, level):
         with self.serial_lock:
-            self.serial.write('@L{level:d}!'.format(level=level).encode())
-            s = self.__read_serial_cmd()
+            s = self.__command('@L{level:d}!'.format(level=level))
             # print('brightness', s)
 
     def input(self):
         with self.serial_lock:
-            self.serial.write('@B!'.encode())
-            s = self.__read_serial_cmd()
+            s = self.__command('@B!')
             # print('input', s)
             if len(s) > 2:
                 return s[1:len(s) - 1]
@@ -187,8 +214,7 @@ class HandpadServer:
 
     def released(self):
         with self.serial_lock:
-            self.serial.write('@J!'.encode())
-            s = self.__read_serial_cmd()
+            s = self.__command('@J!')
             # print('released', s)
             if len(s) > 2:
                 return s[len(s) - 2]
@@ -196,8 +222,7 @@ class HandpadServer:
 
     def pressed(self):
         with self.serial_lock:
-            self.serial.write('@K!'.encode())
-            s = self.__read_serial_cmd()
+            s = self.__command('@K!')
             # print('pressed', s)
             if len(s) > 2:
                 return s[1:len(s) - 1]
@@ -205,8 +230,7 @@ class HandpadServer:
 
     def gps(self):
         with self.serial_lock:
-            self.serial.write('@GPS!'.encode())
-            s = self.__read_serial_cmd(10)
+            s = self.__command('@GPS!', 10)
             s = s[1:]
             s = s[:len(s)-1]
             return s.split('\n')
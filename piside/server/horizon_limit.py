@@ -0,0 +1,125 @@
+"""
+Horizon limit checks. A HorizonLimit is built once from settings and can check arrays of alt/az/dec at once.
+"""
+import numpy
+
+
+class HorizonLimit:
+    def __init__(self, points=None, enabled=True, dec_greater_than=-90.0, dec_less_than=90.0):
+        """
+        :param points: Horizon limit points [{'alt': float, 'az': float}, ...], limit is linear between them.
+        :type points: List[Dict[str, float]]
+        :param enabled: If horizon limit is enabled, when false nothing is below the limit.
+        :type enabled: bool
+        :param dec_greater_than: Dec has to be greater than this.
+        :type dec_greater_than: float
+        :param dec_less_than: Dec has to be less than this.
+        :type dec_less_than: float
+        """
+        self.enabled = bool(enabled)
+        self.dec_greater_than = float(dec_greater_than)
+        self.dec_less_than = float(dec_less_than)
+        if points:
+            points = sorted(points, key=lambda p: p['az'])
+        else:
+            points = []
+        self.points = [{'alt': float(p['alt']), 'az': float(p['az'])} for p in points]
+        self.az = numpy.array([p['az'] for p in self.points], dtype=float)
+        self.alt = numpy.array([p['alt'] for p in self.points], dtype=float)
+        if len(self.points) > 1:
+            d_az = numpy.diff(self.az)
+            with numpy.errstate(divide='ignore', invalid='ignore'):
+                self.slope = numpy.where(d_az > 0, numpy.diff(self.alt) / d_az, 0.0)
+        else:
+            self.slope = numpy.zeros(0)
+
+    def limit_alt(self, az):
+        """
+        Altitude of the horizon limit line at azimuth.
+        :param az: Azimuth degrees
+        :type az: Union[float, numpy.ndarray]
+        :return: Limit altitude in degrees, nan where there is no limit.
+        :rtype: numpy.ndarray
+        """
+        az = numpy.asarray(az, dtype=float)
+        if len(self.points) == 0:
+            return numpy.full(az.shape, numpy.nan)
+        if len(self.points) == 1:
+            return numpy.full(az.shape, self.alt[0])
+        idx = numpy.searchsorted(self.az, az, side='right') - 1
+        inside = (idx >= 0) & (idx < len(self.points) - 1)
+        idx = numpy.clip(idx, 0, len(self.points) - 2)
+        limit = self.alt[idx] + self.slope[idx] * (az - self.az[idx])
+        return numpy.where(inside, limit, numpy.nan)
+
+    def below(self, alt, az, dec=None):
+        """
+        Checks if coordinates are below the horizon limit or outside of the dec limits.
+        :param alt: Altitude degrees
+        :type alt: Union[float, numpy.ndarray]
+        :param az: Azimuth degrees
+        :type az: Union[float, numpy.ndarray]
+        :param dec: TETE declination degrees, if None dec limits are not checked.
+        :type dec: Union[None, float, numpy.ndarray]
+        :return: True where below the limit, bool if scalar arguments.
+        :rtype: Union[bool, numpy.ndarray]
+        """
+        alt, az = numpy.broadcast_arrays(numpy.asarray(alt, dtype=float), numpy.asarray(az, dtype=float))
+        ret = numpy.zeros(alt.shape, dtype=bool)
+        if self.enabled:
+            if dec is not None:
+                dec = numpy.asarray(dec, dtype=float)
+                ret = ret | (dec > self.dec_less_than) | (dec < self.dec_greater_than)
+            if len(self.points) == 1:
+                ret = ret | (alt <= self.alt[0])
+            elif len(self.points) > 1:
+                limit = self.limit_alt(az)
+                with numpy.errstate(invalid='ignore'):
+                    ret = ret | (alt < limit)
+        if ret.ndim == 0:
+            return bool(ret)
+        return ret
+
+    def lut(self, resolution=1.0):
+        """
+        Dense azimuth table of limit altitudes.
+        :param resolution: Degrees between table entries.
+        :type resolution: float
+        :return: {'az': [...], 'alt': [...]}, alt is None where there is no limit.
+        :rtype: Dict[str, list]
+        """
+        az = numpy.arange(0.0, 360.0, resolution)
+        alt = self.limit_alt(az)
+        return {'az': az.tolist(), 'alt': [None if numpy.isnan(a) else a for a in alt.tolist()]}
+
+    def to_dict(self, resolution=None):
+        """
+        :param resolution: If not None includes a lut with this resolution.
+        :type resolution: float
+        :return: Horizon limit as a json friendly dictionary.
+        :rtype: dict
+        """
+        ret = {
+            'enabled': self.enabled,
+            'dec_greater_than': self.dec_greater_than,
+            'dec_less_than': self.dec_less_than,
+            'points': self.points
+        }
+        if resolution is not None:
+            ret['lut'] = self.lut(resolution)
+        return ret
+
+
+def from_settings(settings_dict):
+    """
+    Makes a HorizonLimit from settings.
+    :param settings_dict: Settings like settings.settings
+    :type settings_dict: dict
+    :rtype: HorizonLimit
+    """
+    return HorizonLimit(
+        points=settings_dict.get('horizon_limit_points', None),
+        enabled=settings_dict['horizon_limit_enabled'],
+        dec_greater_than=settings_dict['horizon_limit_dec']['greater_than'],
+        dec_less_than=settings_dict['horizon_limit_dec']['less_than']
+    )
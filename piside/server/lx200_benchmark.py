@@ -0,0 +1,90 @@
+"""
+Replays an LX200 command stream through LX200Client parsing and dispatch and reports commands per second.
+
+    python lx200_benchmark.py [capture_file] [--seconds 2] [--dispatch-only]
+
+capture_file has the raw bytes a client sent, without one a SkySafari/PHD2 like stream is used. Commands that would
+move the mount or change time/location are only looked up, not run.
+"""
+import argparse
+import time
+
+import control
+import lx200proto_server
+from lx200proto_server import LX200Client
+
+# SkySafari polling position and slew status, PHD2 guiding pulses, a goto.
+DEFAULT_STREAM = (
+    b"\x06:GVP#:GVN#:GVD#:GW#:U#:GR#:GD#"
+    + b":GR#:GD#:D#" * 20
+    + b":Mgn0120#:GR#:GD#:Mge0250#:Mgs0100#:Mgw0080#" * 10
+    + b":Sr 05:35:17#:Sd -05*23:28#:MS#:D#:GR#:GD#"
+    + b":GA#:GZ#:GR#:GD#" * 10
+    + b":RS#:Mn#:Qn#:RG#:Q#"
+)
+
+SIDE_EFFECT_HANDLERS = {
+    LX200Client.cmd_sync, LX200Client.cmd_park, LX200Client.cmd_set_park, LX200Client.cmd_start_tracking,
+    LX200Client.cmd_slew, LX200Client.cmd_guide, LX200Client.cmd_manual_slew, LX200Client.cmd_halt,
+    LX200Client.cmd_halt_direction, LX200Client.cmd_set_date, LX200Client.cmd_set_site_lon,
+    LX200Client.cmd_set_utc_offset, LX200Client.cmd_set_local_time, LX200Client.cmd_set_site_lat
+}
+
+
+def replay(client, stream, dispatch_only=False):
+    """
+    :param client: Client to replay through
+    :type client: LX200Client
+    :param stream: Raw bytes sent by client
+    :type stream: bytes
+    :param dispatch_only: If true only parses and looks up handlers.
+    :type dispatch_only: bool
+    :return: Number of commands
+    :rtype: int
+    """
+    count = 0
+    for cmd in client.parse(stream):
+        count += 1
+        if cmd == b"\x06":
+            continue
+        handler = client.handler(cmd)
+        if dispatch_only or handler is None or handler in SIDE_EFFECT_HANDLERS:
+            continue
+        control.set_alive(client.client_id)
+        handler(client, cmd)
+    client.take_replies()
+    return count
+
+
+def run(stream=DEFAULT_STREAM, seconds=2.0, dispatch_only=False):
+    """
+    :return: Commands per second
+    :rtype: float
+    """
+    if not control.last_status:
+        control.last_status = {"alt": 45.0, "az": 180.0, "tete_ra": 83.8, "tete_dec": -5.39, "slewing": False}
+    client = LX200Client(("benchmark", 0))
+    count = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        count += replay(client, stream, dispatch_only)
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LX200 command parser benchmark")
+    parser.add_argument("capture_file", nargs="?", help="Raw bytes sent by an LX200 client")
+    parser.add_argument("--seconds", type=float, default=2.0)
+    parser.add_argument("--dispatch-only", action="store_true", help="Only parse and look up handlers")
+    args = parser.parse_args()
+    stream = DEFAULT_STREAM
+    if args.capture_file:
+        with open(args.capture_file, "rb") as f:
+            stream = f.read()
+    lx200proto_server.DEBUG_PROT = False
+    rate = run(stream, args.seconds, args.dispatch_only)
+    print("%.0f commands/second" % rate)
+
+
+if __name__ == "__main__":
+    main()
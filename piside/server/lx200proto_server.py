@@ -1,10 +1,15 @@
+import asyncio
+import concurrent.futures
+import functools
+import math
 import socket
 import traceback
 import re
 import uuid
-import threading
 import control
+import metrics
 import pendulum
+import scheduler
 import settings
 import typing
 import sys
@@ -14,7 +19,16 @@ DEBUG_PROT = False
 
 ourport = 10002
 kill = False
-lx200Clients = {}
+# Connected clients, removed when they disconnect
+lx200_clients = set()
+MAX_COMMAND_LENGTH = 1024
+# Commands starting with these only read state so are answered on the event loop, others might block on
+# control and are run on the executor.
+INLINE_COMMAND_PREFIXES = (":G", ":D", ":U", ":F", ":P", ":A", ":V", ":R", ":L", ":?")
+COMMAND_WORKERS = 4
+_loop = None  # type: typing.Optional[asyncio.AbstractEventLoop]
+_stop_event = None  # type: typing.Optional[asyncio.Event]
+FORMAT_CACHE_SIZE = 4096
 utctz = pendulum.timezone("UTC")
 set_utc_offset = pendulum.from_timestamp(0, pendulum.now().timezone).offset_hours
 localtime_daylight_savings = False
@@ -22,9 +36,9 @@ manual_slew_map = {"w": "left", "e": "right", "n": "up", "s": "down"}
 slew_speed_map = {"S": "fastest", "M": "faster", "C": "slower", "G": "slowest"}
 slew_speed = "fastest"
 target = {"ra": None, "dec": None, "alt": None, "az": None}  # type: typing.Dict[str, typing.Optional[float]]
-slew_intervals = {"n": None, "s": None, "e": None, "w": None}  # type: typing.Dict[str, typing.Optional[threading.Timer]]
+slew_intervals = {"n": None, "s": None, "e": None, "w": None}  # type: typing.Dict[str, typing.Optional[scheduler.Handle]]
 slewing_time_buffer = False
-slewing_time_buffer_timer = None  # type: typing.Optional[threading.Timer]
+slewing_time_buffer_timer = None  # type: typing.Optional[scheduler.Handle]
 extra_logging = False
 
 use_holders = True
@@ -86,8 +100,7 @@ def slew_commanded():
     if slewing_time_buffer_timer is not None:
         slewing_time_buffer_timer.cancel()
     slewing_time_buffer = True
-    slewing_time_buffer_timer = threading.Timer(3, slew_commanded_delay_done)
-    slewing_time_buffer_timer.start()
+    slewing_time_buffer_timer = scheduler.call_later(3, slew_commanded_delay_done)
 
 
 def ra_format(ra_deg, high_precision=True):
@@ -136,6 +149,57 @@ def az_format(az, high_precision=True):
         return "%03d*%02d#" % (deg, arcmin)
 
 
+# Formatted positions are cached by 0.1 second (RA) or arcsecond bins. Output units are whole bins so the bin center
+# formats the same as any value in the bin.
+@functools.lru_cache(FORMAT_CACHE_SIZE)
+def _ra_format_bin(ra_bin, high_precision):
+    return ra_format((ra_bin + 0.5) / 2400.0, high_precision)
+
+
+@functools.lru_cache(FORMAT_CACHE_SIZE)
+def _dec_format_bin(dec_bin, positive, high_precision):
+    dec = (dec_bin + 0.5) / 36000.0
+    return dec_format(dec if positive else -dec, high_precision)
+
+
+@functools.lru_cache(FORMAT_CACHE_SIZE)
+def _az_format_bin(az_bin, high_precision):
+    return az_format((az_bin + 0.5) / 36000.0, high_precision)
+
+
+def ra_format_cached(ra_deg, high_precision=True):
+    """
+    Same as ra_format but memoized.
+    """
+    return _ra_format_bin(math.floor(ra_deg * 2400.0), high_precision)
+
+
+def dec_format_cached(dec, high_precision=True):
+    """
+    Same as dec_format but memoized.
+    """
+    # dec_format truncates towards zero and zero has - sign
+    return _dec_format_bin(math.floor(abs(dec) * 36000.0), dec > 0, high_precision)
+
+
+def az_format_cached(az, high_precision=True):
+    """
+    Same as az_format but memoized.
+    """
+    return _az_format_bin(math.floor(az * 36000.0), high_precision)
+
+
+def current_position():
+    """
+    :return: Position extrapolated to now, or last status if not known.
+    :rtype: dict
+    """
+    position = control.positions.position()
+    if position is None:
+        return control.last_status
+    return position
+
+
 def ra_to_deg(hours, minutes, seconds=0.0):
     return (hours + minutes / 60.0 + seconds / 3600.0) * (360.0 / 24.0)
 
@@ -148,11 +212,12 @@ def dec_to_deg(sign, deg, minutes, seconds=0.0):
 
 
 class LX200Client:
-    def __init__(self, socket_conn, client_address):
+    def __init__(self, client_address):
         self.client_id = str(uuid.uuid4())
-        self.socket = socket_conn
         self.client_address = client_address
-        self.buf = ""
+        # Replies written by process(), sent after it returns
+        self.replies = []
+        self.buf = b""
         self.is_highprecision = False
         # self.re_autostar_settime_cmd = re.compile(":hI\\d{12}#")
         # self.re_select_ds_libary_cmd = re.compile(":Lo\\d#")
@@ -227,658 +292,659 @@ class LX200Client:
 
         self.utc_offset = None
 
-    def read(self):
-        try:
-            cmdbuf = ""
-            while not kill:
-                b = self.socket.recv(1024)
-                # print('read2', b)
-                if len(b) == 0:
-                    # print('Socket done')
-                    return
-                buffer = b.decode("utf8").strip()
-                # if DEBUG_PROT:
-                #    print("Buffer ", buffer)
-                for i in range(len(buffer)):
-                    c = buffer[i]
-                    if c == "\x06":  # Alignment Query
-                        self.write(b"P")
-                        continue
-                    if len(cmdbuf) == 0 and c == ":":
-                        cmdbuf = ":"
-                    elif len(cmdbuf) > 0:
-                        cmdbuf += c
-                    if len(cmdbuf) > 2 and c == "#":
-                        if DEBUG_PROT:
-                            t = time.time()
-                            print("Process: ", cmdbuf)
-                        self.process(cmdbuf)
-                        cmdbuf = ""
-                        if DEBUG_PROT:
-                            print("Process time:", time.time() - t)
-                if len(cmdbuf) > 1024:
-                    cmdbuf = ""
-        except KeyboardInterrupt:
-            raise
-        except:
-            traceback.print_exc()
+    def parse(self, data):
+        """
+        Splits received data into commands.
+        :param data: Bytes received
+        :type data: bytes
+        :return: Commands like ':GR#', b'\\x06' for alignment queries.
+        :rtype: List[Union[str, bytes]]
+        """
+        cmds = [b"\x06"] * data.count(b"\x06")
+        if cmds:
+            data = data.replace(b"\x06", b"")
+        self.buf += data
+        if len(self.buf) > MAX_COMMAND_LENGTH and b"#" not in self.buf:
+            self.buf = b""
+        while True:
+            end = self.buf.find(b"#")
+            if end < 0:
+                break
+            start = self.buf.find(b":", 0, end)
+            if start >= 0 and end - start > 1:
+                cmds.append(self.buf[start:end + 1].decode("utf8", "replace"))
+            self.buf = self.buf[end + 1:]
+        return cmds
+
+    def take_replies(self):
+        """
+        :return: Replies written since last call.
+        :rtype: bytes
+        """
+        replies = b"".join(self.replies)
+        self.replies = []
+        return replies
+
+    def handler(self, cmd):
+        """
+        Finds the handler for a command, exact commands first then by prefix.
+        :param cmd: Command like ':GR#'
+        :type cmd: str
+        :return: Handler function taking (self, cmd) or None if unhandled.
+        :rtype: Union[None, Callable[[LX200Client, str], None]]
+        """
+        handler = self.exact_commands.get(cmd)
+        if handler is None:
+            handler = self.prefix_commands.get(cmd[:3])
+            if handler is None:
+                handler = self.prefix_commands.get(cmd[:2])
+        return handler
 
     def process(self, cmd):
-        global \
-            set_utc_offset, \
-            localtime_daylight_savings, \
-            slew_speed, \
-            target, \
-            slew_intervals, \
-            slewing_time_buffer
         # print('process', cmd)
         control.set_alive(self.client_id)
-        if cmd == ":Aa#":  # Start automatic alignment sequence
-            self.write(b"0")
-        elif cmd == ":CM#":
-            # Sychronize with current selected object coords PRIORITY DONE
+        handler = self.handler(cmd)
+        if handler is None:
+            print("!!UNHANDLED CMD: ", cmd, file=sys.stderr)
+        else:
+            with metrics.timer('lx200_command_seconds', command=handler.__name__):
+                handler(self, cmd)
+
+    def cmd_write_0(self, cmd):
+        self.write(b"0")
+
+    def cmd_write_1(self, cmd):
+        self.write(b"1")
+
+    def cmd_ignore(self, cmd):
+        pass
+
+    def cmd_sync(self, cmd):
+        # Sychronize with current selected object coords PRIORITY DONE
+        if target["ra"] and target["dec"]:
+            control.set_sync(ra=target["ra"], dec=target["dec"], frame="tete")
+            self.write(b"M31 EX GAL MAG 3.5 SZ178.0'#")
+        elif target["alt"] and target["az"]:
+            control.set_sync(alt=target["alt"], dec=target["az"], frame="altaz")
+            self.write(b"M31 EX GAL MAG 3.5 SZ178.0'#")
+        else:
+            print("!!UNHANDLED CMD: ", cmd, file=sys.stderr)
+
+    def cmd_distance_bars(self, cmd):  # PRIORITY
+        # If slewing hashes till how close we are? 0-8 #
+        # Check three sources to avoid false "not slewing" reports:
+        #   slewing_time_buffer: bridges the gap between :MS# and the slew
+        #     thread setting control.slewing = True
+        #   control.slewing: live flag set by the slew thread (no 1s delay)
+        #   control.last_status["slewing"]: status snapshot updated every ~1s
+        if slewing_time_buffer or control.slewing or control.last_status["slewing"]:
+            self.write(b"\x7f\x7f#")
+        else:
+            self.write(b"#")  # or is it b'' ?
+
+    def cmd_get_local_time_12(self, cmd):
+        # self.write(b'HH:MM:SS#')
+        self.write(pendulum.now(tz=set_utc_offset).strftime("%I:%M:%S#").encode())
+
+    def cmd_get_alt(self, cmd):
+        # self.write(b'sDD*MM\'SS#')
+        self.write(dec_format_cached(current_position()["alt"], self.is_highprecision).encode())
+
+    def cmd_get_date(self, cmd):  # PRIORITY DONE
+        # self.write(b'MM/DD/YY#')
+        self.write(pendulum.now(tz=set_utc_offset).strftime("%m/%d/%y#").encode())
+
+    def cmd_get_dec(self, cmd):  # PRIORITY DONE
+        # self.write(b'sDD*MM\'SS#')
+        reply = dec_format_cached(current_position()["tete_dec"], self.is_highprecision).encode()
+        if DEBUG_PROT:
+            print("Reply ", reply)
+        self.write(reply)
+
+    def cmd_get_utc_offset(self, cmd):  # PRIORITY DONE
+        # self.write(b'sHH.H#')
+        s = ""
+        if set_utc_offset > 0:
+            s = "+"
+        if set_utc_offset.is_integer():
+            self.write(("%s%02d#" % (s, int(set_utc_offset))).encode())
+        else:
+            self.write(("%s%04.1f#" % (s, set_utc_offset)).encode())
+
+    def cmd_get_site_lon(self, cmd):  # PRIORITY DONE
+        # TODO: dec says east should be negative, is that true?
+        # self.write(b'sDDD*MM#')
+        lon = settings.runtime_settings["earth_location"].lon.deg
+        # lon = -lon                 # if east should be negative
+        # TODO: Can be high precision?
+        self.write(lon_format(lon, False).encode())
+
+    def cmd_get_local_time_24(self, cmd):  # PRIORITY DONE
+        # self.write(b'HH:MM:SS#')
+        self.write(pendulum.now(tz=set_utc_offset).strftime("%H:%M:%S#").encode())
+
+    def cmd_get_ra(self, cmd):  # PRIORITY DONE
+        # self.write(b'HH:MM:SS#')
+        control.set_alive(self.client_id)
+        reply = ra_format_cached(current_position()["tete_ra"], self.is_highprecision).encode()
+        if DEBUG_PROT:
+            print("Reply ", reply)
+        self.write(reply)
+
+    def cmd_get_site_lat(self, cmd):  # PRIORITY DONE
+        # self.write(b'sDD*MM#') s is sign
+        lat = settings.runtime_settings["earth_location"].lat.deg
+        self.write(dec_format(lat, False).encode())
+
+    def cmd_get_firmware_date(self, cmd):
+        self.write((control.version_date_str + "#").encode())
+
+    def cmd_get_firmware_number(self, cmd):
+        self.write((control.version_short + "#").encode())
+
+    def cmd_get_firmware_full(self, cmd):
+        self.write(("SSTEQ25 " + control.version + "#").encode())
+
+    def cmd_get_az(self, cmd):
+        # self.write(b'DDD*MM\'SS#')
+        self.write(az_format_cached(current_position()["az"], self.is_highprecision).encode())
+
+    def cmd_park(self, cmd):  # slew to park position
+        control.park_scope()
+        slew_commanded()
+
+    def cmd_set_park(self, cmd):  # set current position as park position
+        control.set_park_position_here()
+
+    def cmd_start_tracking(self, cmd):
+        # :hW# autostar wake up scope
+        # :I# stop and restart scope -- kstars unpark
+        # TODO: Need to do more for kstars to know we are unparked.
+        control.start_tracking()
+
+    def cmd_slew(self, cmd):  # slew to target object PRIORITY DONE
+        # 0 slew is possible, 1<string># object below string, 2<string># object higher
+        try:
             if target["ra"] and target["dec"]:
-                control.set_sync(ra=target["ra"], dec=target["dec"], frame="tete")
-                self.write(b"M31 EX GAL MAG 3.5 SZ178.0'#")
+                control.set_slew(ra=target["ra"], dec=target["dec"], frame="tete")
+                slew_commanded()
             elif target["alt"] and target["az"]:
-                control.set_sync(alt=target["alt"], dec=target["az"], frame="altaz")
-                self.write(b"M31 EX GAL MAG 3.5 SZ178.0'#")
-            else:
-                print("!!UNHANDLED CMD: ", cmd, file=sys.stderr)
-        elif cmd[1] == "D":  # PRIORITY
-            # If slewing hashes till how close we are? 0-8 #
-            # Check three sources to avoid false "not slewing" reports:
-            #   slewing_time_buffer: bridges the gap between :MS# and the slew
-            #     thread setting control.slewing = True
-            #   control.slewing: live flag set by the slew thread (no 1s delay)
-            #   control.last_status["slewing"]: status snapshot updated every ~1s
-            if slewing_time_buffer or control.slewing or control.last_status["slewing"]:
-                self.write(b"\x7f\x7f#")
+                control.set_slew(alt=target["alt"], az=target["az"], frame="altaz")
+                slew_commanded()
             else:
-                self.write(b"#")  # or is it b'' ?
-        elif cmd == ":FB#":  # Query focus busy status
+                self.write(b"1Unable to slew#")
+                return
             self.write(b"0")
-        elif cmd[1] == "G":
-            if cmd == ":Ga#":  # Get Local Telescope Time in 12 Hour Format
-                # self.write(b'HH:MM:SS#')
-                self.write(
-                    pendulum.now(tz=set_utc_offset).strftime("%I:%M:%S#").encode()
-                )
-            elif cmd == ":GA#":  # Get Telescope Altitude
-                # self.write(b'sDD*MM\'SS#')
-                self.write(
-                    dec_format(
-                        control.last_status["alt"], self.is_highprecision
-                    ).encode()
-                )
-            elif cmd == ":Gb#":  # Browser Brighter Mag Limit
-                self.write(b"s10.1#")
-            elif cmd == ":GC#":  # Get current date PRIORITY DONE
-                # self.write(b'MM/DD/YY#')
-                self.write(
-                    pendulum.now(tz=set_utc_offset).strftime("%m/%d/%y#").encode()
-                )
-            elif cmd == ":Gc#":  # Telescope clock format
-                self.write(b"24#")
-            elif cmd == ":GD#":  # Telescope Declination PRIORITY DONE
-                # self.write(b'sDD*MM\'SS#')
-                reply = dec_format(
-                    control.last_status["tete_dec"], self.is_highprecision
-                ).encode()
-                if DEBUG_PROT:
-                    print("Reply ", reply)
-                self.write(reply)
-            elif cmd == ":Gd#":  # Currently selected target dec
-                # TODO: Get slewto object
-                self.write(b"sDD*MM'SS#")
-            elif cmd == ":GE#":  # Get selnographic Latitude
-                self.write(b"+999*99#")
-            elif cmd == ":GF#":  # Get find field diameter
-                self.write(b"100#")
-            elif cmd == ":Gf#":  # browser faint mag limit
-                self.write(b"s10.1#")
-            elif cmd == ":GG#":  # utc offset time PRIORITY DONE
-                # self.write(b'sHH.H#')
-                s = ""
-                if set_utc_offset > 0:
-                    s = "+"
-                if set_utc_offset.is_integer():
-                    self.write(
-                        (
-                            "%s%02d#"
-                            % (
-                                s,
-                                int(set_utc_offset),
-                            )
-                        ).encode()
-                    )
-                else:
-                    self.write(
-                        (
-                            "%s%04.1f#"
-                            % (
-                                s,
-                                set_utc_offset,
-                            )
-                        ).encode()
-                    )
-            elif cmd == ":Gg#":  # currente site longitude PRIORITY DONE
-                # TODO: dec says east should be negative, is that true?
-                # self.write(b'sDDD*MM#')
-                lon = settings.runtime_settings["earth_location"].lon.deg
-                # lon = -lon                 # if east should be negative
-                # TODO: Can be high precision?
-                self.write(lon_format(lon, False).encode())
-            elif cmd == ":GH#":  # Daylight savings time setting
-                # TODO: The settings of actual dst?
-                self.write(b"1#")
-            elif cmd == ":Gh#":  # High limit
-                # self.write(b'sDD*')
-                self.write(b"+90*")
-            elif cmd == ":GL#":  # time 24 hour format PRIORITY DONE
-                # self.write(b'HH:MM:SS#')
-                self.write(
-                    pendulum.now(tz=set_utc_offset).strftime("%H:%M:%S#").encode()
-                )
-            elif cmd == ":Gm#":  # distance to meridian
-                self.write(b"sDD*MM'SS#")
-            elif cmd == ":Gl#":  # search Large size limit
-                self.write(b"100'#")
-            elif cmd == ":GM#":  # Get Site 1 Name PRIORITY DONE?
-                self.write(b"site1#")
-            elif cmd == ":GN#":  # Get Site 2 name
-                self.write(b"site2#")
-            elif cmd == ":GO#":  # Get Site 3 name
-                self.write(b"site3#")
-            elif cmd == ":GP#":  # Get site 4 name
-                self.write(b"site4#")
-            elif cmd == ":Go#":  # Lower altitude limit
-                self.write(b"00*#")
-            elif cmd == ":Gq#":  # min quality for find
-                self.write(b"SU#")
-            elif cmd == ":GR#":  # telescope RA PRIORITY DONE
-                # self.write(b'HH:MM:SS#')
-                control.set_alive(self.client_id)
-                reply = ra_format(
-                    control.last_status["tete_ra"], self.is_highprecision
-                ).encode()
-                if DEBUG_PROT:
-                    print("Reply ", reply)
-                self.write(reply)
-            elif cmd == ":Gr#":  # current target RA
-                self.write(b"HH:MM:SS#")
-            elif cmd == ":GS#":  # get sidereal time
-                self.write(b"HH:MM:SS#")
-            elif cmd == ":Gs#":  # smaller size limit returned by find
-                self.write(b"100'#")
-            elif cmd == ":GT#":  # Tracking rate in hz #PRIORITY DONE
-                self.write(b"59.8#")
-            elif cmd == ":Gt#":  # current site latitude # PRIORITY DONE
-                # self.write(b'sDD*MM#') s is sign
-                lat = settings.runtime_settings["earth_location"].lat.deg
-                self.write(dec_format(lat, False).encode())
-            elif cmd == ":GVD#":  # telescope firmware date
-                self.write((control.version_date_str + "#").encode())
-            elif cmd == ":GVN#":  # firmware number
-                self.write((control.version_short + "#").encode())
-            elif cmd == ":GVP#":  # Telescope product name
-                self.write(b"SSTEQ25#")
-            elif cmd == ":GVT#":  # telescope firmware time
-                self.write(b"01:00:00#")
-            elif cmd == ":GVF#":  # telescope firmware full
-                self.write(("SSTEQ25 " + control.version + "#").encode())
-            elif cmd == ":GW#":  # Scope alignment status
-                # <mount><tracking><alignment>#
-                # P - equatorial
-                # T - tracking, N - not tracking
-                # 0 - needs alignement, 1 - one star, 2 - two star, 3 - three stared
-                self.write(b"PT0#")
-            elif cmd == ":Gy#":  # objects returned by find/browse
-                self.write(b"gpdco#")
-            elif cmd == ":GZ#":  # Get telescope azimuth
-                # self.write(b'DDD*MM\'SS#')
-                self.write(
-                    az_format(control.last_status["az"], self.is_highprecision).encode()
+        except Exception:
+            traceback.print_exc()
+            self.write(b"1Unable to slew#")
+
+    def cmd_guide(self, cmd):  # PRIORITY2
+        # move guide telescope
+        m = self.re_guide_telescope.match(cmd)
+        direction = m.group(1)
+        time_ms = m.group(2)
+        control.guide_control(direction, int(time_ms))
+
+    def cmd_manual_slew(self, cmd):  # PRIORITY DONE
+        # slew
+        # Set interval
+        # print('LX200 Manual Slew', slew_speed)
+        if slew_intervals[cmd[2]]:
+            slew_intervals[cmd[2]].cancel()
+        control.set_alive(self.client_id)
+        control.manual_control(manual_slew_map[cmd[2]], slew_speed, self.client_id)
+
+    def cmd_halt(self, cmd):  # Halt all slewing PRIORITY DONE
+        for d in ["n", "w", "s", "e"]:
+            if slew_intervals[d]:
+                slew_intervals[d].cancel()
+                slew_intervals[d] = None
+                control.manual_control(manual_slew_map[d], None, self.client_id)
+        control.cancel_slews()
+
+    def cmd_halt_direction(self, cmd):  # halt slew by direction # PRIORITY DONE
+        if slew_intervals[cmd[2]]:
+            slew_intervals[cmd[2]].cancel()
+            slew_intervals[cmd[2]] = None
+        control.manual_control(manual_slew_map[cmd[2]], None, self.client_id)
+
+    def cmd_slew_rate(self, cmd):  # Set guiding rate PRIORITY DONE
+        global slew_speed
+        slew_speed = slew_speed_map[cmd[2]]
+
+    def cmd_set_target_alt(self, cmd):  # PRIORITY2 DONE
+        m = self.re_set_target_object_alt_hp.match(cmd)
+        if m:  # high precision set target object
+            sign = -1.0 if m.group(1) == "-" else 1.0
+            deg = m.group(2)
+            minute = m.group(3)
+            seconds = m.group(4)
+            target["ra"] = None
+            target["dec"] = None
+            target["alt"] = dec_to_deg(sign, float(deg), float(minute), float(seconds))
+            self.write(b"1")
+            return
+        m = self.re_set_target_object_alt.match(cmd)
+        if m:  # low precision set target object
+            sign = -1.0 if m.group(1) == "-" else 1.0
+            deg = m.group(2)
+            minute = m.group(3)
+            target["ra"] = None
+            target["dec"] = None
+            target["alt"] = dec_to_deg(sign, float(deg), float(minute))
+            self.write(b"1")
+
+    def cmd_set_date(self, cmd):
+        m = self.re_set_handbox_date.match(cmd)
+        month = int(m.group(1))
+        day = int(m.group(2))
+        year = int("20" + m.group(3))  # YY
+
+        if not use_holders:
+            dstr = pendulum.now(tz=set_utc_offset).set(year=year, month=month, day=day).isoformat()
+            r = control.set_time(dstr)
+        else:
+            r = set_time(year=year, month=month, day=day)
+        if r[0]:
+            self.write(b"1Updating Planetary Data#                       #")
+        else:
+            self.write("b0")
+
+    def cmd_set_target_dec(self, cmd):  # PRIORITY DONE
+        m = self.re_set_target_obj_dec_hp.match(cmd)
+        if m:
+            sign = -1 if m.group(1) == "-" else 1.0
+            deg = m.group(2)
+            minutes = m.group(3)
+            seconds = m.group(4)
+            target["dec"] = dec_to_deg(sign, float(deg), float(minutes), float(seconds))
+        else:
+            m = self.re_set_target_obj_dec.match(cmd)
+            sign = -1 if m.group(1) == "-" else 1.0
+            deg = m.group(2)
+            minutes = m.group(3)
+            target["dec"] = dec_to_deg(sign, float(deg), float(minutes))
+        target["alt"] = None
+        target["az"] = None
+        self.write(b"1")  # 0 if not accepted/valid
+
+    def cmd_set_site_lon(self, cmd):  # PRIORITY DONE
+        m = self.re_set_site_long.match(cmd)
+        deg = m.group(1)
+        minutes = m.group(2)
+
+        lon = dec_to_deg(1.0, float(deg), float(minutes))
+        if lon > 180:
+            lon = 360.0 - 180
+        else:
+            lon = -lon
+        # print('LX200: Set Long', lon)
+        try:
+            if not use_holders:
+                control.set_location(
+                    settings.runtime_settings["earth_location"].lat.deg, lon, 1000.0, "site1"
                 )
             else:
-                print("!!UNHANDLED CMD: ", cmd, file=sys.stderr)
-        elif cmd[1] == "h":
-            # if cmd == ':hN#':  # autostar sleep scope
-            if cmd == ":hP#":  # slew to park position
-                control.park_scope()
-                slew_commanded()
-            elif cmd == ":hS#":  # set current position as park position
-                control.set_park_position_here()
-            elif cmd == ":hW#":  # autostar wake up scope
-                control.start_tracking()
-            elif cmd == ":h?#":  # autostar query home status
-                self.write(b"0")
-            elif cmd[2] == "I":
-                # m = self.re_autostar_settime_cmd.match(cmd)  # Autostar settime
-                self.write(b"1")
-            else:
-                print("!!UNHANDLED CMD: ", cmd, file=sys.stderr)
+                set_location(lon=lon)
+            self.write(b"1")
+        except Exception:
+            traceback.print_exc()
+            self.write(b"0")
 
-        # :H#'  toggle 24 and 12 hour time format
-        # :I#  # stop and restart scope -- kstars unpark
-        elif cmd == ":I#":
-            # TODO: Need to do more for kstars to know we are unparked.
-            # self.process(':Q#')
-            control.start_tracking()
-            # self.write(b'0')
-        elif cmd[1] == "L":
-            # :LB# :LCNNNN# :LF#
-            if cmd == ":Lf#":
-                self.write(b"0#")
-            elif cmd == ":LI#":
-                self.write(b"NOTHING#")
-            # :LMNNNN# :LN# :LoD#
-            elif cmd[2] == "o":
-                # m = self.re_select_ds_libary_cmd.match(cmd)
-                self.write(b"0")
-            elif cmd[2] == "s":
-                # m = self.re_select_s_libary_cmd.match(cmd)
-                self.write(b"2")
-            else:
-                print("!!UNHANDLED CMD: ", cmd, file=sys.stderr)
-            # :LSNNNN#
-        elif cmd[1] == "M":
-            if cmd == "#MA#":  # Slew to target alt az
-                self.write(b"0")
-            elif cmd == ":MS#":  # slew to target object PRIORITY DONE
-                # 0 slew is possible, 1<string># object below string, 2<string># object higher
-                try:
-                    if target["ra"] and target["dec"]:
-                        control.set_slew(
-                            ra=target["ra"], dec=target["dec"], frame="tete"
-                        )
-                        slew_commanded()
-                    elif target["alt"] and target["az"]:
-                        control.set_slew(
-                            alt=target["alt"], az=target["az"], frame="altaz"
-                        )
-                        slew_commanded()
-                    else:
-                        self.write(b"1Unable to slew#")
-                        return
-                    self.write(b"0")
-                except Exception:
-                    traceback.print_exc()
-                    self.write(b"1Unable to slew#")
-            elif cmd[2] == "g":  # PRIORITY2
-                # move guide telescope
-                m = self.re_guide_telescope.match(cmd)
-                direction = m.group(1)
-                time_ms = m.group(2)
-                control.guide_control(direction, int(time_ms))
-            elif cmd[2] in ["n", "s", "e", "w"]:  # PRIORITY DONE
-                # slew
-                # Set interval
-                # print('LX200 Manual Slew', slew_speed)
-                if slew_intervals[cmd[2]]:
-                    slew_intervals[cmd[2]].cancel()
-                control.set_alive(self.client_id)
-                control.manual_control(
-                    manual_slew_map[cmd[2]], slew_speed, self.client_id
+    def cmd_set_utc_offset(self, cmd):  # PRIORITY
+        global set_utc_offset
+        m = self.re_set_site_hours_add_utc.match(cmd)
+        sign = m.group(1)  # + or -
+        hours = m.group(2)
+        # They give us hours added to localtime to get UTC, so neg is positive for offset
+        offset = float(hours) * (1.0 if sign == "-" else -1.0)
+        doffset = set_utc_offset - offset
+        if not use_holders:
+            dstr = pendulum.now().add(hours=doffset).isoformat()
+            r = control.set_time(dstr)
+        else:
+            r = set_time(offset=offset)
+        if r[0]:
+            set_utc_offset = offset
+            self.write(b"1")
+        else:
+            self.write(b"0")
+
+    def cmd_set_dst(self, cmd):
+        global localtime_daylight_savings
+        m = self.re_set_dst.match(cmd)
+        dst_enabled = m.group(1) == "1"
+        localtime_daylight_savings = dst_enabled
+        # TODO: Should this adjust localtime or utc_offset any?
+        self.write(b"1")
+
+    def cmd_set_local_time(self, cmd):  # PRIORITY DONE
+        m = self.re_set_local_time.match(cmd)
+        hour = int(m.group(1))
+        minute = int(m.group(2))
+        second = int(m.group(3))
+        # print('Trying to set time')
+
+        if not use_holders:
+            dstr = pendulum.now(tz=set_utc_offset).set(hour=hour, minute=minute, second=second).isoformat()
+            r = control.set_time(dstr)
+        else:
+            r = set_time(hour=hour, minute=minute, second=second)
+        if r[0]:
+            self.write(b"1")
+        else:
+            self.write(b"0")
+
+    def cmd_set_site_name(self, cmd):
+        m = self.re_set_site_name.match(cmd)
+        site = m.group(1)  # M = site1, N=site2, O=site3, P = site4
+        name = m.group(2)
+        self.write(b"1")
+
+    def cmd_set_altitude_low_limit(self, cmd):
+        m = self.re_set_altitude_low_limit.match(cmd)
+        alt = m.group(1)
+        self.write(b"1")
+
+    def cmd_set_target_ra(self, cmd):  # PRIORITY DONE
+        m = self.re_set_target_object_ra_hp.match(cmd)
+        if m:
+            hour = m.group(1)
+            minutes = m.group(2)
+            seconds = m.group(3)
+            target["ra"] = ra_to_deg(float(hour), float(minutes), float(seconds))
+        else:
+            m = self.re_set_target_object_ra.match(cmd)
+            hour = m.group(1)
+            minutes = m.group(2)
+            target["ra"] = ra_to_deg(float(hour), float(minutes))
+        target["alt"] = None
+        target["az"] = None
+        self.write(b"1")
+
+    def cmd_set_site_lat(self, cmd):  # PRIORITY DONE
+        m = self.re_set_current_site_latitude_hp.match(cmd)
+        if m:
+            sign = -1 if m.group(1) == "-" else 1.0
+            deg = m.group(2)
+            minute = m.group(3)
+            seconds = m.group(4)
+        else:
+            m = self.re_set_current_site_latitude.match(cmd)
+            sign = -1 if m.group(1) == "-" else 1.0
+            deg = m.group(2)
+            minute = m.group(3)
+            seconds = 0.0
+        try:
+            lat = dec_to_deg(sign, float(deg), float(minute), float(seconds))
+            # print('Set lat:', lat)
+            if not use_holders:
+                control.set_location(
+                    lat, settings.runtime_settings["earth_location"].lon.deg, 1000.0, "site1"
                 )
             else:
-                print("!!UNHANDLED CMD: ", cmd, file=sys.stderr)
-        elif cmd == ":P#":
-            self.write(b"LOW PRECISION")
-        elif cmd[1] == "Q":
-            # :$Q# :$QA+# :$QA-#
-            if cmd == ":$QC#":
-                self.write(b"00000#")
-            # :$QGNNNNN# :$QP<p><n><n># :$QS+# :$QS-# :$QU+# :$QU-# :$QV+# :$QV-#
-            elif cmd == ":$QW#":  # Write mount model to non-volatile memory
-                self.write(b"0")
-            # :$QZ+# :$QZ-#
-            elif cmd[2] == "#":  # Halt all slewing PRIORITY DONE
-                for d in ["n", "w", "s", "e"]:
-                    if slew_intervals[d]:
-                        slew_intervals[d].cancel()
-                        slew_intervals[d] = None
-                        control.manual_control(manual_slew_map[d], None, self.client_id)
-                control.cancel_slews()
-            elif cmd[2] in [
-                "e",
-                "n",
-                "w",
-                "s",
-            ]:  # halt slew by direction # PRIORITY DONE
-                if slew_intervals[cmd[2]]:
-                    slew_intervals[cmd[2]].cancel()
-                    slew_intervals[cmd[2]] = None
-                control.manual_control(manual_slew_map[cmd[2]], None, self.client_id)
-            else:
-                print("!!UNHANDLED CMD: ", cmd, file=sys.stderr)
+                set_location(lat=lat)
+            self.write(b"1")
+        except Exception:
+            traceback.print_exc()
+            self.write(b"0")
+
+    def cmd_set_max_slew_degrees(self, cmd):
+        m = self.re_set_max_slew_degrees.match(cmd)
+        deg = m.group(1)  # expect 2 through 8
+        self.write(b"1")
+
+    def cmd_set_target_az(self, cmd):
+        m = self.re_set_target_azimuth.match(cmd)
+        deg = m.group(1)
+        minutes = m.group(2)
+        self.write(b"1")
+
+    def cmd_toggle_precision(self, cmd):  # toggle between high low precision positions
+        self.is_highprecision = not self.is_highprecision
+
+    def cmd_site_select(self, cmd):
+        m = self.re_site_select.match(cmd)
+        site = m.group(1)  # 1 through 4
+
+    def fixed_reply(reply):
+        """
+        :param reply: What to write
+        :type reply: bytes
+        :return: Handler that writes reply.
+        """
+        def cmd_fixed_reply(self, cmd):
+            self.write(reply)
+        return cmd_fixed_reply
+
+    # Commands matched whole
+    exact_commands = {
+        ":Aa#": cmd_write_0,  # Start automatic alignment sequence
+        ":CM#": cmd_sync,
+        ":FB#": cmd_write_0,  # Query focus busy status
+        ":Ga#": cmd_get_local_time_12,
+        ":GA#": cmd_get_alt,
+        ":Gb#": fixed_reply(b"s10.1#"),  # Browser Brighter Mag Limit
+        ":GC#": cmd_get_date,
+        ":Gc#": fixed_reply(b"24#"),  # Telescope clock format
+        ":GD#": cmd_get_dec,
+        ":Gd#": fixed_reply(b"sDD*MM'SS#"),  # Currently selected target dec TODO: Get slewto object
+        ":GE#": fixed_reply(b"+999*99#"),  # Get selnographic Latitude
+        ":GF#": fixed_reply(b"100#"),  # Get find field diameter
+        ":Gf#": fixed_reply(b"s10.1#"),  # browser faint mag limit
+        ":GG#": cmd_get_utc_offset,
+        ":Gg#": cmd_get_site_lon,
+        ":GH#": fixed_reply(b"1#"),  # Daylight savings time setting TODO: The settings of actual dst?
+        ":Gh#": fixed_reply(b"+90*"),  # High limit
+        ":GL#": cmd_get_local_time_24,
+        ":Gm#": fixed_reply(b"sDD*MM'SS#"),  # distance to meridian
+        ":Gl#": fixed_reply(b"100'#"),  # search Large size limit
+        ":GM#": fixed_reply(b"site1#"),  # Get Site 1 Name PRIORITY DONE?
+        ":GN#": fixed_reply(b"site2#"),
+        ":GO#": fixed_reply(b"site3#"),
+        ":GP#": fixed_reply(b"site4#"),
+        ":Go#": fixed_reply(b"00*#"),  # Lower altitude limit
+        ":Gq#": fixed_reply(b"SU#"),  # min quality for find
+        ":GR#": cmd_get_ra,
+        ":Gr#": fixed_reply(b"HH:MM:SS#"),  # current target RA
+        ":GS#": fixed_reply(b"HH:MM:SS#"),  # get sidereal time
+        ":Gs#": fixed_reply(b"100'#"),  # smaller size limit returned by find
+        ":GT#": fixed_reply(b"59.8#"),  # Tracking rate in hz #PRIORITY DONE
+        ":Gt#": cmd_get_site_lat,
+        ":GVD#": cmd_get_firmware_date,
+        ":GVN#": cmd_get_firmware_number,
+        ":GVP#": fixed_reply(b"SSTEQ25#"),  # Telescope product name
+        ":GVT#": fixed_reply(b"01:00:00#"),  # telescope firmware time
+        ":GVF#": cmd_get_firmware_full,
+        # Scope alignment status <mount><tracking><alignment>#
+        # P - equatorial, T - tracking, N - not tracking, 0 - needs alignement, 1 - one star, 2 - two star,
+        # 3 - three stared
+        ":GW#": fixed_reply(b"PT0#"),
+        ":Gy#": fixed_reply(b"gpdco#"),  # objects returned by find/browse
+        ":GZ#": cmd_get_az,
+        # ':hN#' autostar sleep scope
+        ":hP#": cmd_park,
+        ":hS#": cmd_set_park,
+        ":hW#": cmd_start_tracking,
+        ":h?#": cmd_write_0,  # autostar query home status
+        # :H#'  toggle 24 and 12 hour time format
+        ":I#": cmd_start_tracking,
+        # :LB# :LCNNNN# :LF#
+        ":Lf#": fixed_reply(b"0#"),
+        ":LI#": fixed_reply(b"NOTHING#"),
+        # :LMNNNN# :LN# :LSNNNN#
+        ":MS#": cmd_slew,
+        ":P#": fixed_reply(b"LOW PRECISION"),
+        # :$Q# :$QA+# :$QA-# :$QC# :$QGNNNNN# :$QP<p><n><n># :$QS+# :$QS-# :$QU+# :$QU-# :$QV+# :$QV-# :$QW#
+        # :$QZ+# :$QZ-#
+        ":Q#": cmd_halt,
+        ":SyGPDCO#": cmd_write_0,
+        # inc dec tracking :T+# :T-#, set lunar tracking :TL# custom tracking :TM#, sidereal tracking :TS#
+        ":U#": cmd_toggle_precision,
+        ":??#": fixed_reply(b"HelpText#"),
+        ":?+#": fixed_reply(b"HelpText#"),
+        ":?-#": fixed_reply(b"HelpText#"),
+    }
+
+    # Commands matched by first three then first two characters
+    prefix_commands = {
+        ":D": cmd_distance_bars,
+        ":hI": cmd_write_1,  # autostar settime
+        ":Lo": cmd_write_0,  # select deep sky library
+        ":Ls": fixed_reply(b"2"),  # select star library
+        ":Mg": cmd_guide,
+        ":Mn": cmd_manual_slew,
+        ":Ms": cmd_manual_slew,
+        ":Me": cmd_manual_slew,
+        ":Mw": cmd_manual_slew,
+        ":Qn": cmd_halt_direction,
+        ":Qs": cmd_halt_direction,
+        ":Qe": cmd_halt_direction,
+        ":Qw": cmd_halt_direction,
+        ":RG": cmd_slew_rate,
+        ":RC": cmd_slew_rate,
+        ":RM": cmd_slew_rate,
+        ":RS": cmd_slew_rate,
+        ":RA": cmd_ignore,  # RA rate degrees per second
+        ":RE": cmd_ignore,  # Dec rate degrees per second
+        # set guide rate :RgSS.S#
         # rotators :r+# :r-# :rn# :rh# :rC# :rc# :rq#
-        elif cmd[1] == "R":
-            # slew rate
-            if cmd[2] in ["G", "C", "M", "S"]:  # Set guiding rate PRIORITY DONE
-                slew_speed = slew_speed_map[cmd[2]]
-            elif cmd[2] == "A":
-                # m = self.re_ra_rate_deg_cmd.match(cmd)
-                # dps = m.group(1)
-                pass
-            elif cmd[2] == "E":
-                # m = self.re_dec_rate_deg_cmd.match(cmd)
-                # dps = m.group(1)
-                pass
-            else:
-                print("!!UNHANDLED CMD: ", cmd, file=sys.stderr)
-            # set guide rate :RgSS.S#
-        # Telescope set commands
-        elif cmd[1] == "S":
-            if cmd[2] == "a":  # PRIORITY2 DONE
-                if self.re_set_target_object_alt_hp.match(
-                    cmd
-                ):  # high precision set target object
-                    m = self.re_set_target_object_alt_hp.match(cmd)
-                    sign = -1.0 if m.group(1) == "-" else 1.0
-                    deg = m.group(2)
-                    minute = m.group(3)
-                    seconds = m.group(4)
-                    target["ra"] = None
-                    target["dec"] = None
-                    target["alt"] = dec_to_deg(
-                        sign, float(deg), float(minute), float(seconds)
-                    )
-                    self.write(b"1")
-                elif self.re_set_target_object_alt.match(
-                    cmd
-                ):  # low precision set target object
-                    m = self.re_set_target_object_alt.match(cmd)
-                    sign = -1.0 if m.group(1) == "-" else 1.0
-                    deg = m.group(2)
-                    minute = m.group(3)
-                    target["ra"] = None
-                    target["dec"] = None
-                    target["alt"] = dec_to_deg(sign, float(deg), float(minute))
-                    self.write(b"1")
-            elif cmd[2] == "b":
-                # m = self.re_set_bright_limit.match(cmd)
-                self.write(b"0")
-            elif cmd[2] == "B":
-                # m = self.re_set_baud_rate.match(cmd):
-                self.write(b"1")
-            elif cmd[2] == "C":
-                m = self.re_set_handbox_date.match(cmd)
-                month = int(m.group(1))
-                day = int(m.group(2))
-                year = int("20" + m.group(3))  # YY
-
-                if not use_holders:
-                    dstr = (
-                        pendulum.now(tz=set_utc_offset)
-                        .set(year=year, month=month, day=day)
-                        .isoformat()
-                    )
-                    r = control.set_time(dstr)
-                else:
-                    r = set_time(year=year, month=month, day=day)
-                if r[0]:
-                    self.write(b"1Updating Planetary Data#                       #")
-                else:
-                    self.write("b0")
-            elif cmd[2] == "d":  # PRIORITY DONE
-                m = self.re_set_target_obj_dec_hp.match(cmd)
-                if m:
-                    sign = -1 if m.group(1) == "-" else 1.0
-                    deg = m.group(2)
-                    minutes = m.group(3)
-                    seconds = m.group(4)
-                    target["dec"] = dec_to_deg(
-                        sign, float(deg), float(minutes), float(seconds)
-                    )
-                    target["alt"] = None
-                    target["az"] = None
-                    self.write(b"1")  # 0 if not accepted/valid
-                else:
-                    m = self.re_set_target_obj_dec.match(cmd)
-                    sign = -1 if m.group(1) == "-" else 1.0
-                    deg = m.group(2)
-                    minutes = m.group(3)
-                    target["dec"] = dec_to_deg(sign, float(deg), float(minutes))
-                    target["alt"] = None
-                    target["az"] = None
-                    self.write(b"1")  # 0 if not accepted/valid
-            elif cmd[2] == "E" or cmd[2] == "e":
-                # m = self.re_set_selenographic_lat_moon.match(cmd)
-                # m = self.re_set_selenographic_lon_moon.match(cmd):
-                self.write(b"0")
-            elif cmd[2] == "f":
-                # m = self.re_set_faint_mag.match(cmd)
-                self.write(b"1")
-            elif cmd[2] == "F":
-                # m = self.re_set_field_diameter.match(cmd)
-                self.write(b"0")
-            elif cmd[2] == "g":  # PRIORITY DONE
-                m = self.re_set_site_long.match(cmd)
-                deg = m.group(1)
-                minutes = m.group(2)
-
-                lon = dec_to_deg(1.0, float(deg), float(minutes))
-                if lon > 180:
-                    lon = 360.0 - 180
-                else:
-                    lon = -lon
-                # print('LX200: Set Long', lon)
-                try:
-                    if not use_holders:
-                        control.set_location(
-                            settings.runtime_settings["earth_location"].lat.deg,
-                            lon,
-                            1000.0,
-                            "site1",
-                        )
-                    else:
-                        set_location(lon=lon)
-                    self.write(b"1")
-                except Exception:
-                    traceback.print_exc()
-                    self.write(b"0")
-            elif cmd[2] == "G":  # PRIORITY
-                m = self.re_set_site_hours_add_utc.match(cmd)
-                sign = m.group(1)  # + or -
-                hours = m.group(2)
-                # They give us hours added to localtime to get UTC, so neg is positive for offset
-                offset = float(hours) * (1.0 if sign == "-" else -1.0)
-                doffset = set_utc_offset - offset
-                if not use_holders:
-                    dstr = pendulum.now().add(hours=doffset).isoformat()
-                    r = control.set_time(dstr)
-                else:
-                    r = set_time(offset=offset)
-                if r[0]:
-                    set_utc_offset = offset
-                    self.write(b"1")
-                else:
-                    self.write(b"0")
-            elif cmd[2] == "H":
-                m = self.re_set_dst.match(cmd)
-                dst_enabled = m.group(1) == "1"
-                localtime_daylight_savings = dst_enabled
-                # TODO: Should this adjust localtime or utc_offset any?
-                self.write(b"1")
-            elif cmd[2] == "h" or cmd[2] == "l":
-                # self.re_set_max_object_elevation.match(cmd)
-                # self.re_set_size_of_smallest_object.match(cmd):
-                self.write(b"0")
-            elif cmd[2] == "L":  # PRIORITY DONE
-                m = self.re_set_local_time.match(cmd)
-                hour = int(m.group(1))
-                minute = int(m.group(2))
-                second = int(m.group(3))
-                # print('Trying to set time')
-
-                if not use_holders:
-                    dstr = (
-                        pendulum.now(tz=set_utc_offset)
-                        .set(hour=hour, minute=minute, second=second)
-                        .isoformat()
-                    )
-                    r = control.set_time(dstr)
-                else:
-                    r = set_time(hour=hour, minute=minute, second=second)
-                if r[0]:
-                    self.write(b"1")
-                else:
-                    self.write(b"0")
-            # flexure correction :SM+# Sm-#
-            elif cmd[2] in ["M", "N", "O", "P"]:
-                m = self.re_set_site_name.match(cmd)
-                site = m.group(1)  # M = site1, N=site2, O=site3, P = site4
-                name = m.group(2)
-                self.write(b"1")
-            elif cmd[2] == "o":
-                m = self.re_set_altitude_low_limit.match(cmd)
-                alt = m.group(1)
-                self.write(b"1")
-            # Backlash :SpB<num><num>#, Home data :SpH<num><num>#, sensor offset :SpS<num><num><num>#
-            elif cmd[2] == "p":
-                # m = self.re_set_backlash_home_sensor.match(cmd)
-                self.write(b"1")
-            # :Sq#
-            elif cmd[2] == "r":  # PRIORITY DONE
-                m = self.re_set_target_object_ra_hp.match(cmd)
-                if m:
-                    hour = m.group(1)
-                    minutes = m.group(2)
-                    seconds = m.group(3)
-                    target["ra"] = ra_to_deg(
-                        float(hour), float(minutes), float(seconds)
-                    )
-                    target["alt"] = None
-                    target["az"] = None
-                    self.write(b"1")
-                else:
-                    m = self.re_set_target_object_ra.match(cmd)
-                    hour = m.group(1)
-                    minutes = m.group(2)
-                    target["ra"] = ra_to_deg(float(hour), float(minutes))
-                    target["alt"] = None
-                    target["az"] = None
-                    self.write(b"1")
-            elif cmd[2] == "s":
-                # m = self.re_set_largest_find.match(cmd)
-                self.write(b"1")
-            elif cmd[2] == "S":  # PRIORITY 3?
-                # m = self.re_set_local_sidereal_time.match(cmd)
-                # hour = m.group(1)
-                # minute = m.group(2)
-                # second = m.group(3)
-                self.write(b"0")
-            elif cmd[2] == "t":  # PRIORITY DONE
-                m = self.re_set_current_site_latitude_hp.match(cmd)
-                if m:
-                    sign = -1 if m.group(1) == "-" else 1.0
-                    deg = m.group(2)
-                    minute = m.group(3)
-                    seconds = m.group(4)
-                else:
-                    m = self.re_set_current_site_latitude.match(cmd)
-                    sign = -1 if m.group(1) == "-" else 1.0
-                    deg = m.group(2)
-                    minute = m.group(3)
-                    seconds = 0.0
+        ":Sa": cmd_set_target_alt,
+        ":Sb": cmd_write_0,  # set bright limit
+        ":SB": cmd_write_1,  # set baud rate
+        ":SC": cmd_set_date,
+        ":Sd": cmd_set_target_dec,
+        ":SE": cmd_write_0,  # set selenographic latitude of moon
+        ":Se": cmd_write_0,  # set selenographic longitude of moon
+        ":Sf": cmd_write_1,  # set faint magnitude
+        ":SF": cmd_write_0,  # set field diameter
+        ":Sg": cmd_set_site_lon,
+        ":SG": cmd_set_utc_offset,
+        ":SH": cmd_set_dst,
+        ":Sh": cmd_write_0,  # set max object elevation
+        ":Sl": cmd_write_0,  # set size of smallest object
+        ":SL": cmd_set_local_time,
+        # flexure correction :SM+# Sm-#
+        ":SM": cmd_set_site_name,
+        ":SN": cmd_set_site_name,
+        ":SO": cmd_set_site_name,
+        ":SP": cmd_set_site_name,
+        ":So": cmd_set_altitude_low_limit,
+        # Backlash :SpB<num><num>#, Home data :SpH<num><num>#, sensor offset :SpS<num><num><num>#
+        ":Sp": cmd_write_1,
+        # :Sq#
+        ":Sr": cmd_set_target_ra,
+        ":Ss": cmd_write_1,  # set largest find
+        ":SS": cmd_write_0,  # set local sidereal time PRIORITY 3?
+        ":St": cmd_set_site_lat,
+        ":ST": cmd_write_0,  # set tracking rate, 0 invalid, 2 valid
+        # increment rate, smart drive :ST+#, ST-#, STA- :STA+, :STZ-, :STZ+
+        ":Sw": cmd_set_max_slew_degrees,
+        ":Sz": cmd_set_target_az,
+        ":VD": fixed_reply(b"0.0000"),  # dec pec table entry
+        ":W": cmd_site_select,
+    }
+
+    del fixed_reply
+
+    def write(self, data):
+        self.replies.append(data)
+
+
+async def handle_client(reader, writer):
+    """
+    Reads and answers commands from one client until it disconnects.
+    :param reader: Client stream reader
+    :type reader: asyncio.StreamReader
+    :param writer: Client stream writer
+    :type writer: asyncio.StreamWriter
+    """
+    loop = asyncio.get_running_loop()
+    sock = writer.get_extra_info("socket")
+    if sock is not None:
+        # Disable Nagle's algorithm so responses are sent immediately.
+        # Critical for low-latency request/response protocols like LX200.
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    addr = writer.get_extra_info("peername")
+    client = LX200Client(addr)
+    lx200_clients.add(client)
+    print("New LX200 Proto client on port " + str(addr))
+    try:
+        while not kill:
+            data = await reader.read(MAX_COMMAND_LENGTH)
+            if not data:
+                break
+            for cmd in client.parse(data):
+                if cmd == b"\x06":  # Alignment Query
+                    client.write(b"P")
+                    continue
+                if DEBUG_PROT:
+                    t = time.time()
+                    print("Process: ", cmd)
                 try:
-                    lat = dec_to_deg(sign, float(deg), float(minute), float(seconds))
-                    # print('Set lat:', lat)
-                    if not use_holders:
-                        control.set_location(
-                            lat,
-                            settings.runtime_settings["earth_location"].lon.deg,
-                            1000.0,
-                            "site1",
-                        )
+                    if cmd.startswith(INLINE_COMMAND_PREFIXES):
+                        client.process(cmd)
                     else:
-                        set_location(lat=lat)
-                    self.write(b"1")
+                        await loop.run_in_executor(None, client.process, cmd)
                 except Exception:
                     traceback.print_exc()
-                    self.write(b"0")
-
-            elif cmd[2] == "T":
-                # m = self.re_set_current_tracking_rate.match(cmd)
-                self.write(b"0")  # 0 invalid, 2 valid
-            # increment rate, smart drive :ST+#, ST-#, STA- :STA+, :STZ-, :STZ+
-            elif cmd[2] == "w":
-                m = self.re_set_max_slew_degrees.match(cmd)
-                deg = m.group(1)  # expect 2 through 8
-                self.write(b"1")
-            elif cmd == ":SyGPDCO#":
-                self.write(b"0")
-            elif cmd[2] == "z":
-                m = self.re_set_target_azimuth.match(cmd)
-                deg = m.group(1)
-                minutes = m.group(2)
-                self.write(b"1")
-            else:
-                print("!!UNHANDLED CMD: ", cmd, file=sys.stderr)
-        # inc dec tracking :T+# :T-#, set lunar tracking :TL# custom tracking :TM#, sidereal tracking :TS#
-        # toggle between high low precision positions :U#
-        elif cmd == ":U#":
-            self.is_highprecision = not self.is_highprecision
-        elif cmd[1:3] == "VD":
-            # m = self.re_dec_pec_table_entry.match(cmd)
-            self.write(b"0.0000")
-        elif cmd[1] == "W":
-            m = self.re_site_select.match(cmd)
-            site = m.group(1)  # 1 through 4
-        elif cmd in [":??#", ":?+#", ":?-#"]:
-            self.write(b"HelpText#")
-        else:
-            print("!!UNHANDLED CMD: ", cmd, file=sys.stderr)
-
-    def write(self, data):
-        self.socket.send(data)
-
-    def fileno(self):
-        return self.socket.fileno()
-
-    def disconnect(self):
+                if DEBUG_PROT:
+                    print("Process time:", time.time() - t)
+            replies = client.take_replies()
+            if replies:
+                writer.write(replies)
+                await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    except Exception:
+        traceback.print_exc()
+    finally:
+        lx200_clients.discard(client)
+        writer.close()
         try:
-            self.socket.shutdown(socket.SHUT_RDWR)
-            self.socket.close()
-        except:
-            traceback.print_exc()
+            await writer.wait_closed()
+        except Exception:
+            pass
+
+
+async def serve(port=None):
+    """
+    Runs LX200 server until terminate() is called.
+    :param port: Port to listen on, ourport if None
+    :type port: int
+    """
+    global _loop, _stop_event
+    _loop = asyncio.get_running_loop()
+    _stop_event = asyncio.Event()
+    _loop.set_default_executor(
+        concurrent.futures.ThreadPoolExecutor(max_workers=COMMAND_WORKERS, thread_name_prefix="lx200")
+    )
+    if kill:
+        return
+    server = await asyncio.start_server(handle_client, "", ourport if port is None else port, reuse_address=True)
+    async with server:
+        await _stop_event.wait()
 
 
 def terminate():
     global kill
     kill = True
+    if _loop is not None and _stop_event is not None:
+        try:
+            _loop.call_soon_threadsafe(_stop_event.set)
+        except RuntimeError:
+            # Loop already closed
+            pass
 
 
 def main():
     global kill
     print("Starting LX200 Protocol server")
-    oursocket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    oursocket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    oursocket.bind(("", ourport))
-    oursocket.listen(5)
-    count = 0
     try:
-        while not kill:
-            print("Before Accept")
-            conn, addr = oursocket.accept()
-            # Disable Nagle's algorithm so responses are sent immediately.
-            # Critical for low-latency request/response protocols like LX200.
-            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
-            lx200Clients[count] = {"client": LX200Client(conn, addr), "thread": None}
-            print(
-                "New LX200 Proto client " + str(conn.fileno()) + " on port " + str(addr)
-            )
-            lx200Clients[count]["thread"] = threading.Thread(
-                target=lx200Clients[count]["client"].read
-            )
-            lx200Clients[count]["thread"].start()
-            count += 1
+        asyncio.run(serve())
     except KeyboardInterrupt:
         print("Keyboard quiting")
         kill = True
     except:
         traceback.print_exc()
-
-    oursocket.shutdown(socket.SHUT_RDWR)
-    oursocket.close()
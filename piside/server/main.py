@@ -21,7 +21,7 @@ import astropy.units as u
 from astropy.coordinates import ICRS, TETE, AltAz
 from skyconv_hadec import HADec
 from astropy.utils import iers
-from flask import Flask, redirect, jsonify, request, make_response, url_for, send_from_directory
+from flask import Flask, redirect, jsonify, request, make_response, url_for, send_from_directory, Response
 from flask_compress import Compress
 from werkzeug.serving import make_ssl_devcert
 
@@ -30,6 +30,8 @@ import db
 import handpad_menu
 import handpad_server
 import lx200proto_server
+import mapping_run
+import metrics
 import network
 import settings
 import skyconv
@@ -157,6 +159,19 @@ def settings_dl_post():
     return 'Updated Settings'
 
 
+@app.route('/api/metrics')
+@nocache
+def metrics_get():
+    """
+    Timing histograms and gauges. ?format=prometheus, or a text/plain Accept header, gives Prometheus text
+    otherwise JSON.
+    """
+    fmt = request.args.get('format')
+    if fmt == 'prometheus' or (fmt is None and request.accept_mimetypes.best == 'text/plain'):
+        return Response(metrics.prometheus_text(), mimetype='text/plain; version=0.0.4')
+    return jsonify(metrics.snapshot())
+
+
 @app.route('/api/hostname')
 @nocache
 def hostname_get():
@@ -311,9 +326,24 @@ def settings_horizon_limit():
     if points is not None:
         settings.settings['horizon_limit_points'] = points
         settings.write_settings(settings.settings)
+    control.update_horizon_limit()
     return 'Saved Slew Setting', 200
 
 
+@app.route('/api/horizon_limit', methods=['GET'])
+@nocache
+def horizon_limit_get():
+    resolution = request.args.get('resolution', None)
+    if resolution is not None:
+        try:
+            resolution = float(resolution)
+        except ValueError:
+            return 'Invalid resolution', 400
+        if resolution <= 0:
+            return 'Invalid resolution', 400
+    return jsonify(control.get_horizon_limit().to_dict(resolution))
+
+
 @app.route('/api/settings_network_ethernet', methods=['PUT'])
 @nocache
 def settings_network_ethernet():
@@ -526,6 +556,45 @@ def post_sync():
     return 'Pointing Model Set', 200
 
 
+@app.route('/api/mapping_run', methods=['GET'])
+@nocache
+def get_mapping_run():
+    return jsonify(mapping_run.progress())
+
+
+@app.route('/api/mapping_run', methods=['POST'])
+@nocache
+def start_mapping_run():
+    reqj = request.json or {}
+    try:
+        progress = mapping_run.start(**reqj)
+    except Exception as e:
+        traceback.print_exc()
+        return str(e), 400
+    return jsonify(progress)
+
+
+@app.route('/api/mapping_run', methods=['DELETE'])
+@nocache
+def cancel_mapping_run():
+    mapping_run.cancel()
+    return 'Cancelling Mapping Run', 200
+
+
+@app.route('/api/mapping_run/solution', methods=['PUT'])
+@nocache
+def mapping_run_solution():
+    reqj = request.json
+    try:
+        taken = mapping_run.submit_solution(**reqj)
+    except Exception as e:
+        traceback.print_exc()
+        return str(e), 400
+    if not taken:
+        return 'Mapping run is not waiting for a solution', 409
+    return 'Solution Taken', 200
+
+
 @app.route('/api/slewto', methods=['PUT'])
 @nocache
 def do_slewto():
@@ -550,7 +619,9 @@ def do_slewtocheck():
         coord = TETE(ra=ra * u.deg, dec=dec * u.deg, **frame_args)
     else:
         coord = ICRS(ra=ra * u.deg, dec=dec * u.deg)
-    return jsonify({'slewcheck': control.slewtocheck(coord)})
+    target_check = control.slewtocheck(coord)
+    path_check = target_check and control.slew_path_check(coord)
+    return jsonify({'slewcheck': target_check and path_check, 'target_check': target_check, 'path_check': path_check})
 
 
 @app.route('/api/slewto', methods=['DELETE'])
@@ -786,6 +857,23 @@ def status_get():
     return jsonify(control.last_status)
 
 
+@app.route('/api/status_stream', methods=['GET'])
+def status_stream_get():
+    client_id = request.args.get('client_id')
+    try:
+        interval = float(request.args.get('interval', 1.0))
+    except ValueError:
+        return 'Invalid interval', 400
+
+    def on_tick():
+        control.set_alive(client_id)
+
+    response = Response(control.status_publisher.events(interval, on_tick), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @app.route('/api/extra_logging', methods=['GET'])
 @nocache
 def extra_logging_get():
@@ -0,0 +1,387 @@
+"""
+Automated sky mapping runs for building large pointing models. Slews to a grid of points above the horizon limit, gets
+where the mount really is at each from a plate solve and syncs it into the pointing model. The model is fitted at the
+end, or every few points, instead of after every sync.
+"""
+import math
+import threading
+import time
+import traceback
+
+import astropy.units as u
+import numpy
+from astropy.coordinates import AltAz, ICRS, TETE
+
+import control
+import settings
+import skyconv
+
+DEFAULT_POINTS = 50
+DEFAULT_MIN_ALT = 20.0
+DEFAULT_MAX_ALT = 85.0
+# Seconds after a slew before solving so the mount can settle.
+DEFAULT_SETTLE_SECONDS = 2.0
+# Seconds to wait for an external solution before skipping a point.
+DEFAULT_SOLVE_TIMEOUT = 60.0
+GOLDEN_ANGLE_DEG = 180.0 * (3.0 - math.sqrt(5.0))
+
+_lock = threading.Lock()
+current_run = None
+
+
+class MappingRunException(Exception):
+    pass
+
+
+def grid_points(count=DEFAULT_POINTS, min_alt=DEFAULT_MIN_ALT, max_alt=DEFAULT_MAX_ALT, start=None):
+    """
+    Points evenly spread over the sky between min_alt and max_alt that are above the horizon limit, ordered so each
+    slew goes to a near point.
+    :param count: Number of points wanted, fewer are given if the horizon limit blocks too much.
+    :type count: int
+    :param min_alt: Lowest altitude degrees
+    :type min_alt: float
+    :param max_alt: Highest altitude degrees
+    :type max_alt: float
+    :param start: (alt, az) degrees to start path from, defaults to first point.
+    :type start: Tuple[float, float]
+    :return: [(alt, az), ...] degrees
+    :rtype: List[Tuple[float, float]]
+    """
+    hl = control.get_horizon_limit()
+    context = skyconv.FastContext()
+    alt = az = numpy.zeros(0)
+    # Make more candidates until enough are above the horizon limit.
+    candidates = count
+    for i in range(4):
+        # Fibonacci lattice, even in area over the band of altitudes.
+        idx = numpy.arange(candidates)
+        z_min = math.sin(math.radians(min_alt))
+        z_max = math.sin(math.radians(max_alt))
+        alt = numpy.degrees(numpy.arcsin(z_min + (idx + 0.5) / candidates * (z_max - z_min)))
+        az = (idx * GOLDEN_ANGLE_DEG) % 360.0
+        if hl.enabled:
+            dec = skyconv.fast_altaz_to_tete(alt, az, context=context)[1]
+            above = ~hl.below(alt, az, dec)
+            alt = alt[above]
+            az = az[above]
+        if len(alt) >= count or len(alt) == 0:
+            break
+        candidates = int(math.ceil(candidates * count / len(alt)))
+    alt = alt[:count]
+    az = az[:count]
+    return _nearest_neighbor_path(alt, az, start)
+
+
+def _nearest_neighbor_path(alt, az, start=None):
+    """
+    Orders points going to the nearest unvisited point each time.
+    :return: [(alt, az), ...]
+    :rtype: List[Tuple[float, float]]
+    """
+    if len(alt) == 0:
+        return []
+    alt_r = numpy.radians(alt)
+    az_r = numpy.radians(az)
+    xyz = numpy.column_stack([numpy.cos(alt_r) * numpy.cos(az_r), numpy.cos(alt_r) * numpy.sin(az_r),
+                              numpy.sin(alt_r)])
+    if start is None:
+        current = xyz[0]
+    else:
+        s_alt = math.radians(start[0])
+        s_az = math.radians(start[1])
+        current = numpy.array([math.cos(s_alt) * math.cos(s_az), math.cos(s_alt) * math.sin(s_az), math.sin(s_alt)])
+    visited = numpy.zeros(len(alt), dtype=bool)
+    path = []
+    for i in range(len(alt)):
+        distance = numpy.linalg.norm(xyz - current, axis=1)
+        distance[visited] = numpy.inf
+        nearest = int(numpy.argmin(distance))
+        visited[nearest] = True
+        current = xyz[nearest]
+        path.append((float(alt[nearest]), float(az[nearest])))
+    return path
+
+
+def stand_in_solver(target):
+    """
+    Local stand in for a plate solver, says the mount is exactly on target. Lets a run be tried without a camera, in
+    simulation for example.
+    :param target: Target slewed to.
+    :type target: AltAz
+    :return: Where mount is pointed
+    :rtype: Union[ICRS, AltAz]
+    """
+    if settings.runtime_settings["tracking"]:
+        # Tracking keeps the sky position of target
+        return skyconv.to_icrs(target)
+    return AltAz(alt=target.alt, az=target.az, **skyconv.get_frame_init_args("altaz"))
+
+
+class MappingRun:
+    def __init__(self, points, solver=None, settle_seconds=DEFAULT_SETTLE_SECONDS,
+                 solve_timeout=DEFAULT_SOLVE_TIMEOUT, refit_every=0):
+        """
+        :param points: [(alt, az), ...] degrees to map in order.
+        :type points: List[Tuple[float, float]]
+        :param solver: Called with AltAz target after slew, gives where mount points or None to skip point. If None
+                       waits for submit_solution.
+        :type solver: Callable[[AltAz], Union[None, ICRS, TETE, AltAz]]
+        :param settle_seconds: Wait after slew before solve.
+        :type settle_seconds: float
+        :param solve_timeout: Seconds to wait for submit_solution before skipping point.
+        :type solve_timeout: float
+        :param refit_every: Fit model after this many syncs, 0 to only fit at the end.
+        :type refit_every: int
+        """
+        self.points = list(points)
+        self._solver = solver
+        self._settle_seconds = settle_seconds
+        self._solve_timeout = solve_timeout
+        self._refit_every = refit_every
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+        self._solution_ready = threading.Event()
+        self._solution = None
+        self._thread = None
+        self._state = "idle"
+        self._index = 0
+        self._synced = 0
+        self._skipped = 0
+        self._error = None
+        self._started = None
+        self._finished = None
+        self._target = None
+
+    def start(self):
+        self._started = time.monotonic()
+        self._state = "starting"
+        self._thread = threading.Thread(target=self._run, name="mapping_run", daemon=True)
+        self._thread.start()
+
+    def join(self, timeout=None):
+        if self._thread:
+            self._thread.join(timeout)
+
+    def cancel(self):
+        """
+        Stops run after current step, the model is still fitted with points synced so far.
+        """
+        with self._lock:
+            self._cancel.set()
+            self._solution_ready.set()
+        control.cancel_slews()
+
+    def running(self):
+        """
+        :rtype: bool
+        """
+        return self._thread is not None and self._thread.is_alive()
+
+    def submit_solution(self, coord):
+        """
+        Gives where the mount is really pointed for the current point.
+        :param coord: Solved position, None to skip point.
+        :type coord: Union[None, ICRS, TETE, AltAz]
+        :return: False if run isn't waiting for a solution.
+        :rtype: bool
+        """
+        with self._lock:
+            if self._state != "solving" or self._solver is not None:
+                return False
+            self._solution = coord
+            self._solution_ready.set()
+            return True
+
+    def progress(self):
+        """
+        :return: State ('starting', 'slewing', 'settling', 'solving', 'syncing', 'fitting', 'done', 'cancelled',
+                 'failed'), point index, total, synced and skipped counts, current target, seconds elapsed and
+                 estimated remaining.
+        :rtype: dict
+        """
+        with self._lock:
+            end = self._finished if self._finished is not None else time.monotonic()
+            elapsed = end - self._started if self._started is not None else 0.0
+            done = self._synced + self._skipped
+            remaining = None
+            if self._finished is None and done > 0:
+                remaining = elapsed / done * (len(self.points) - done)
+            return {
+                "state": self._state,
+                "index": self._index,
+                "total": len(self.points),
+                "synced": self._synced,
+                "skipped": self._skipped,
+                "target": self._target,
+                "waiting_solution": self._state == "solving" and self._solver is None,
+                "elapsed": elapsed,
+                "remaining": remaining,
+                "error": self._error,
+            }
+
+    def _set(self, **kwargs):
+        with self._lock:
+            for key, value in kwargs.items():
+                setattr(self, "_" + key, value)
+
+    def _solve(self, target):
+        with self._lock:
+            # Cleared with the state change so a submit_solution or cancel right after it isn't lost
+            self._state = "solving"
+            self._solution = None
+            self._solution_ready.clear()
+            if self._cancel.is_set():
+                self._solution_ready.set()
+        if self._solver is not None:
+            coord = self._solver(target)
+            self._set(state="syncing")
+            return coord
+        self._solution_ready.wait(self._solve_timeout)
+        with self._lock:
+            # Solutions that come late aren't taken
+            self._state = "syncing"
+            coord = self._solution
+            self._solution = None
+            return coord
+
+    def _run(self):
+        try:
+            for i, (alt, az) in enumerate(self.points):
+                if self._cancel.is_set():
+                    break
+                self._set(index=i, state="slewing", target={"alt": alt, "az": az})
+                # Sky position when slew starts is what a tracking mount ends up on.
+                target = AltAz(alt=alt * u.deg, az=az * u.deg, **skyconv.get_frame_init_args("altaz"))
+                try:
+                    thread = control.set_slew(alt=alt, az=az)
+                except Exception as e:
+                    # Point went below limits since run started
+                    print("WARNING: mapping run skipping point %d: %s" % (i, str(e)))
+                    self._set(skipped=self._skipped + 1)
+                    continue
+                thread.join()
+                if self._cancel.is_set():
+                    break
+                self._set(state="settling")
+                if self._cancel.wait(self._settle_seconds):
+                    break
+                coord = self._solve(target)
+                if self._cancel.is_set():
+                    break
+                if coord is None:
+                    self._set(skipped=self._skipped + 1)
+                    continue
+                control.sync(coord, fit=False)
+                self._set(synced=self._synced + 1)
+                if self._refit_every and self._synced % self._refit_every == 0:
+                    self._set(state="fitting")
+                    control.fit_pointing_model()
+            self._set(state="fitting")
+            control.fit_pointing_model(wait=True)
+            self._set(state="cancelled" if self._cancel.is_set() else "done")
+        except Exception as e:
+            traceback.print_exc()
+            self._set(state="failed", error=str(e))
+        finally:
+            self._set(finished=time.monotonic(), target=None)
+
+
+def start(count=DEFAULT_POINTS, min_alt=DEFAULT_MIN_ALT, max_alt=DEFAULT_MAX_ALT, solver="external",
+          settle_seconds=DEFAULT_SETTLE_SECONDS, solve_timeout=DEFAULT_SOLVE_TIMEOUT, refit_every=0):
+    """
+    Starts a mapping run. Mount must be synced and the pointing model not single.
+    :param count: Number of points
+    :type count: int
+    :param min_alt: Lowest altitude degrees
+    :type min_alt: float
+    :param max_alt: Highest altitude degrees
+    :type max_alt: float
+    :param solver: 'external' waits for submit_solution at each point, 'stand_in' uses stand_in_solver.
+    :type solver: str
+    :param settle_seconds: Wait after slew before solve.
+    :type settle_seconds: float
+    :param solve_timeout: Seconds to wait for external solution before skipping point.
+    :type solve_timeout: float
+    :param refit_every: Fit model after this many syncs, 0 to only fit at the end.
+    :type refit_every: int
+    :return: Run progress
+    :rtype: dict
+    """
+    global current_run
+    if solver not in ["external", "stand_in"]:
+        raise MappingRunException("Unknown solver " + str(solver))
+    if settings.runtime_settings["sync_info"] is None:
+        raise control.NotSyncedException("Not Synced")
+    if settings.settings["pointing_model"] == "single":
+        raise MappingRunException("Pointing model is single, choose a multiple point model first.")
+    max_points = settings.settings["pointing_model_points"]
+    if max_points != -1 and max_points < int(count) + 1:
+        raise MappingRunException(
+            "Pointing model keeps %d points, set model points to at least %d." % (max_points, int(count) + 1)
+        )
+    with _lock:
+        if current_run is not None and current_run.running():
+            raise MappingRunException("Mapping run already in progress.")
+        status = control.last_status
+        start_position = None
+        if status and "alt" in status:
+            start_position = (status["alt"], status["az"])
+        points = grid_points(int(count), float(min_alt), float(max_alt), start_position)
+        if not points:
+            raise MappingRunException("No points above horizon limit.")
+        current_run = MappingRun(
+            points,
+            solver=stand_in_solver if solver == "stand_in" else None,
+            settle_seconds=float(settle_seconds),
+            solve_timeout=float(solve_timeout),
+            refit_every=int(refit_every),
+        )
+        current_run.start()
+        return current_run.progress()
+
+
+def cancel():
+    """
+    Cancels current mapping run if there is one.
+    """
+    with _lock:
+        if current_run is not None:
+            current_run.cancel()
+
+
+def progress():
+    """
+    :return: Current or last run progress, None if there hasn't been one.
+    :rtype: dict
+    """
+    with _lock:
+        if current_run is None:
+            return None
+        return current_run.progress()
+
+
+def submit_solution(ra=None, dec=None, frame="icrs", skip=False):
+    """
+    Solved position from external plate solver for current mapping run point.
+    :param ra: RA degrees
+    :type ra: float
+    :param dec: Dec degrees
+    :type dec: float
+    :param frame: 'icrs' or 'tete'
+    :type frame: str
+    :param skip: True if it couldn't be solved, point is skipped.
+    :type skip: bool
+    :return: False if no run is waiting for a solution.
+    :rtype: bool
+    """
+    coord = None
+    if not skip:
+        if frame == "icrs":
+            coord = ICRS(ra=float(ra) * u.deg, dec=float(dec) * u.deg)
+        else:
+            coord = TETE(ra=float(ra) * u.deg, dec=float(dec) * u.deg, **skyconv.get_frame_init_args("tete"))
+    with _lock:
+        if current_run is None:
+            return False
+        return current_run.submit_solution(coord)
@@ -0,0 +1,298 @@
+"""
+Low overhead timing histograms and gauges for hot paths, so we can see where the Pi's time goes.
+Histograms are timed with metrics.timer() or @metrics.timed(), gauges come from registered collector functions.
+Everything can be read as a dict with snapshot() or as Prometheus text with prometheus_text().
+"""
+import bisect
+import functools
+import math
+import threading
+import time
+import traceback
+
+PREFIX = 'ssteq_'
+# Seconds, serial commands are around a ms, astropy conversions tens of ms.
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+enabled = True
+
+
+class Histogram:
+    def __init__(self, name, labels=None, buckets=DEFAULT_BUCKETS):
+        """
+        :param name: Metric name without PREFIX
+        :type name: str
+        :param labels: Label names to values
+        :type labels: Dict[str, str]
+        :param buckets: Sorted bucket upper bounds
+        :type buckets: Tuple[float]
+        """
+        self.name = name
+        self.labels = labels or {}
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._count = 0
+        self._sum = 0.0
+        self._max = 0.0
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[i] += 1
+            self._count += 1
+            self._sum += value
+            if value > self._max:
+                self._max = value
+
+    def time(self):
+        """
+        :return: Context manager that observes the seconds its block takes.
+        :rtype: _Timer
+        """
+        return _Timer(self)
+
+    def reset(self):
+        with self._lock:
+            self._counts = [0] * (len(self.buckets) + 1)
+            self._count = 0
+            self._sum = 0.0
+            self._max = 0.0
+
+    def snapshot(self):
+        """
+        :return: count, sum, max, mean and cumulative bucket counts keyed by upper bound.
+        :rtype: dict
+        """
+        with self._lock:
+            counts = list(self._counts)
+            ret = {'count': self._count, 'sum': self._sum, 'max': self._max,
+                   'mean': self._sum / self._count if self._count else 0.0}
+        cumulative = 0
+        buckets = []
+        for le, count in zip(self.buckets + (math.inf,), counts):
+            cumulative += count
+            buckets.append((le, cumulative))
+        ret['buckets'] = buckets
+        return ret
+
+
+class _Timer:
+    __slots__ = ('_histogram', '_start')
+
+    def __init__(self, histogram):
+        self._histogram = histogram
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if enabled:
+            self._histogram.observe(time.perf_counter() - self._start)
+        return False
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._help = {}
+        self._collectors = {}
+
+    def histogram(self, name, help_text=None, buckets=DEFAULT_BUCKETS, **labels):
+        """
+        Gets or creates a histogram, the same name and labels give the same histogram.
+        :param name: Metric name without PREFIX
+        :type name: str
+        :param help_text: Description for Prometheus HELP
+        :type help_text: str
+        :param buckets: Sorted bucket upper bounds in seconds
+        :type buckets: Tuple[float]
+        :param labels: Label values, keep these to a small fixed set
+        :return: The histogram
+        :rtype: Histogram
+        """
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.get(key)
+                if histogram is None:
+                    histogram = Histogram(name, labels, buckets)
+                    self._histograms[key] = histogram
+        if help_text and name not in self._help:
+            with self._lock:
+                self._help[name] = help_text
+        return histogram
+
+    def timer(self, name, **labels):
+        """
+        :return: Context manager that observes the seconds its block takes in histogram name.
+        :rtype: _Timer
+        """
+        return _Timer(self.histogram(name, **labels))
+
+    def timed(self, name, **labels):
+        """
+        Decorator that times each call of the function in histogram name.
+        """
+        histogram = self.histogram(name, **labels)
+
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not enabled:
+                    return func(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    histogram.observe(time.perf_counter() - start)
+
+            return wrapper
+
+        return decorator
+
+    def register_collector(self, name, func, help_text=None):
+        """
+        Adds gauges that are read when a snapshot is taken.
+        :param name: Gauge name prefix without PREFIX
+        :type name: str
+        :param func: Returns dict of gauge name suffix to number
+        :type func: Callable[[], Dict[str, float]]
+        :param help_text: Description for Prometheus HELP
+        :type help_text: str
+        """
+        with self._lock:
+            self._collectors[name] = func
+            if help_text:
+                self._help[name] = help_text
+
+    def unregister_collector(self, name):
+        with self._lock:
+            self._collectors.pop(name, None)
+
+    def reset(self):
+        """
+        Resets all histograms, collectors are kept.
+        """
+        with self._lock:
+            histograms = list(self._histograms.values())
+        for histogram in histograms:
+            histogram.reset()
+
+    def _collect(self):
+        with self._lock:
+            collectors = list(self._collectors.items())
+        gauges = {}
+        for name, func in collectors:
+            try:
+                values = func()
+            except Exception:
+                traceback.print_exc()
+                continue
+            if values is None:
+                continue
+            for key, value in values.items():
+                if isinstance(value, bool):
+                    value = int(value)
+                if isinstance(value, (int, float)):
+                    gauges[name + '_' + key] = value
+        return gauges
+
+    def snapshot(self):
+        """
+        :return: {'histograms': {name: [{'labels': {}, 'count':, 'sum':, ...}]}, 'gauges': {name: value}}
+        :rtype: dict
+        """
+        with self._lock:
+            histograms = list(self._histograms.values())
+        ret_histograms = {}
+        for histogram in histograms:
+            snapshot = histogram.snapshot()
+            snapshot['labels'] = dict(histogram.labels)
+            snapshot['buckets'] = [[le if le != math.inf else '+Inf', count] for le, count in snapshot['buckets']]
+            ret_histograms.setdefault(histogram.name, []).append(snapshot)
+        return {'histograms': ret_histograms, 'gauges': self._collect()}
+
+    def prometheus_text(self):
+        """
+        :return: Prometheus text exposition format.
+        :rtype: str
+        """
+        with self._lock:
+            histograms = list(self._histograms.values())
+            help_texts = dict(self._help)
+            collector_names = list(self._collectors.keys())
+        lines = []
+        by_name = {}
+        for histogram in histograms:
+            by_name.setdefault(histogram.name, []).append(histogram)
+        for name in sorted(by_name):
+            full_name = PREFIX + name
+            if name in help_texts:
+                lines.append('# HELP %s %s' % (full_name, help_texts[name]))
+            lines.append('# TYPE %s histogram' % full_name)
+            for histogram in by_name[name]:
+                snapshot = histogram.snapshot()
+                for le, count in snapshot['buckets']:
+                    labels = dict(histogram.labels)
+                    labels['le'] = '+Inf' if le == math.inf else repr(le)
+                    lines.append('%s_bucket%s %d' % (full_name, _format_labels(labels), count))
+                labels = _format_labels(histogram.labels)
+                lines.append('%s_sum%s %r' % (full_name, labels, snapshot['sum']))
+                lines.append('%s_count%s %d' % (full_name, labels, snapshot['count']))
+        for name, value in sorted(self._collect().items()):
+            full_name = PREFIX + name
+            collector = next((c for c in collector_names if name.startswith(c + '_')), None)
+            if collector in help_texts:
+                lines.append('# HELP %s %s' % (full_name, help_texts[collector]))
+            lines.append('# TYPE %s gauge' % full_name)
+            lines.append('%s %r' % (full_name, value))
+        return '\n'.join(lines) + '\n'
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join('%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"'))
+                          for k, v in sorted(labels.items())) + '}'
+
+
+registry = Registry()
+
+
+def histogram(name, help_text=None, buckets=DEFAULT_BUCKETS, **labels):
+    """
+    Registry.histogram on the default registry.
+    """
+    return registry.histogram(name, help_text, buckets, **labels)
+
+
+def timer(name, **labels):
+    """
+    Registry.timer on the default registry.
+    """
+    return registry.timer(name, **labels)
+
+
+def timed(name, **labels):
+    """
+    Registry.timed on the default registry.
+    """
+    return registry.timed(name, **labels)
+
+
+def register_collector(name, func, help_text=None):
+    """
+    Registry.register_collector on the default registry.
+    """
+    registry.register_collector(name, func, help_text)
+
+
+def snapshot():
+    return registry.snapshot()
+
+
+def prometheus_text():
+    return registry.prometheus_text()
@@ -0,0 +1,190 @@
+"""
+Fits and saves the pointing model on a background thread, so syncs don't wait for scipy or for the SD card to be
+remounted. Sync points go into a working copy of the model. After it fits, a copy of it is published to
+skyconv.model_real_stepper with one assignment, and conversions keep using the old model until then, or if the fit
+fails.
+"""
+import copy
+import threading
+import traceback
+
+import metrics
+import settings
+import skyconv
+
+
+class ModelFitter:
+    def __init__(self, name='model_fitter'):
+        self.name = name
+        self._cond = threading.Condition()
+        self._thread = None
+        # (from_point, to_point) waiting to be added to the working model
+        self._points = []
+        self._fit = False
+        self._busy = False
+        # Bumped by reset, work started before a reset isn't published or saved.
+        self._generation = 0
+        # Model the working copy was made from, and points in the working copy not published yet.
+        self._base = None
+        self._working = None
+        self._unpublished = 0
+        # Points taken from the queue that the worker is adding to the working copy.
+        self._adding = 0
+        self._save_lock = threading.Lock()
+        self._stats = {'points': 0, 'fits': 0, 'published': 0, 'failed': 0, 'discarded': 0, 'saved': 0, 'errors': 0}
+        self._fit_seconds = metrics.histogram('model_fit_seconds', 'Background pointing model fit and publish seconds')
+        self._save_seconds = metrics.histogram('model_save_seconds', 'Background pointing model save seconds')
+
+    def add_point(self, from_point, to_point, fit=True):
+        """
+        Queues a sync point for the model in skyconv.model_real_stepper, returns right away.
+        :param from_point: Coordinate synced on, in the model frame.
+        :param to_point: Where the steppers thought they pointed, in the model frame.
+        :param fit: If False the point is only added, fit is called later.
+        :type fit: bool
+        """
+        with self._cond:
+            self._points.append((from_point, to_point))
+            self._stats['points'] += 1
+            if fit:
+                self._fit = True
+            self._wake()
+
+    def fit(self):
+        """
+        Queues fitting the model with all points added so far.
+        """
+        with self._cond:
+            self._fit = True
+            self._wake()
+
+    def reset(self):
+        """
+        Call when skyconv.model_real_stepper is cleared or replaced, drops queued points and any fit in progress.
+        """
+        with self._cond:
+            self._generation += 1
+            self._points = []
+            self._fit = False
+            self._base = None
+            self._working = None
+            self._unpublished = 0
+            self._cond.notify_all()
+
+    def remove_saved(self):
+        """
+        Resets and removes the saved model, a save already in progress finishes first so it can't bring it back.
+        """
+        self.reset()
+        with self._save_lock:
+            settings.rm_pointing_model()
+
+    def size(self):
+        """
+        Points the worker hasn't added to the working copy yet are counted as new, one that replaces a point close to
+        it is over counted until added.
+        :return: Points in the model once queued points are published.
+        :rtype: int
+        """
+        with self._cond:
+            if self._working is not None and self._base is skyconv.model_real_stepper:
+                size = self._working.size() + self._adding + len(self._points)
+            else:
+                size = skyconv.model_real_stepper.size() + len(self._points)
+        max_points = settings.settings['pointing_model_points']
+        if max_points != -1:
+            size = min(size, max_points)
+        return size
+
+    def wait(self, timeout=None):
+        """
+        Waits for queued points and fits to be done.
+        :param timeout: Seconds to wait, None to wait forever.
+        :type timeout: float
+        :return: False if timed out.
+        :rtype: bool
+        """
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._points and not self._fit and not self._busy, timeout)
+
+    def stats(self):
+        """
+        :return: Counts of points, fits, published, failed and discarded fits, saves, errors and queued points.
+        :rtype: dict
+        """
+        with self._cond:
+            ret = dict(self._stats)
+            ret['queued'] = len(self._points)
+            ret['unpublished'] = self._unpublished
+            return ret
+
+    def _wake(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+        self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._points or self._fit)
+                points, self._points = self._points, []
+                fit, self._fit = self._fit, False
+                generation = self._generation
+                base = skyconv.model_real_stepper
+                if self._working is None or self._base is not base:
+                    # Model was replaced without reset, start over from it.
+                    self._working = copy.deepcopy(base)
+                    self._base = base
+                    self._unpublished = 0
+                working = self._working
+                self._unpublished += len(points)
+                self._adding = len(points)
+                self._busy = True
+            try:
+                self._update(working, base, generation, points, fit)
+            except Exception:
+                with self._cond:
+                    self._stats['errors'] += 1
+                traceback.print_exc()
+            finally:
+                with self._cond:
+                    self._adding = 0
+                    self._busy = False
+                    self._cond.notify_all()
+
+    def _update(self, working, base, generation, points, fit):
+        with self._fit_seconds.time():
+            for from_point, to_point in points:
+                working.add_point(from_point, to_point, fit=False)
+            with self._cond:
+                self._adding = 0
+            if not fit:
+                return
+            converged = working.fit()
+            # Published model is never changed, the working copy keeps taking points.
+            model = copy.deepcopy(working) if converged else None
+        with self._cond:
+            self._stats['fits'] += 1
+            if generation != self._generation or skyconv.model_real_stepper is not base:
+                self._stats['discarded'] += 1
+                return
+            if model is None:
+                self._stats['failed'] += 1
+                print('WARNING: pointing model fit failed, keeping previous model.')
+                return
+            skyconv.model_real_stepper = model
+            self._base = model
+            self._unpublished = 0
+            self._stats['published'] += 1
+        if settings.settings['pointing_model_remember']:
+            with self._save_lock, self._save_seconds.time():
+                with self._cond:
+                    if generation != self._generation:
+                        return
+                settings.save_pointing_model(model)
+                with self._cond:
+                    self._stats['saved'] += 1
+
+
+default_fitter = ModelFitter()
@@ -1,5 +1,7 @@
 import math
 
+import numpy
+
 
 def t_x_vmax(a, v_0, v_max):
     t_maxv = (v_max - v_0) / a
@@ -55,3 +57,189 @@ def calc_speed_sleeps(delta, a, v_0, v_max, v_track, type):
         ret.append({'type': type, 'speed': v_max, 'sleep': t_maxv + t_c + t_track})
         ret.append({'type': type, 'speed': v_trackcopy, 'sleep': t_maxv})
     return ret
+
+
+def _ramp_position(t, x_0, v_0, a, t_ramp):
+    """
+    Position after accelerating at a for t_ramp then continuing at constant speed.
+    """
+    t_a = numpy.minimum(t, t_ramp)
+    return x_0 + v_0 * t_a + 0.5 * a * t_a * t_a + (v_0 + a * t_ramp) * (t - t_a)
+
+
+def speed_sleeps_positions(speed_sleeps, a, v_0, t):
+    """
+    Predicts positions while following speed sleeps from calc_speed_sleeps. Speed changes accelerate at a like the
+    microcontroller does.
+    :param speed_sleeps: Output of calc_speed_sleeps, [{'speed': float, 'sleep': float}, ...]
+    :type speed_sleeps: List[dict]
+    :param a: acceleration steps/s^2
+    :type a: float
+    :param v_0: starting speed steps/s
+    :type v_0: float
+    :param t: Times in seconds from start to predict position at.
+    :type t: Union[float, numpy.ndarray]
+    :return: Position in steps relative to start at times t.
+    :rtype: numpy.ndarray
+    """
+    t = numpy.asarray(t, dtype=float)
+    x = numpy.zeros(t.shape)
+    a = abs(a)
+    seg_start = 0.0
+    x_0 = 0.0
+    v = v_0
+    for seg in speed_sleeps:
+        target = v if seg['speed'] is None else seg['speed']
+        seg_a = math.copysign(a, target - v)
+        t_ramp = min(abs(target - v) / a, seg['sleep']) if a > 0 else 0.0
+        mask = (t >= seg_start) & (t < seg_start + seg['sleep'])
+        x[mask] = _ramp_position(t[mask] - seg_start, x_0, v, seg_a, t_ramp)
+        x_0 = _ramp_position(seg['sleep'], x_0, v, seg_a, t_ramp)
+        v = v + seg_a * t_ramp
+        seg_start += seg['sleep']
+    mask = t >= seg_start
+    x[mask] = x_0 + v * (t[mask] - seg_start)
+    return x
+
+
+class AxisTrajectory:
+    """
+    Time optimal path for one axis to a target moving at a constant speed, within acceleration and speed limits.
+    In the frame moving with the target this is a triangle or trapezoid speed profile, so the axis arrives on the
+    target going the target's speed.
+    """
+
+    def __init__(self, delta, v_0, a, v_max, v_target=0.0):
+        """
+        :param delta: Target position at time 0 relative to start position, steps
+        :type delta: float
+        :param v_0: Starting speed steps/s
+        :type v_0: float
+        :param a: Acceleration steps/s^2
+        :type a: float
+        :param v_max: Max speed steps/s
+        :type v_max: float
+        :param v_target: Speed the target moves at steps/s
+        :type v_target: float
+        """
+        self.delta = float(delta)
+        self.a = abs(a)
+        self.v_max = abs(v_max)
+        self.v_target = float(v_target)
+        if abs(self.v_target) >= self.v_max:
+            raise ValueError('Target speed %f is not below max speed %f' % (self.v_target, self.v_max))
+        # (t_start, duration, y_start, w_start, acceleration) with y, w position and speed relative to the target
+        self.segments = []
+        a = self.a
+        w_0 = float(v_0) - self.v_target
+        # Direction to go after stopping
+        s = 1.0 if self.delta - w_0 * abs(w_0) / (2.0 * a) >= 0 else -1.0
+        d = s * self.delta
+        w_start = s * w_0
+        w_limit = self.v_max - s * self.v_target
+        w_peak = min(w_limit, math.sqrt(max(0.0, (2.0 * a * d + w_start * w_start) / 2.0)))
+        t_1 = abs(w_peak - w_start) / a
+        d_1 = (w_start + w_peak) / 2.0 * t_1
+        t_3 = w_peak / a
+        d_3 = w_peak / 2.0 * t_3
+        t_2 = max(0.0, d - d_1 - d_3) / w_peak if w_peak > 0 else 0.0
+        t = 0.0
+        y = 0.0
+        w = s * w_start
+        for duration, w_end in [(t_1, s * w_peak), (t_2, s * w_peak), (t_3, 0.0)]:
+            if duration <= 0.0:
+                continue
+            acc = (w_end - w) / duration
+            self.segments.append((t, duration, y, w, acc))
+            y += w * duration + 0.5 * acc * duration * duration
+            w = w_end
+            t += duration
+        self.duration = t
+
+    def _relative(self, t):
+        t = numpy.asarray(t, dtype=float)
+        y = numpy.full(t.shape, self.delta)
+        w = numpy.zeros(t.shape)
+        for t_start, duration, y_start, w_start, acc in self.segments:
+            mask = (t >= t_start) & (t < t_start + duration)
+            dt = t[mask] - t_start
+            y[mask] = y_start + w_start * dt + 0.5 * acc * dt * dt
+            w[mask] = w_start + acc * dt
+        mask = t < 0
+        y[mask] = 0.0
+        w[mask] = self.segments[0][3] if self.segments else 0.0
+        return t, y, w
+
+    def position(self, t):
+        """
+        :param t: Seconds from start
+        :type t: Union[float, numpy.ndarray]
+        :return: Planned position relative to start, steps
+        :rtype: Union[float, numpy.ndarray]
+        """
+        t, y, w = self._relative(t)
+        x = y + self.v_target * t
+        return float(x) if x.ndim == 0 else x
+
+    def velocity(self, t):
+        """
+        :param t: Seconds from start
+        :type t: Union[float, numpy.ndarray]
+        :return: Planned speed, steps/s
+        :rtype: Union[float, numpy.ndarray]
+        """
+        t, y, w = self._relative(t)
+        v = w + self.v_target
+        return float(v) if v.ndim == 0 else v
+
+    def target_position(self, t):
+        """
+        :param t: Seconds from start
+        :type t: float
+        :return: Target position relative to start, steps
+        :rtype: float
+        """
+        return self.delta + self.v_target * t
+
+    def _segment(self, t):
+        for segment in self.segments:
+            if t < segment[0] + segment[1]:
+                return segment
+        return None
+
+    def ramping(self, t):
+        """
+        :param t: Seconds from start
+        :type t: float
+        :return: True if speed is planned to be changing at t.
+        :rtype: bool
+        """
+        segment = self._segment(t)
+        return segment is not None and segment[4] != 0.0
+
+    def command_velocity(self, t):
+        """
+        Speed to command at t. The microcontroller ramps to a commanded speed at the acceleration limit, so this is the
+        speed at the end of the segment t is in.
+        :param t: Seconds from start
+        :type t: float
+        :return: Speed steps/s
+        :rtype: float
+        """
+        segment = self._segment(t)
+        if segment is None:
+            return self.v_target
+        t_start, duration, y_start, w_start, acc = segment
+        return w_start + acc * duration + self.v_target
+
+    def next_change(self, t):
+        """
+        :param t: Seconds from start
+        :type t: float
+        :return: Seconds from start of next change in command_velocity after t, None if no more.
+        :rtype: Union[None, float]
+        """
+        segment = self._segment(t)
+        if segment is None:
+            return None
+        return segment[0] + segment[1]
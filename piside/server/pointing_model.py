@@ -5,6 +5,7 @@ import math
 import affine_fit
 import settings
 import json
+import sky_index
 import sys
 import scipy
 import scipy.optimize
@@ -16,6 +17,11 @@ import astropy.units as u
 pointing_logger = settings.get_logger("pointing")
 
 SEPERATION_THRESHOLD = 5
+BUIE_PARAMS = 10
+# Saved model file format, bump when arrays saved change.
+MODEL_FORMAT_VERSION = 1
+# Sync point arrays start this big and double when full.
+INITIAL_POINT_CAPACITY = 16
 
 
 def inverse_altaz_projection(xy_coord):
@@ -32,10 +38,7 @@ def inverse_altaz_projection(xy_coord):
     az = 90 - caz
     r = x / numpy.cos(caz * math.pi / 180.0)
     # TODO: When r is < 0, is this the right move.
-    if r.size > 1:
-        r[r < 0] = 0
-    elif r < 0.0:
-        r = 0.0
+    r = numpy.where(r < 0.0, 0.0, r)
     alt = 90.0 * (1.0 - r)
     return SkyCoord(AltAz(alt=alt * u.deg, az=az * u.deg))
 
@@ -48,8 +51,19 @@ def alt_az_projection(altaz_coord):
     :return: projected x, y coordinates, array if given array, otherwise single values.
     :rtype: Union[Dict[str, float], Dict[str, List[float]]]
     """
-    alt = numpy.array(altaz_coord.alt.deg)
-    az = numpy.array(altaz_coord.az.deg)
+    return alt_az_projection_deg(numpy.array(altaz_coord.alt.deg), numpy.array(altaz_coord.az.deg))
+
+
+def alt_az_projection_deg(alt, az):
+    """
+    Same as alt_az_projection with alt and az in degrees, without making a coordinate.
+    :param alt: Altitude degrees
+    :type alt: Union[float, numpy.ndarray]
+    :param az: Azimuth degrees
+    :type az: Union[float, numpy.ndarray]
+    :return: projected x, y coordinates, same shape as alt and az.
+    :rtype: Dict[str, Union[float, numpy.ndarray]]
+    """
     caz = -az + 90.0
     r = 1.0 - alt / 90.0
     x = r * numpy.cos(caz * math.pi / 180.0)
@@ -202,110 +216,245 @@ def buie_model_error(p0, x, y):
     p0a = numpy.zeros(10)
     p0a = numpy.concatenate([p0, p0a[len(p0) :]])
     ny = buie_model(x, *p0a)
-    err = numpy.concatenate((ny.T[0] - y.T[0], ny.T[1] - y.T[1]))
+    # HA wraps around, 359.9 and 0.1 are 0.2 apart.
+    ha_err = numpy.mod(ny.T[0] - y.T[0] + 180.0, 360.0) - 180.0
+    err = numpy.concatenate((ha_err, ny.T[1] - y.T[1]))
     return err
 
 
+def buie_model_jacobian(p0, x, y=None):
+    """
+    Jacobian of buie_model_error, the model is linear in its parameters so this doesn't depend on p0.
+    :param p0: Model parameters being fitted, first len(p0) of buie_model parameters.
+    :type p0: numpy.ndarray
+    :param x: [[ha, dec], ...] in degrees
+    :type x: numpy.ndarray
+    :param y: Not used, there to match buie_model_error arguments.
+    :return: Derivatives in degrees, rows are HA errors then Dec errors, columns are parameters.
+    :rtype: numpy.ndarray
+    """
+    x = numpy.asarray(x, dtype=float)
+    ha = numpy.radians(x[:, 0])
+    dec = numpy.radians(x[:, 1])
+    tan85 = math.tan(85 * math.pi / 180.0)
+    tan_dec = numpy.clip(numpy.tan(dec), -tan85, tan85)
+    cos_ha = numpy.cos(ha)
+    sin_ha = numpy.sin(ha)
+    zeros = numpy.zeros(len(ha))
+    ones = numpy.ones(len(ha))
+    # ih, id, sh, sd, ch, np, ma, me, tf, fo
+    jac_ha = numpy.column_stack(
+        [ones, zeros, ha, zeros, cos_ha * tan_dec, tan_dec, sin_ha * tan_dec, zeros, zeros, zeros]
+    )
+    jac_dec = numpy.column_stack(
+        [zeros, ones, zeros, dec, zeros, zeros, sin_ha, cos_ha, numpy.cos(dec), numpy.sin(dec)]
+    )
+    jac = numpy.concatenate([jac_ha, jac_dec]) * (180.0 / math.pi)
+    return jac[:, : len(p0)]
+
+
 class PointingModelBuie:
     def __init__(self, log=False, name="", max_points=-1):
         """
         :param log:
         :param name:
         """
-        self.__from_points = None
-        self.__to_points = []
         self.__buie_vals = None
         self.__max_points = max_points
-
-    def add_point(self, from_point, to_point):
+        self.__allocate(INITIAL_POINT_CAPACITY)
+
+    def to_arrays(self):
+        """
+        :return: Points and fitted values for save_model.
+        :rtype: Dict[str, numpy.ndarray]
+        """
+        params = numpy.zeros(0) if self.__buie_vals is None else numpy.asarray(self.__buie_vals, dtype=float)
+        return {
+            "max_points": numpy.array(self.__max_points),
+            "from": self.__from[: self.__size].copy(),
+            "to": self.__to[: self.__size].copy(),
+            "params": params,
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """
+        Model from to_arrays, only refitted if the fitted values are missing. Done here so a loaded model is never
+        changed after it is published.
+        :param arrays: From to_arrays
+        :type arrays: Dict[str, numpy.ndarray]
+        :rtype: PointingModelBuie
+        """
+        model = cls(max_points=int(arrays["max_points"]))
+        model.__set_arrays(numpy.asarray(arrays["from"], dtype=float), numpy.asarray(arrays["to"], dtype=float))
+        params = numpy.asarray(arrays["params"], dtype=float)
+        if 0 < len(params) <= BUIE_PARAMS:
+            model.__buie_vals = params
+        elif model.__size > 1:
+            model.fit()
+        return model
+
+    def __allocate(self, capacity):
+        """
+        Sets up empty point arrays.
+        """
+        self.__size = 0
+        # [[ha, dec], ...] in degrees
+        self.__from = numpy.zeros((capacity, 2))
+        self.__to = numpy.zeros((capacity, 2))
+        # Jacobian rows for each from point, HA error rows and Dec error rows.
+        self.__jac_ha = numpy.zeros((capacity, BUIE_PARAMS))
+        self.__jac_dec = numpy.zeros((capacity, BUIE_PARAMS))
+        self.__index = sky_index.SkyIndex()
+
+    def __grow(self):
+        """
+        Doubles point array capacity keeping points.
+        """
+        def grown(old):
+            new = numpy.zeros((2 * len(old), old.shape[1]))
+            new[: len(old)] = old
+            return new
+
+        self.__from = grown(self.__from)
+        self.__to = grown(self.__to)
+        self.__jac_ha = grown(self.__jac_ha)
+        self.__jac_dec = grown(self.__jac_dec)
+
+    def __set_arrays(self, from_points, to_points):
+        """
+        Replaces all points.
+        :param from_points: [[ha, dec], ...] degrees
+        :param to_points: [[ha, dec], ...] degrees
+        """
+        n = len(from_points)
+        self.__allocate(max(INITIAL_POINT_CAPACITY, n))
+        self.__size = n
+        if n == 0:
+            return
+        self.__from[:n] = from_points
+        self.__to[:n] = to_points
+        jac = buie_model_jacobian(numpy.zeros(BUIE_PARAMS), self.__from[:n])
+        self.__jac_ha[:n] = jac[:n]
+        self.__jac_dec[:n] = jac[n:]
+        self.__index.set(self.__from[:n, 0], self.__from[:n, 1])
+
+    def __set_point(self, idx, from_ha, from_dec, to_ha, to_dec):
+        self.__from[idx] = [from_ha, from_dec]
+        self.__to[idx] = [to_ha, to_dec]
+        jac = buie_model_jacobian(numpy.zeros(BUIE_PARAMS), self.__from[idx : idx + 1])
+        self.__jac_ha[idx] = jac[0]
+        self.__jac_dec[idx] = jac[1]
+
+    def add_point(self, from_point, to_point, fit=True):
         """
         Add a point to the model.
         :param from_point: What mount thinks it is at
         :type from_point: HADec
         :param to_point: What mount is actually at.
         :type to_point: HADec
+        :param fit: If False model isn't refitted until fit() is called, for adding many points.
+        :type fit: bool
         :return: None
         :rtype: None
         """
-        # if self.__max_points != -1 and len(self.__to_points) >= self.__max_points:
-        #     self.__to_points = self.__to_points[1:]
-        #     self.__from_points = self.__from_points[1:]
         print(
             "PointingModelBuie.add_point, __max_points=",
             self.__max_points,
             "len(self.__to_points)=",
-            len(self.__to_points),
+            self.__size,
         )
 
-        from_point = HADec(ha=from_point.ha, dec=from_point.dec)
-        to_point = HADec(ha=to_point.ha, dec=to_point.dec)
+        from_ha = float(from_point.ha.deg)
+        from_dec = float(from_point.dec.deg)
         replace_idx = None
-        if self.__from_points is not None:
-            seperation = self.__from_points.separation(from_point).deg
-            if self.__max_points != -1 and len(self.__to_points) >= self.__max_points:
-                print("PointingModelBuie.add_point, seperation=", seperation)
+        if self.__size > 0:
+            if self.__max_points != -1 and self.__size >= self.__max_points:
                 # If we are at max points, then lets replace the nearest one with this new point.
-                replace_idx = numpy.argmin(seperation)
+                replace_idx, seperation = self.__index.nearest(from_ha, from_dec)
+                print("PointingModelBuie.add_point, seperation=", seperation)
             else:
                 # If we are syncing points too close together
                 # Replace first point less than SEPERATION_THRESHOLD away with this new point.
-                replace_idxex = numpy.where(seperation < SEPERATION_THRESHOLD)[0]
+                replace_idxex = self.__index.within(from_ha, from_dec, SEPERATION_THRESHOLD)
                 if len(replace_idxex) > 0:
-                    replace_idx = replace_idxex[0]
+                    replace_idx = int(replace_idxex[0])
         if replace_idx is not None:
             print("PointingModelBuie.add_point replace_idx=", replace_idx)
-            fra = self.__from_points.ha.deg
-            fdec = self.__from_points.dec.deg
-            fra[replace_idx] = from_point.ha.deg
-            fdec[replace_idx] = from_point.dec.deg
-            self.__to_points[replace_idx] = [to_point.ha.deg, to_point.dec.deg]
+            self.__index.replace(replace_idx, from_ha, from_dec)
         else:
-            self.__to_points.append([to_point.ha.deg, to_point.dec.deg])
-            if self.__from_points is not None:
-                fra = numpy.append(self.__from_points.ha.deg, from_point.ha.deg)
-                fdec = numpy.append(self.__from_points.dec.deg, from_point.dec.deg)
-            else:
-                fra = [from_point.ha.deg]
-                fdec = [from_point.dec.deg]
-        self.__from_points = HADec(ha=fra * u.deg, dec=fdec * u.deg)
+            if self.__size == len(self.__from):
+                self.__grow()
+            replace_idx = self.__size
+            self.__size += 1
+            self.__index.add(from_ha, from_dec)
+        self.__set_point(replace_idx, from_ha, from_dec, float(to_point.ha.deg), float(to_point.dec.deg))
+
+        if fit:
+            self.fit()
 
+    def fit(self):
+        """
+        Fits model to points added.
+        :return: False if the fit failed and the model is acting like a single point model.
+        :rtype: bool
+        """
         # Act just like single if number of points is only 1
-        if len(self.__from_points) > 1:
-            p0 = [0, 0, 0, 0, 0, 0, 0, 0, 0, 0]
-            if len(self.__to_points) < len(p0):
-                p0 = p0[0 : len(self.__to_points)]
-            xdata = numpy.array(
-                [self.__from_points.ha.deg, self.__from_points.dec.deg]
-            ).T
-            ydata = numpy.array(self.__to_points)
-            # Default maxfev=800 fails in some unit tests
-            result = scipy.optimize.leastsq(
-                buie_model_error,
-                numpy.array(p0),
-                args=(xdata, ydata),
-                full_output=True,
-                maxfev=1600,
+        if self.__size > 1:
+            self.__fit()
+            return self.__buie_vals is not None
+        return True
+
+    def __fit(self):
+        """
+        Fits model parameters to the points. Fewer parameters than points are fitted with few points. The model is
+        linear in its parameters so they are solved directly, then checked with leastsq and the analytic Jacobian
+        which also handles HA wrapping. If the points don't determine every parameter, all at one dec for example,
+        leastsq starts from the last fit instead of the minimum norm solution.
+        """
+        n = self.__size
+        count = min(n, BUIE_PARAMS)
+        xdata = self.__from[:n]
+        ydata = self.__to[:n]
+        jac = numpy.concatenate([self.__jac_ha[:n, :count], self.__jac_dec[:n, :count]])
+        # Error with all parameters zero
+        err0 = buie_model_error(numpy.zeros(count), xdata, ydata)
+        try:
+            p0, _, rank, _ = numpy.linalg.lstsq(jac, -err0, rcond=None)
+        except numpy.linalg.LinAlgError:
+            p0 = numpy.zeros(count)
+            rank = 0
+        if rank < count and self.__buie_vals is not None:
+            p0 = numpy.zeros(count)
+            count_last = min(count, len(self.__buie_vals))
+            p0[:count_last] = self.__buie_vals[:count_last]
+        result = scipy.optimize.leastsq(
+            buie_model_error,
+            p0,
+            args=(xdata, ydata),
+            Dfun=buie_model_jacobian,
+            full_output=True,
+            maxfev=1600,
+        )
+        result_ier = result[4]
+        result_msg = result[3]
+        if result_ier in [1, 2, 3, 4]:
+            self.__buie_vals = result[0]
+        else:
+            print(
+                "WARNING: model failed, using single point model until successful. "
+                + "scipy.optimize.leastsq: ier={result_ier:d}, mesg={result_msg:s}".format(
+                    result_ier=result_ier, result_msg=result_msg
+                ),
+                file=sys.stderr,
             )
-            result_ier = result[4]
-            result_msg = result[3]
-            # print(result[2]['fvec'], len(self.__from_points))
-            if result_ier in [1, 2, 3, 4]:
-                self.__buie_vals = result[0]
-            else:
-                print(
-                    "WARNING: model failed, using single point model until successful. "
-                    + "scipy.optimize.leastsq: ier={result_ier:d}, mesg={result_msg:s}".format(
-                        result_ier=result_ier, result_msg=result_msg
-                    ),
-                    file=sys.stderr,
-                )
-                # Had problem with least squares, use single point model until successful
-                self.__buie_vals = None
+            # Had problem with least squares, use single point model until successful
+            self.__buie_vals = None
 
     def transform_point(self, point):
         """
         Given desired point give us what we to tell the mount to go to.
-        :param point: Desired Point
+        :param point: Desired Point, can be an array coordinate.
         :type point: HADec
         :return: Point the mount should go to.
         :rtype: HADec
@@ -314,19 +463,28 @@ class PointingModelBuie:
             # print('buie_vals', self.__buie_vals)
             p0 = numpy.array([0, 0, 0, 0, 0, 0, 0, 0, 0, 0])
             p0 = numpy.concatenate([self.__buie_vals, p0[len(self.__buie_vals) :]])
-            new_point = buie_model(numpy.array([[point.ha.deg, point.dec.deg]]), *p0)
-            return HADec(ha=new_point[0][0] * u.deg, dec=new_point[0][1] * u.deg)
+            ha = numpy.ravel(point.ha.deg)
+            dec = numpy.ravel(point.dec.deg)
+            new_point = buie_model(numpy.column_stack([ha, dec]), *p0)
+            if point.isscalar:
+                return HADec(ha=new_point[0][0] * u.deg, dec=new_point[0][1] * u.deg)
+            shape = point.shape
+            return HADec(ha=new_point[:, 0].reshape(shape) * u.deg, dec=new_point[:, 1].reshape(shape) * u.deg)
         else:
             return point
 
     def inverse_transform_point(self, point):
         """
         Given what the mount is pointed give us what it should actually be at.
-        :param point: Mount point
+        :param point: Mount point, can be an array coordinate.
         :type point: HADec
         :return: What model thinks it is actually pointed at.
         :rtype: HADec
         """
+        if self.__buie_vals is not None and not point.isscalar:
+            points = [self.inverse_transform_point(point[idx]) for idx in numpy.ndindex(point.shape)]
+            return HADec(ha=numpy.reshape([p.ha.deg for p in points], point.shape) * u.deg,
+                         dec=numpy.reshape([p.dec.deg for p in points], point.shape) * u.deg)
         if self.__buie_vals is not None:
 
             def our_func(coord):
@@ -372,16 +530,18 @@ class PointingModelBuie:
         :return: None
         :rtype: None
         """
-        self.__from_points = None
-        self.__to_points = []
         self.__buie_vals = None
+        self.__allocate(INITIAL_POINT_CAPACITY)
 
     def get_from_points(self):
         """
         Gives you the from points in the model.
         :return:
         """
-        return numpy.array(self.__from_points)
+        points = numpy.empty(self.__size, dtype=object)
+        for i in range(self.__size):
+            points[i] = HADec(ha=self.__from[i, 0] * u.deg, dec=self.__from[i, 1] * u.deg)
+        return points
 
     def size(self):
         """
@@ -389,7 +549,7 @@ class PointingModelBuie:
         :return: points in model
         :rtype: int
         """
-        return len(self.__to_points)
+        return self.__size
 
     def __str__(self):
         if self.__buie_vals is None:
@@ -418,8 +578,13 @@ class PointingModelAffine:
         self.__log = log
         self.__name = name
 
-        self.__sync_points = []
-        self.__from_points = None
+        # [[alt, az], ...] degrees of from and to points, and their azimuthal projections [[x, y], ...]
+        self.__from = numpy.zeros((0, 2))
+        self.__to = numpy.zeros((0, 2))
+        self.__from_projection = numpy.zeros((0, 2))
+        self.__to_projection = numpy.zeros((0, 2))
+        # From point az, alt
+        self.__index = sky_index.SkyIndex()
         self.__max_points = max_points
         # Distance matrix for sync_points
         # https://en.wikipedia.org/wiki/Distance_matrix
@@ -431,114 +596,190 @@ class PointingModelAffine:
             self.__inverseModel = PointingModelAffine(isinverse=True)
         self.debug = False
 
+    def to_arrays(self):
+        """
+        :return: Points and fitted transform for save_model, inverse model ones are prefixed with inverse_.
+        :rtype: Dict[str, numpy.ndarray]
+        """
+        ret = {
+            "max_points": numpy.array(self.__max_points),
+            "from": self.__from.copy(),
+            "to": self.__to.copy(),
+            "matrix": self.__affineAll.matrix if self.__affineAll else numpy.zeros((0, 2)),
+        }
+        if self.__inverseModel:
+            for key, value in self.__inverseModel.to_arrays().items():
+                if key != "max_points":
+                    ret["inverse_" + key] = value
+        return ret
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """
+        Model from to_arrays, only refitted if a fitted transform is missing. Done here so a loaded model is never
+        changed after it is published.
+        :param arrays: From to_arrays
+        :type arrays: Dict[str, numpy.ndarray]
+        :rtype: PointingModelAffine
+        """
+        model = cls(max_points=int(arrays["max_points"]))
+        refit = model.__set_arrays(arrays, "")
+        refit = model.__inverseModel.__set_arrays(arrays, "inverse_") or refit
+        if refit:
+            model.fit()
+        return model
+
+    def __set_arrays(self, arrays, prefix):
+        """
+        :return: True if the model needs to be refitted.
+        :rtype: bool
+        """
+        from_points = numpy.asarray(arrays[prefix + "from"], dtype=float).reshape(-1, 2)
+        to_points = numpy.asarray(arrays[prefix + "to"], dtype=float).reshape(-1, 2)
+        matrix = numpy.asarray(arrays[prefix + "matrix"], dtype=float)
+        self.clear()
+        self.__set_points(from_points, to_points)
+        self.__index.set(from_points[:, 1], from_points[:, 0])
+        if len(matrix) > 0:
+            self.__affineAll = affine_fit.AffineTransform(matrix)
+            return False
+        return len(from_points) >= 3
+
+    def __set_points(self, from_points, to_points):
+        """
+        :param from_points: [[alt, az], ...] degrees
+        :type from_points: numpy.ndarray
+        :param to_points: [[alt, az], ...] degrees
+        :type to_points: numpy.ndarray
+        """
+        self.__from = from_points
+        self.__to = to_points
+        self.__from_projection = self.__projection(from_points)
+        self.__to_projection = self.__projection(to_points)
+
+    @staticmethod
+    def __projection(points):
+        """
+        :param points: [[alt, az], ...] degrees
+        :type points: numpy.ndarray
+        :return: [[x, y], ...]
+        :rtype: numpy.ndarray
+        """
+        xy = alt_az_projection_deg(points[:, 0], points[:, 1])
+        return numpy.column_stack([xy["x"], xy["y"]])
+
     def get_from_points(self):
         """
         Get model from points
-        :return:
+        :return: From points as one array coordinate
+        :rtype: SkyCoord
         """
-        ret = []
-        for point in self.__sync_points:
-            ret.append(point["from_point"])
-        return ret
+        return self.__coords(self.__from)
 
-    def add_point(self, from_point, to_point):
+    def add_point(self, from_point, to_point, fit=True):
         """
         Updates parameters so it will use point for transforming future points.
         :param from_point: AltAz from point.
         :type from_point: Union[AltAz, SkyCoord]
         :param to_point: AltAz to point
         :type to_point: Union[AltAz, SkyCoord]
+        :param fit: If False model isn't refitted until fit() is called, for adding many points.
+        :type fit: bool
         """
         if from_point.name != "altaz" or to_point.name != "altaz":
             raise ValueError("coords should be an alt-az coordinate")
 
         if (
             self.__max_points != -1
-            and self.__from_points is not None
-            and len(self.__from_points) >= self.__max_points
+            and len(self.__from) >= self.__max_points
         ):
-            self.__from_points = self.__from_points[1:]
-            self.__sync_points = self.__sync_points[1:]
+            self.__index.delete(0)
+            self.__set_points(self.__from[1:], self.__to[1:])
 
         from_point = SkyCoord(AltAz(alt=from_point.alt, az=from_point.az))
         to_point = SkyCoord(AltAz(alt=to_point.alt, az=to_point.az))
+        from_row = numpy.array([[float(from_point.alt.deg), float(from_point.az.deg)]])
+        to_row = numpy.array([[float(to_point.alt.deg), float(to_point.az.deg)]])
 
         # If it is close enough to a point already there, we will replace it.
 
         replace_idx = None
-        if self.__from_points is not None:
-            replace_idxex = numpy.where(
-                self.__from_points.separation(from_point).deg < SEPERATION_THRESHOLD
-            )[0]
+        if len(self.__index) > 0:
+            replace_idxex = self.__index.within(
+                from_point.az.deg, from_point.alt.deg, SEPERATION_THRESHOLD
+            )
             if len(replace_idxex) > 0:
-                replace_idx = replace_idxex[0]
+                replace_idx = int(replace_idxex[0])
         if replace_idx is not None:
-            self.__sync_points[replace_idx] = {
-                "from_point": from_point,
-                "from_projection": alt_az_projection(from_point),
-                "to_point": to_point,
-                "to_projection": alt_az_projection(to_point),
-            }
-            alt = self.__from_points.alt.deg
-            az = self.__from_points.az.deg
-            alt[replace_idx] = from_point.alt.deg
-            az[replace_idx] = from_point.az.deg
+            from_points = self.__from.copy()
+            to_points = self.__to.copy()
+            from_points[replace_idx] = from_row[0]
+            to_points[replace_idx] = to_row[0]
+            self.__set_points(from_points, to_points)
+            self.__index.replace(replace_idx, from_point.az.deg, from_point.alt.deg)
         else:
-            self.__sync_points.append(
-                {
-                    "from_point": from_point,
-                    "from_projection": alt_az_projection(from_point),
-                    "to_point": to_point,
-                    "to_projection": alt_az_projection(to_point),
-                }
-            )
-            if self.__from_points is not None:
-                alt = numpy.append(self.__from_points.alt.deg, from_point.alt.deg)
-                az = numpy.append(self.__from_points.az.deg, from_point.az.deg)
-            else:
-                alt = [from_point.alt.deg]
-                az = [from_point.az.deg]
-        self.__from_points = SkyCoord(
-            AltAz(alt=numpy.array(alt) * u.deg, az=numpy.array(az) * u.deg)
-        )
+            self.__set_points(numpy.concatenate([self.__from, from_row]), numpy.concatenate([self.__to, to_row]))
+            self.__index.add(from_point.az.deg, from_point.alt.deg)
 
-        if len(self.__sync_points) >= 3:
+        if self.__inverseModel:
+            self.__inverseModel.add_point(to_point, from_point, fit=False)
+        if fit:
+            self.fit()
+
+    def fit(self):
+        """
+        Fits model to points added.
+        :return: False if the affine fit of all points failed.
+        :rtype: bool
+        """
+        ret = True
+        if len(self.__from) >= 3:
             if self.__log:
                 pointing_logger.debug(
                     json.dumps({"func": "add_point", "model": "affine_all"})
                 )
-            from_npa = get_projection_coords(
-                list(range(len(self.__sync_points))),
-                self.__sync_points,
-                "from_projection",
-            )
-            to_npa = get_projection_coords(
-                list(range(len(self.__sync_points))),
-                self.__sync_points,
-                "to_projection",
-            )
-            self.__affineAll = affine_fit.affine_fit(from_npa, to_npa)
+            self.__affineAll = affine_fit.affine_fit_np(self.__from_projection, self.__to_projection)
+            ret = self.__affineAll is not False
         if self.__inverseModel:
-            self.__inverseModel.add_point(to_point, from_point)
+            ret = self.__inverseModel.fit() and ret
+        return ret
 
     def __get_closest_sync_point_idx(self, coord):
-        return self.__from_points.separation(coord).argmin()
+        """
+        :param coord: AltAz point, can be an array coordinate.
+        :return: Index of nearest sync point, array of indexes if coord is an array.
+        :rtype: Union[int, numpy.ndarray]
+        """
+        return self.__index.nearest(coord.az.deg, coord.alt.deg)[0]
 
-    def __two_point(self, point, fp, tp):
-        dalt = tp.alt.deg - fp.alt.deg
-        daz = tp.az.deg - fp.az.deg
+    @staticmethod
+    def __coords(points):
+        """
+        :param points: [[alt, az], ...] degrees
+        :type points: numpy.ndarray
+        :return: Points as one array coordinate
+        :rtype: SkyCoord
+        """
+        return SkyCoord(AltAz(alt=points[:, 0] * u.deg, az=points[:, 1] * u.deg))
+
+    def __two_point(self, point, idx):
+        """
+        Offsets point by the difference between from and to sync points idx.
+        :param point: Point, can be an array coordinate.
+        :param idx: Sync point index, same shape as point.
+        :return: Offset point
+        :rtype: SkyCoord
+        """
+        dalt = self.__to[idx, 0] - self.__from[idx, 0]
+        daz = self.__to[idx, 1] - self.__from[idx, 1]
         new_alt = point.alt.deg + dalt
-        if new_alt > 90.0:
-            new_alt = 180.0 - new_alt
-        elif new_alt < -90.0:
-            new_alt = -180.0 - new_alt
+        new_alt = numpy.where(new_alt > 90.0, 180.0 - new_alt, new_alt)
+        new_alt = numpy.where(new_alt < -90.0, -180.0 - new_alt, new_alt)
         new_az = point.az.deg + daz
-        if new_az > 360.0:
-            new_az = new_az - 360.0
-        elif new_az < 0:
-            new_az = 360 + new_az
+        new_az = numpy.where(new_az > 360.0, new_az - 360.0, new_az)
+        new_az = numpy.where(new_az < 0, 360 + new_az, new_az)
         to_point = SkyCoord(AltAz(alt=new_alt * u.deg, az=new_az * u.deg))
-        if self.__log:
+        if self.__log and point.isscalar:
             pointing_logger.debug(
                 json.dumps(
                     {
@@ -554,21 +795,25 @@ class PointingModelAffine:
     def transform_point(self, point):
         """
         Transform point using the model.
-        :param point: AltAz desired point
+        :param point: AltAz desired point, can be an array coordinate.
         :type point: Union[AltAz, SkyCoord]
         :return: What the mount should goto to get to desired point, SkyCorod in altaz frame.
         :rtype: SkyCoord
         """
         point = SkyCoord(AltAz(alt=point.alt, az=point.az))
-        proj_coord = alt_az_projection(point)
         if self.__affineAll:
-            transformed_projection = self.__affineAll.Transform(
-                [proj_coord["x"], proj_coord["y"]]
+            proj_coord = alt_az_projection(point)
+            shape = numpy.shape(proj_coord["x"])
+            transformed_projection = self.__affineAll.transform(
+                numpy.column_stack([numpy.ravel(proj_coord["x"]), numpy.ravel(proj_coord["y"])])
             )
             to_point = inverse_altaz_projection(
-                {"x": transformed_projection[0], "y": transformed_projection[1]}
+                {
+                    "x": transformed_projection[:, 0].reshape(shape),
+                    "y": transformed_projection[:, 1].reshape(shape),
+                }
             )
-            if self.__log:
+            if self.__log and point.isscalar:
                 pointing_logger.debug(
                     json.dumps(
                         {
@@ -580,16 +825,14 @@ class PointingModelAffine:
                     )
                 )
             return to_point
-        elif len(self.__sync_points) >= 2:
+        elif len(self.__from) >= 2:
             # Get nearest two_points
             nearest_point = self.__get_closest_sync_point_idx(point)
 
             # for 1 point use simple offsets
-            fp = self.__sync_points[nearest_point]["from_point"]
-            tp = self.__sync_points[nearest_point]["to_point"]
-            return self.__two_point(point, fp, tp)
+            return self.__two_point(point, nearest_point)
 
-        elif len(self.__sync_points) == 1:
+        elif len(self.__from) == 1:
             # Just normal stepper slew using point as sync_point
             if self.__log:
                 pointing_logger.debug(
@@ -629,8 +872,8 @@ class PointingModelAffine:
         """
         Reset all points in pointing model.
         """
-        self.__sync_points = []
-        self.__from_points = None
+        self.__set_points(numpy.zeros((0, 2)), numpy.zeros((0, 2)))
+        self.__index.clear()
         self.__distance_matrix = []
         self.__affineAll = None
         if self.__inverseModel:
@@ -641,12 +884,85 @@ class PointingModelAffine:
         :return: The number of point that make up the model.
         :rtype: int
         """
-        return len(self.__sync_points)
+        return len(self.__from)
 
     def __str__(self):
         return "Affine Model"
 
 
+def save_model(model, file):
+    """
+    Saves model points and fitted values as a versioned npz file, without pickling any objects.
+    :param model: Model to save
+    :type model: Union[PointingModelBuie, PointingModelAffine]
+    :param file: File name or binary file object
+    """
+    name = "buie" if isinstance(model, PointingModelBuie) else "affine"
+    numpy.savez(file, version=numpy.array(MODEL_FORMAT_VERSION), model=numpy.array(name), **model.to_arrays())
+
+
+def load_model(file):
+    """
+    Loads model saved by save_model.
+    :param file: File name or binary file object
+    :return: Loaded model
+    :rtype: Union[PointingModelBuie, PointingModelAffine]
+    """
+    with numpy.load(file, allow_pickle=False) as npz:
+        arrays = {key: npz[key] for key in npz.files}
+    version = int(arrays["version"])
+    if version != MODEL_FORMAT_VERSION:
+        raise ValueError("Unsupported pointing model format version %d" % version)
+    name = str(arrays["model"])
+    if name == "buie":
+        return PointingModelBuie.from_arrays(arrays)
+    elif name == "affine":
+        return PointingModelAffine.from_arrays(arrays)
+    raise ValueError("Unknown pointing model " + name)
+
+
+def from_legacy(model):
+    """
+    Rebuilds a model unpickled from an older version's model.pickle from its points and fitted values, its private
+    attributes don't match the current classes.
+    :param model: Unpickled model
+    :type model: Union[PointingModelBuie, PointingModelAffine]
+    :return: Model that works with current classes
+    :rtype: Union[PointingModelBuie, PointingModelAffine]
+    """
+    return type(model).from_arrays(_legacy_arrays(model))
+
+
+def _legacy_arrays(model):
+    state = model.__dict__
+    if isinstance(model, PointingModelBuie):
+        from_points = state.get("_PointingModelBuie__from_points")
+        to_points = state.get("_PointingModelBuie__to_points") or []
+        buie_vals = state.get("_PointingModelBuie__buie_vals")
+        return {
+            "max_points": numpy.array(state.get("_PointingModelBuie__max_points", -1)),
+            "from": numpy.zeros((0, 2))
+            if from_points is None
+            else numpy.column_stack([numpy.ravel(from_points.ha.deg), numpy.ravel(from_points.dec.deg)]),
+            "to": numpy.array(to_points, dtype=float).reshape(-1, 2),
+            "params": numpy.zeros(0) if buie_vals is None else numpy.asarray(buie_vals, dtype=float),
+        }
+    sync_points = state.get("_PointingModelAffine__sync_points", [])
+    # Affine transforms from older fits have different attributes, refitted by from_arrays.
+    ret = {
+        "max_points": numpy.array(state.get("_PointingModelAffine__max_points", -1)),
+        "from": numpy.array([[p["from_point"].alt.deg, p["from_point"].az.deg] for p in sync_points]),
+        "to": numpy.array([[p["to_point"].alt.deg, p["to_point"].az.deg] for p in sync_points]),
+        "matrix": numpy.zeros((0, 2)),
+    }
+    inverse = state.get("_PointingModelAffine__inverseModel")
+    if inverse is not None:
+        for key, value in _legacy_arrays(inverse).items():
+            if key != "max_points":
+                ret["inverse_" + key] = value
+    return ret
+
+
 # Finding point in triangle
 # xaedes answer
 # https://stackoverflow.com/questions/2049582/how-to-determine-if-a-point-is-in-a-2d-triangle
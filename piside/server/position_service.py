@@ -0,0 +1,106 @@
+"""
+Answers position queries between status updates by extrapolating the last computed position with the axis rates.
+Status is only computed about once a second, clients like planetarium apps poll faster than that.
+"""
+import math
+import threading
+import time
+
+SIDEREAL_DEG_PER_SECOND = 360.98564736629 / 86400.0
+# Don't run away if status stops updating
+MAX_EXTRAPOLATION_SECONDS = 5.0
+POSITION_KEYS = ('tete_ra', 'tete_dec', 'hadec_ha', 'hadec_dec', 'alt', 'az')
+
+
+def hadec_to_altaz_deg(ha, dec, lat):
+    """
+    Geometric alt/az, no refraction.
+    :param ha: Hour angle degrees
+    :type ha: float
+    :param dec: Declination degrees
+    :type dec: float
+    :param lat: Latitude degrees
+    :type lat: float
+    :return: (alt, az) degrees
+    :rtype: (float, float)
+    """
+    ha = math.radians(ha)
+    dec = math.radians(dec)
+    lat = math.radians(lat)
+    sin_alt = math.sin(dec) * math.sin(lat) + math.cos(dec) * math.cos(lat) * math.cos(ha)
+    alt = math.asin(max(-1.0, min(1.0, sin_alt)))
+    az = math.atan2(-math.cos(dec) * math.sin(ha),
+                    math.sin(dec) * math.cos(lat) - math.cos(dec) * math.sin(lat) * math.cos(ha))
+    return math.degrees(alt), math.degrees(az) % 360.0
+
+
+class PositionService:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+
+    def update(self, status, ra_ticks_per_degree, dec_ticks_per_degree, lat, now=None):
+        """
+        :param status: Status with POSITION_KEYS and rs, ds axis speeds in steps per second.
+        :type status: dict
+        :param ra_ticks_per_degree: RA steps per degree
+        :type ra_ticks_per_degree: float
+        :param dec_ticks_per_degree: Dec steps per degree
+        :type dec_ticks_per_degree: float
+        :param lat: Latitude degrees
+        :type lat: float
+        :param now: time.monotonic() status is for, now if None.
+        :type now: float
+        """
+        if any(status.get(key) is None for key in POSITION_KEYS):
+            self.clear()
+            return
+        snapshot = {key: status[key] for key in POSITION_KEYS}
+        snapshot['time'] = time.monotonic() if now is None else now
+        # Same direction as steps to HA in skyconv
+        snapshot['ha_rate'] = status.get('rs', 0.0) / ra_ticks_per_degree
+        snapshot['dec_rate'] = status.get('ds', 0.0) / dec_ticks_per_degree
+        snapshot['lat'] = lat
+        snapshot['geometric_altaz'] = hadec_to_altaz_deg(snapshot['hadec_ha'], snapshot['hadec_dec'], lat)
+        with self._lock:
+            self._snapshot = snapshot
+
+    def clear(self):
+        with self._lock:
+            self._snapshot = None
+
+    def position(self, now=None):
+        """
+        :param now: time.monotonic() to get position for, now if None.
+        :type now: float
+        :return: Extrapolated POSITION_KEYS or None if there is no position.
+        :rtype: Union[None, Dict[str, float]]
+        """
+        with self._lock:
+            s = self._snapshot
+        if s is None:
+            return None
+        if now is None:
+            now = time.monotonic()
+        dt = min(MAX_EXTRAPOLATION_SECONDS, max(0.0, now - s['time']))
+        if dt == 0.0:
+            return {key: s[key] for key in POSITION_KEYS}
+        d_ha = s['ha_rate'] * dt
+        dec = s['hadec_dec'] + s['dec_rate'] * dt
+        if abs(dec) > 90.0:
+            # Crossing the pole, hold last position
+            return {key: s[key] for key in POSITION_KEYS}
+        ha = s['hadec_ha'] + d_ha
+        # TETE RA = sidereal time - HA
+        d_ra = SIDEREAL_DEG_PER_SECOND * dt - d_ha
+        alt, az = hadec_to_altaz_deg(ha, dec, s['lat'])
+        alt0, az0 = s['geometric_altaz']
+        d_az = (az - az0 + 180.0) % 360.0 - 180.0
+        return {
+            'tete_ra': (s['tete_ra'] + d_ra) % 360.0,
+            'tete_dec': s['tete_dec'] + s['dec_rate'] * dt,
+            'hadec_ha': ha % 360.0,
+            'hadec_dec': dec,
+            'alt': s['alt'] + alt - alt0,
+            'az': (s['az'] + d_az) % 360.0
+        }
@@ -0,0 +1,184 @@
+"""
+One thread that runs delayed and periodic calls from a heap, instead of a threading.Timer thread per call.
+Callbacks run on the scheduler thread so should be short, like a serial command. Keeps lateness stats so timer
+latency and jitter can be checked.
+"""
+import heapq
+import itertools
+import math
+import threading
+import time
+import traceback
+
+
+class Handle:
+    def __init__(self, scheduler, due, func, args, period=None):
+        self._scheduler = scheduler
+        self.due = due
+        self.func = func
+        self.args = args
+        self.period = period
+        self.cancelled = False
+        self.done = False
+
+    def cancel(self):
+        """
+        Stops the call if it hasn't run yet, and any repeats.
+        """
+        if not self.cancelled and not self.done:
+            self.cancelled = True
+            self._scheduler._cancelled(self)
+
+
+class Scheduler:
+    def __init__(self, name='scheduler'):
+        self.name = name
+        self._cond = threading.Condition()
+        self._heap = []
+        self._counter = itertools.count()
+        self._thread = None
+        self._stop = False
+        self._stats = {'scheduled': 0, 'run': 0, 'cancelled': 0, 'errors': 0}
+        # Lateness, seconds between when a call was due and when it ran.
+        self._late_count = 0
+        self._late_mean = 0.0
+        self._late_m2 = 0.0
+        self._late_max = 0.0
+        self._late_last = 0.0
+
+    def call_later(self, delay, func, *args):
+        """
+        :param delay: Seconds from now
+        :type delay: float
+        :param func: Function to call
+        :type func: Callable
+        :return: Handle that can cancel call
+        :rtype: Handle
+        """
+        return self._schedule(Handle(self, time.monotonic() + delay, func, args))
+
+    def call_every(self, period, func, *args):
+        """
+        Calls func every period seconds starting period seconds from now. If running behind calls that were missed
+        are skipped.
+        :param period: Seconds between calls
+        :type period: float
+        :param func: Function to call
+        :type func: Callable
+        :return: Handle that can cancel the calls
+        :rtype: Handle
+        """
+        return self._schedule(Handle(self, time.monotonic() + period, func, args, period))
+
+    def stop(self):
+        """
+        Stops scheduler thread, pending calls don't run.
+        """
+        with self._cond:
+            self._stop = True
+            self._cond.notify()
+        if self._thread and threading.current_thread() is not self._thread:
+            self._thread.join(5)
+
+    def pending(self):
+        """
+        :return: Number of calls waiting to run.
+        :rtype: int
+        """
+        with self._cond:
+            return sum(1 for entry in self._heap if not entry[2].cancelled)
+
+    def stats(self):
+        """
+        :return: Counts of scheduled, run, cancelled and errors and lateness in seconds (mean, stddev as jitter, max,
+                 last).
+        :rtype: dict
+        """
+        with self._cond:
+            ret = dict(self._stats)
+            ret['pending'] = sum(1 for entry in self._heap if not entry[2].cancelled)
+            ret['late_mean'] = self._late_mean
+            ret['late_jitter'] = math.sqrt(self._late_m2 / self._late_count) if self._late_count else 0.0
+            ret['late_max'] = self._late_max
+            ret['late_last'] = self._late_last
+            return ret
+
+    def _schedule(self, handle):
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+            heapq.heappush(self._heap, (handle.due, next(self._counter), handle))
+            self._stats['scheduled'] += 1
+            # Wake up if this is now first
+            if self._heap[0][2] is handle:
+                self._cond.notify()
+        return handle
+
+    def _cancelled(self, handle):
+        with self._cond:
+            self._stats['cancelled'] += 1
+            # Drop cancelled entries at the top so wait time is right, others are dropped when reached.
+            while self._heap and self._heap[0][2].cancelled:
+                heapq.heappop(self._heap)
+            self._cond.notify()
+
+    def _record_late(self, late):
+        self._late_count += 1
+        delta = late - self._late_mean
+        self._late_mean += delta / self._late_count
+        self._late_m2 += delta * (late - self._late_mean)
+        self._late_max = max(self._late_max, late)
+        self._late_last = late
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._stop:
+                        return
+                    if not self._heap:
+                        self._cond.wait()
+                        continue
+                    due, _, handle = self._heap[0]
+                    if handle.cancelled:
+                        heapq.heappop(self._heap)
+                        continue
+                    now = time.monotonic()
+                    if due > now:
+                        self._cond.wait(due - now)
+                        continue
+                    heapq.heappop(self._heap)
+                    self._record_late(now - due)
+                    self._stats['run'] += 1
+                    if handle.period is None:
+                        handle.done = True
+                    else:
+                        handle.due = due + handle.period
+                        if handle.due <= now:
+                            handle.due = now + handle.period
+                        heapq.heappush(self._heap, (handle.due, next(self._counter), handle))
+                    break
+            try:
+                handle.func(*handle.args)
+            except Exception:
+                with self._cond:
+                    self._stats['errors'] += 1
+                traceback.print_exc()
+
+
+default_scheduler = Scheduler()
+
+
+def call_later(delay, func, *args):
+    """
+    Scheduler.call_later on the default scheduler.
+    """
+    return default_scheduler.call_later(delay, func, *args)
+
+
+def call_every(period, func, *args):
+    """
+    Scheduler.call_every on the default scheduler.
+    """
+    return default_scheduler.call_every(period, func, *args)
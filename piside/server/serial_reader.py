@@ -0,0 +1,246 @@
+"""
+Reads a serial port on its own thread. Incoming bytes are parsed into frames and responses are matched in order to
+pending requests with futures, so writers don't wait on readers and nothing polls in_waiting. When a request times out
+the link is resynced, everything pending fails and what comes in until the port is quiet is dropped, so a late
+response can't be taken as the response to the next request.
+"""
+import collections
+import concurrent.futures
+import queue
+import threading
+import time
+import traceback
+
+
+class SerialReader:
+    def __init__(self, ser, parser, is_response_end, name='serial_reader', unsolicited_size=64, on_unsolicited=None,
+                 resync_quiet=0.2, resync_max=1.0):
+        """
+        :param ser: Open serial port, reads should have a timeout.
+        :type ser: serial.Serial
+        :param parser: Object with feed(bytes) -> list of frames, and optionally reset() to drop partial input.
+        :param is_response_end: Function, true if frame ends a response.
+        :type is_response_end: Callable[[object], bool]
+        :param name: Thread name
+        :type name: str
+        :param unsolicited_size: Max frames kept in self.unsolicited, oldest are dropped.
+        :type unsolicited_size: int
+        :param on_unsolicited: If not None, called on the reader thread with frames that came in while no request was
+            pending, instead of putting them in self.unsolicited.
+        :type on_unsolicited: Callable[[object], None]
+        :param resync_quiet: Seconds the port has to be quiet after a timeout before the next request is written.
+        :type resync_quiet: float
+        :param resync_max: Max seconds input is dropped after a timeout, for ports that are never quiet like a
+            microcontroller streaming status.
+        :type resync_max: float
+        """
+        self.serial = ser
+        self.parser = parser
+        self.is_response_end = is_response_end
+        # Frames that came in while no request was pending
+        self.unsolicited = queue.Queue(unsolicited_size)
+        self.on_unsolicited = on_unsolicited
+        self.resync_quiet = resync_quiet
+        self.resync_max = resync_max
+        self.resyncs = 0
+        self.__pending = collections.deque()
+        self.__frames = []
+        self.__lock = threading.Lock()
+        self.__write_lock = threading.Lock()
+        self.__running = True
+        # After a timeout input is dropped until resync_quiet seconds pass without any, or resync_max.
+        self.__resyncing = False
+        self.__reset_parser = False
+        self.__resync_start = 0
+        self.__last_data = 0
+        self.__thread = threading.Thread(target=self.__run, name=name, daemon=True)
+        self.__thread.start()
+
+    def send(self, data):
+        """
+        Writes data and returns a future for its response.
+        :param data: bytes to write
+        :type data: bytes
+        :return: Future resolving to the list of frames of the response, last one is the frame that ended it.
+        :rtype: concurrent.futures.Future
+        """
+        future = concurrent.futures.Future()
+        with self.__write_lock:
+            self.__wait_quiet()
+            with self.__lock:
+                self.__pending.append(future)
+            self.serial.write(data)
+        return future
+
+    def __wait_quiet(self):
+        """
+        Call with write lock held, waits for a resync to finish.
+        """
+        while True:
+            with self.__lock:
+                left = self.__resync_left()
+                if left <= 0:
+                    return
+            time.sleep(left)
+
+    def __resync_left(self):
+        """
+        Call with lock held.
+        :return: Seconds until resync is done, ends it if 0.
+        :rtype: float
+        """
+        if not self.__resyncing:
+            return 0
+        now = time.monotonic()
+        left = min(self.__last_data + self.resync_quiet, self.__resync_start + self.resync_max) - now
+        if left <= 0:
+            self.__resyncing = False
+            return 0
+        return left
+
+    def request(self, data, timeout=2.0, kick=None, kick_after=None):
+        """
+        Writes data and waits for its response.
+        :param data: bytes to write
+        :type data: bytes
+        :param timeout: Seconds to wait for response.
+        :type timeout: float
+        :param kick: If not None, bytes to write every kick_after seconds while waiting.
+        :type kick: bytes
+        :param kick_after: Seconds between kicks.
+        :type kick_after: float
+        :return: Frames of the response, last one is the frame that ended it.
+        :rtype: list
+        :raises TimeoutError: If no response within timeout.
+        """
+        future = self.send(data)
+        return self.wait(future, timeout, kick, kick_after)
+
+    def wait(self, future, timeout=2.0, kick=None, kick_after=None):
+        """
+        Waits for a future from send.
+        :raises TimeoutError: If no response within timeout.
+        """
+        end = time.monotonic() + timeout
+        while True:
+            left = end - time.monotonic()
+            wait = left
+            if kick is not None and kick_after is not None:
+                wait = min(left, kick_after)
+            try:
+                return future.result(max(0.0, wait))
+            except concurrent.futures.TimeoutError:
+                if future.done():
+                    # Failed by a resync
+                    raise
+                if wait >= left:
+                    break
+                with self.__write_lock:
+                    self.serial.write(kick)
+        future.cancel()
+        self.resync()
+        raise TimeoutError('No response on %s' % self.__thread.name)
+
+    def resync(self):
+        """
+        Fails all pending requests and drops input until the port is quiet, a late response would otherwise go to the
+        next request and every response after it would be off by one. Done by wait on timeout, call it if requests
+        sent are given up on some other way.
+        """
+        with self.__lock:
+            pending = list(self.__pending)
+            self.__pending.clear()
+            self.__frames = []
+            self.__resyncing = True
+            self.__reset_parser = True
+            self.__resync_start = self.__last_data = time.monotonic()
+            self.resyncs += 1
+        if hasattr(self.serial, 'reset_input_buffer'):
+            try:
+                self.serial.reset_input_buffer()
+            except Exception:
+                pass
+        for future in pending:
+            if not future.done():
+                future.set_exception(TimeoutError('Resync after timeout on %s' % self.__thread.name))
+
+    def close(self):
+        """
+        Stops reader thread, doesn't close the serial port.
+        """
+        self.__running = False
+        if hasattr(self.serial, 'cancel_read'):
+            try:
+                self.serial.cancel_read()
+            except Exception:
+                pass
+        if threading.current_thread() is not self.__thread:
+            self.__thread.join(5)
+        with self.__lock:
+            pending = list(self.__pending)
+            self.__pending.clear()
+        for future in pending:
+            future.cancel()
+
+    def __run(self):
+        while self.__running:
+            try:
+                # Blocks until at least a byte comes in or the port read timeout.
+                data = self.serial.read(self.serial.in_waiting or 1)
+            except Exception as e:
+                if self.__running:
+                    print('SerialReader - error: reading', self.__thread.name, e)
+                    self.__running = False
+                break
+            if data:
+                with self.__lock:
+                    if self.__resync_left() > 0:
+                        self.__last_data = time.monotonic()
+                        continue
+                    reset_parser, self.__reset_parser = self.__reset_parser, False
+                if reset_parser and hasattr(self.parser, 'reset'):
+                    self.parser.reset()
+                self.__dispatch(self.parser.feed(data))
+        with self.__lock:
+            pending = list(self.__pending)
+            self.__pending.clear()
+        for future in pending:
+            if not future.done():
+                future.set_exception(IOError('Serial reader stopped'))
+
+    def __dispatch(self, frames):
+        for frame in frames:
+            response = None
+            with self.__lock:
+                future = self.__pending[0] if self.__pending else None
+                if future is not None:
+                    self.__frames.append(frame)
+                    if self.is_response_end(frame):
+                        self.__pending.popleft()
+                        response = self.__frames
+                        self.__frames = []
+            if future is None:
+                if self.on_unsolicited is not None:
+                    try:
+                        self.on_unsolicited(frame)
+                    except Exception:
+                        traceback.print_exc()
+                else:
+                    self.__put_unsolicited(frame)
+            elif response is not None:
+                try:
+                    future.set_result(response)
+                except concurrent.futures.InvalidStateError:
+                    # Timed out and cancelled
+                    pass
+
+    def __put_unsolicited(self, frame):
+        while True:
+            try:
+                self.unsolicited.put_nowait(frame)
+                return
+            except queue.Full:
+                try:
+                    self.unsolicited.get_nowait()
+                except queue.Empty:
+                    pass
@@ -11,6 +11,10 @@ import pickle
 _lock = threading.RLock()
 _plock = threading.RLock()
 
+MODEL_FILE = 'model.npz'
+# Older versions pickled the model, it is still loaded until the model is saved again.
+LEGACY_MODEL_FILE = 'model.pickle'
+
 with open('default_settings.json') as f:
     default_settings = json.load(f)
 
@@ -37,11 +41,17 @@ def write_settings(arg_settings):
 
 @fasteners.interprocess_locked('/tmp/ssteq_settings_lock')
 def save_pointing_model(model):
+    # pointing_model imports settings
+    import pointing_model
     if not is_simulation():
         subprocess.run(['sudo', 'mount', '-o', 'remount,rw', '/ssteq'])
     with _lock:
-        with open('model.pickle', mode='wb') as f_model:
-            pickle.dump(model, f_model)
+        # Written then renamed so a power cut doesn't leave half a model.
+        with open(MODEL_FILE + '.tmp', mode='wb') as f_model:
+            pointing_model.save_model(model, f_model)
+        os.replace(MODEL_FILE + '.tmp', MODEL_FILE)
+        if os.path.isfile(LEGACY_MODEL_FILE):
+            os.remove(LEGACY_MODEL_FILE)
     if not is_simulation():
         subprocess.run(['sudo', 'mount', '-o', 'remount,ro', '/ssteq'])
 
@@ -51,19 +61,23 @@ def rm_pointing_model():
     if not is_simulation():
         subprocess.run(['sudo', 'mount', '-o', 'remount,rw', '/ssteq'])
     with _lock:
-        if os.path.isfile('model.pickle'):
-            os.remove('model.pickle')
+        for model_file in [MODEL_FILE, LEGACY_MODEL_FILE]:
+            if os.path.isfile(model_file):
+                os.remove(model_file)
     if not is_simulation():
         subprocess.run(['sudo', 'mount', '-o', 'remount,ro', '/ssteq'])
 
 
 @fasteners.interprocess_locked('/tmp/ssteq_settings_lock')
 def load_pointing_model():
+    import pointing_model
     model = None
     with _lock:
-        if os.path.isfile('model.pickle'):
-            with open('model.pickle', mode='rb') as f_model:
-                model = pickle.load(f_model)
+        if os.path.isfile(MODEL_FILE):
+            model = pointing_model.load_model(MODEL_FILE)
+        elif os.path.isfile(LEGACY_MODEL_FILE):
+            with open(LEGACY_MODEL_FILE, mode='rb') as f_model:
+                model = pointing_model.from_legacy(pickle.load(f_model))
     return model
 
 
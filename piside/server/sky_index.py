@@ -0,0 +1,214 @@
+"""
+Nearest point and within distance lookups for points on the sphere, like pointing model sync points. Points are unit
+vectors in a KD-tree, so straight line distance orders the same as angular separation. Points added or replaced since
+the tree was built are checked directly until there are enough of them to make rebuilding worth it.
+"""
+import math
+
+import numpy
+import scipy.spatial
+
+# Points stored directly before the tree is rebuilt is at least this, or square root of number of points.
+MIN_PENDING = 16
+INITIAL_CAPACITY = 16
+
+
+def to_unit_vectors(lon, lat):
+    """
+    :param lon: Longitude like degrees, HA or Az, scalar or array.
+    :param lat: Latitude like degrees, Dec or Alt, scalar or array.
+    :return: n x 3 unit vectors.
+    :rtype: numpy.ndarray
+    """
+    lon = numpy.radians(numpy.ravel(numpy.asarray(lon, dtype=float)))
+    lat = numpy.radians(numpy.ravel(numpy.asarray(lat, dtype=float)))
+    cos_lat = numpy.cos(lat)
+    return numpy.column_stack([cos_lat * numpy.cos(lon), cos_lat * numpy.sin(lon), numpy.sin(lat)])
+
+
+def chord_to_deg(chord):
+    """
+    :param chord: Straight line distance between unit vectors.
+    :return: Angle between them in degrees.
+    """
+    return numpy.degrees(2.0 * numpy.arcsin(numpy.minimum(numpy.asarray(chord) / 2.0, 1.0)))
+
+
+def deg_to_chord(deg):
+    """
+    :param deg: Angle in degrees.
+    :return: Straight line distance between unit vectors that far apart.
+    """
+    return 2.0 * math.sin(math.radians(min(deg, 180.0)) / 2.0)
+
+
+class SkyIndex:
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        """
+        Removes all points.
+        """
+        self._xyz = numpy.zeros((INITIAL_CAPACITY, 3))
+        self._size = 0
+        self._tree = None
+        # Points before this index are in the tree
+        self._tree_size = 0
+        # Tree points that have moved since tree was built
+        self._stale = set()
+
+    def __len__(self):
+        return self._size
+
+    def add(self, lon, lat):
+        """
+        :param lon: Longitude like degrees
+        :type lon: float
+        :param lat: Latitude like degrees
+        :type lat: float
+        :return: Index of new point
+        :rtype: int
+        """
+        if self._size == len(self._xyz):
+            xyz = numpy.zeros((2 * len(self._xyz), 3))
+            xyz[: self._size] = self._xyz[: self._size]
+            self._xyz = xyz
+        idx = self._size
+        self._xyz[idx] = to_unit_vectors(lon, lat)[0]
+        self._size += 1
+        self._maybe_rebuild()
+        return idx
+
+    def set(self, lon, lat):
+        """
+        Replaces all points, faster than adding them one at a time.
+        :param lon: Longitude like degrees array
+        :type lon: numpy.ndarray
+        :param lat: Latitude like degrees array
+        :type lat: numpy.ndarray
+        """
+        vectors = to_unit_vectors(lon, lat)
+        self.clear()
+        self._xyz = numpy.zeros((max(INITIAL_CAPACITY, 2 * len(vectors)), 3))
+        self._xyz[: len(vectors)] = vectors
+        self._size = len(vectors)
+        self._rebuild()
+
+    def replace(self, idx, lon, lat):
+        """
+        Moves point idx.
+        :param idx: Index from add
+        :type idx: int
+        :param lon: Longitude like degrees
+        :type lon: float
+        :param lat: Latitude like degrees
+        :type lat: float
+        """
+        if idx < 0 or idx >= self._size:
+            raise IndexError("SkyIndex point index out of range")
+        self._xyz[idx] = to_unit_vectors(lon, lat)[0]
+        if idx < self._tree_size:
+            self._stale.add(idx)
+        self._maybe_rebuild()
+
+    def delete(self, idx):
+        """
+        Removes point idx, later points indexes go down by one.
+        :param idx: Index from add
+        :type idx: int
+        """
+        if idx < 0 or idx >= self._size:
+            raise IndexError("SkyIndex point index out of range")
+        self._xyz[idx : self._size - 1] = self._xyz[idx + 1 : self._size]
+        self._size -= 1
+        self._rebuild()
+
+    def nearest(self, lon, lat):
+        """
+        :param lon: Longitude like degrees, scalar or array.
+        :param lat: Latitude like degrees, scalar or array.
+        :return: (index of nearest point, separation degrees), arrays shaped like lon if arrays given.
+        :rtype: Tuple[Union[int, numpy.ndarray], Union[float, numpy.ndarray]]
+        """
+        if self._size == 0:
+            raise ValueError("SkyIndex has no points")
+        shape = numpy.shape(lon)
+        vectors = to_unit_vectors(lon, lat)
+        best_chord = numpy.full(len(vectors), numpy.inf)
+        best_idx = numpy.zeros(len(vectors), dtype=int)
+        if self._tree is not None:
+            # Stale points could be the nearest, get enough to have one good one.
+            k = min(len(self._stale) + 1, self._tree_size)
+            chord, idx = self._tree.query(vectors, k=k)
+            chord = numpy.reshape(chord, (len(vectors), k))
+            idx = numpy.reshape(idx, (len(vectors), k))
+            if self._stale:
+                chord = numpy.where(numpy.isin(idx, list(self._stale)), numpy.inf, chord)
+            col = numpy.argmin(chord, axis=1)
+            rows = numpy.arange(len(vectors))
+            best_chord = chord[rows, col]
+            best_idx = idx[rows, col]
+        pending = self._pending()
+        if len(pending) > 0:
+            chord = numpy.linalg.norm(vectors[:, numpy.newaxis, :] - self._xyz[pending][numpy.newaxis, :, :], axis=2)
+            col = numpy.argmin(chord, axis=1)
+            rows = numpy.arange(len(vectors))
+            closer = chord[rows, col] < best_chord
+            best_chord = numpy.where(closer, chord[rows, col], best_chord)
+            best_idx = numpy.where(closer, pending[col], best_idx)
+        separation = chord_to_deg(best_chord)
+        if shape == ():
+            return int(best_idx[0]), float(separation[0])
+        return best_idx.reshape(shape), separation.reshape(shape)
+
+    def within(self, lon, lat, deg):
+        """
+        :param lon: Longitude like degrees
+        :type lon: float
+        :param lat: Latitude like degrees
+        :type lat: float
+        :param deg: Separation in degrees
+        :type deg: float
+        :return: Sorted indexes of points less than deg away.
+        :rtype: numpy.ndarray
+        """
+        vector = to_unit_vectors(lon, lat)[0]
+        max_chord = deg_to_chord(deg)
+        found = []
+        if self._tree is not None:
+            found = [i for i in self._tree.query_ball_point(vector, max_chord) if i not in self._stale]
+        pending = self._pending()
+        if len(pending) > 0:
+            chord = numpy.linalg.norm(self._xyz[pending] - vector, axis=1)
+            found.extend(pending[chord < max_chord].tolist())
+        # Ball query includes points at the radius
+        found = numpy.array(sorted(found), dtype=int)
+        if len(found) > 0:
+            found = found[numpy.linalg.norm(self._xyz[found] - vector, axis=1) < max_chord]
+        return found
+
+    def _pending(self):
+        """
+        :return: Indexes of points not in the tree or moved since it was built.
+        :rtype: numpy.ndarray
+        """
+        pending = numpy.arange(self._tree_size, self._size)
+        if self._stale:
+            pending = numpy.concatenate([numpy.array(sorted(self._stale), dtype=int), pending])
+        return pending
+
+    def _maybe_rebuild(self):
+        pending = self._size - self._tree_size + len(self._stale)
+        if pending > max(MIN_PENDING, math.isqrt(self._size)):
+            self._rebuild()
+
+    def _rebuild(self):
+        self._stale = set()
+        self._tree_size = self._size
+        if self._size > MIN_PENDING:
+            self._tree = scipy.spatial.cKDTree(self._xyz[: self._size].copy())
+        else:
+            # Few enough to check directly
+            self._tree = None
+            self._tree_size = 0
@@ -1,10 +1,13 @@
 import typing
 
 import astropy.units as u
+import erfa
+import numpy
 import astropy.units.si as usi
 from astropy.coordinates import AltAz, ICRS, TETE, Longitude
 from astropy.time import Time as AstroTime
 
+import metrics
 import pointing_model
 import settings
 import skyconv_hadec
@@ -26,8 +29,7 @@ def get_sidereal_time(obstime=None):
     if not obstime:
         obstime = AstroTime.now()
     # We don't use astropy.time.Time.sidereal_time because it needs to have update iers tables
-    frame_args = get_frame_init_args('altaz', obstime=obstime)
-    return _altaz_to_tete(AltAz(alt=90.0 * u.deg, az=0 * u.deg, **frame_args))[0].ra
+    return Longitude(fast_sidereal_time(obstime=obstime) * u.deg)
 
 
 def _icrs_to_hadec(icrs_coord, obstime=None, pressure=None):
@@ -288,20 +290,22 @@ def _ha_delta_deg(started_angle, end_angle):
     Finds the degree difference between two angles ang1-ang2, then returns shortest side that will take you
     there - or +.
     :param started_angle: First angle
-    :type started_angle: float
+    :type started_angle: Union[float, numpy.ndarray]
     :param end_angle: Second angle
-    :type end_angle: float
+    :type end_angle: Union[float, numpy.ndarray]
     :return: The shortest difference between started_angle and end_angle.
-    :rtype: float
+    :rtype: Union[float, numpy.ndarray]
     """
     end_angle = _clean_deg(end_angle)
     started_angle = _clean_deg(started_angle)
 
-    d_1 = end_angle - started_angle
-    d_2 = 360.0 + d_1
-    d_3 = d_1 - 360
-
-    return min([d_1, d_2, d_3], key=abs)
+    d_1 = numpy.asarray(end_angle - started_angle)
+    d = numpy.mod(d_1 + 180.0, 360.0) - 180.0
+    # Exactly half way around either side is as short, keep the original direction.
+    d = numpy.where((d == -180.0) & (d_1 > 0), 180.0, d)
+    if d.ndim == 0:
+        return float(d)
+    return d
 
 
 def _hadec_to_steps(hadec_coord):
@@ -351,6 +355,7 @@ def _altaz_threshold_fix_pressure(altaz_coord):
     return new_altaz_coord
 
 
+@metrics.timed('skyconv_seconds', function='to_altaz')
 def to_altaz(coord, obstime=None):
     """
     Convert any type of coord to AltAz
@@ -373,6 +378,7 @@ def to_altaz(coord, obstime=None):
     return altaz
 
 
+@metrics.timed('skyconv_seconds', function='to_icrs')
 def to_icrs(coord):
     """
     Convert any coordinate to ICRS
@@ -394,6 +400,7 @@ def to_icrs(coord):
     return icrs
 
 
+@metrics.timed('skyconv_seconds', function='to_hadec')
 def to_hadec(coord, obstime=None):
     """
     Convert any coordinate to HADec
@@ -416,6 +423,7 @@ def to_hadec(coord, obstime=None):
     return hadec
 
 
+@metrics.timed('skyconv_seconds', function='to_tete')
 def to_tete(coord, obstime=None, overwrite_time=False):
     """
     Convert any coordinate to TETE.
@@ -459,9 +467,11 @@ def to_tete(coord, obstime=None, overwrite_time=False):
     return tete
 
 
+@metrics.timed('skyconv_seconds', function='to_steps')
 def to_steps(coord, obstime=None):
     """
-    Takes a HaDec,TETE,IRCS,AltAz, or dict(steps) coordinate and converts to to steps.
+    Takes a HaDec,TETE,IRCS,AltAz, or dict(steps) coordinate and converts to to steps. Array coordinates give
+    arrays of steps.
     :param coord: RADec, AltAz, TETE, HADec, or dict {'ha': int, 'dec': int}
     :type coord: Union[RADec, AltAz, TETE, HADec, typing.Dict[str, float]]
     :param obstime: If None uses now
@@ -471,6 +481,8 @@ def to_steps(coord, obstime=None):
     """
     if type(coord) is dict and 'ha' in coord:  # Already ha dec steps
         return coord
+    if not coord.isscalar:
+        return fast_to_steps(coord, obstime=obstime)
     if coord.name == 'tete':
         if obstime is None:
             obstime = AstroTime.now()
@@ -480,29 +492,22 @@ def to_steps(coord, obstime=None):
     return ret
 
 
+@metrics.timed('skyconv_seconds', function='steps_to_coord')
 def steps_to_coord(steps, frame='icrs', obstime=None):
     """
     Steps to hour angle dec.
-    :param steps: keys ha, and dec
+    :param steps: keys ha, and dec. Values can be arrays to convert many step positions at once.
     :rtype steps: dict
     :param frame: One of, 'icrs', 'altaz', 'hadec', default 'icrs'
     :param obstime: time of observation default now
     :type obstime: Union[None, AstroTime]
-    :return: coordinate in specified frame
+    :return: coordinate in specified frame, array coordinate if steps were arrays.
     """
-    sync_info = settings.runtime_settings['sync_info']
-    ha_steps_per_degree = settings.settings['ra_ticks_per_degree']
-    dec_steps_per_degree = settings.settings['dec_ticks_per_degree']
-    d_ha = (steps['ha'] - sync_info['steps']['ha']) / ha_steps_per_degree
-    d_dec = (steps['dec'] - sync_info['steps']['dec']) / dec_steps_per_degree
-
-    ha_deg = _clean_deg(sync_info['coord'].ha.deg + d_ha)
-    # print({'frame': frame, 'ha_deg': ha_deg})
-    dec_deg, pole_count = _clean_deg(sync_info['coord'].dec.deg + d_dec, True)
-    # print({'frame': frame, 'dec_deg': dec_deg})
-    if pole_count % 2 > 0:
-        ha_deg = _clean_deg(ha_deg + 180.0)
-    # print({'frame': frame, 'dec_deg': dec_deg})
+    if numpy.ndim(steps['ha']) > 0 or numpy.ndim(steps['dec']) > 0:
+        return _steps_to_coord_array(steps, frame=frame, obstime=obstime)
+    ha_deg, dec_deg = _steps_hadec_deg(steps)
+    ha_deg = float(ha_deg)
+    dec_deg = float(dec_deg)
 
     frame_args = get_frame_init_args('hadec', obstime=obstime)
     hadec_coord = skyconv_hadec.HADec(ha=ha_deg * u.deg, dec=dec_deg * u.deg, **frame_args)
@@ -536,32 +541,163 @@ def steps_to_coord(steps, frame='icrs', obstime=None):
             return to_icrs(hadec_coord)
 
 
+def _steps_hadec_deg(steps):
+    """
+    Steps to mount HA and Dec degrees using sync info, before any pointing model.
+    :param steps: keys ha, and dec, floats or arrays
+    :type steps: dict
+    :return: (ha degrees, dec degrees)
+    :rtype: (numpy.ndarray, numpy.ndarray)
+    """
+    sync_info = settings.runtime_settings['sync_info']
+    ha_steps_per_degree = settings.settings['ra_ticks_per_degree']
+    dec_steps_per_degree = settings.settings['dec_ticks_per_degree']
+    d_ha = (numpy.asarray(steps['ha'], dtype=float) - sync_info['steps']['ha']) / ha_steps_per_degree
+    d_dec = (numpy.asarray(steps['dec'], dtype=float) - sync_info['steps']['dec']) / dec_steps_per_degree
+    ha_deg = _clean_deg(sync_info['coord'].ha.deg + d_ha)
+    dec_deg, pole_count = _clean_deg(sync_info['coord'].dec.deg + d_dec, True)
+    ha_deg = numpy.where(pole_count % 2 > 0, _clean_deg(ha_deg + 180.0), ha_deg)
+    return numpy.broadcast_arrays(ha_deg, dec_deg)
+
+
+def _model_transform_deg(ha, dec, context, inverse=False):
+    """
+    Applies model_real_stepper to arrays of HA and Dec degrees.
+    :param ha: HA degrees
+    :type ha: numpy.ndarray
+    :param dec: Dec degrees
+    :type dec: numpy.ndarray
+    :param context: Context for frames conversions when model is in altaz.
+    :type context: FastContext
+    :param inverse: If should use inverse_transform_point
+    :type inverse: bool
+    :return: (ha degrees, dec degrees)
+    :rtype: (numpy.ndarray, numpy.ndarray)
+    """
+    model = model_real_stepper
+    transform = model.inverse_transform_point if inverse else model.transform_point
+    if model.frame() == 'hadec':
+        point = transform(HADec(ha=ha * u.deg, dec=dec * u.deg))
+        return point.ha.deg, point.dec.deg
+    alt, az = fast_hadec_to_altaz(ha, dec, context=context)
+    point = transform(AltAz(alt=alt * u.deg, az=az * u.deg))
+    return fast_altaz_to_hadec(point.alt.deg, point.az.deg, context=context)
+
+
+@metrics.timed('skyconv_seconds', function='fast_to_steps')
+def fast_to_steps(coord, obstime=None, context=None):
+    """
+    to_steps using the fast conversions, works for scalar and array coordinates.
+    :param coord: Coordinate RADec, AltAz, TETE or HADec
+    :param obstime: If None uses now, or coordinate obstime for AltAz, HADec.
+    :type obstime: AstroTime
+    :param context: Context to reuse instead of making one for obstime.
+    :type context: FastContext
+    :return: {'ha': steps, 'dec': steps}
+    :rtype: Dict[str, numpy.ndarray]
+    """
+    if coord.name != 'icrs' and coord.name != 'tete' and not coord.obstime.isscalar:
+        # Fast path needs a single time
+        steps = [to_steps(coord[idx], obstime=obstime) for idx in numpy.ndindex(coord.shape)]
+        return {'ha': numpy.array([s['ha'] for s in steps]).reshape(coord.shape),
+                'dec': numpy.array([s['dec'] for s in steps]).reshape(coord.shape)}
+    if context is None:
+        if coord.name == 'icrs' or coord.name == 'tete':
+            context = FastContext(obstime=obstime)
+        else:
+            context = FastContext(obstime=coord.obstime)
+
+    if coord.name == 'icrs':
+        ha, dec = fast_icrs_to_hadec(coord.ra.deg, coord.dec.deg, context=context)
+    elif coord.name == 'tete':
+        ha, dec = fast_tete_to_hadec(coord.ra.deg, coord.dec.deg, context=context)
+    elif coord.name == 'altaz':
+        ha, dec = fast_altaz_to_hadec(coord.alt.deg, coord.az.deg, context=context)
+    elif coord.name == 'hadec':
+        ha, dec = coord.ha.deg, coord.dec.deg
+    else:
+        print('ERROR Unknown Coordinate')
+        return None
+    ha, dec = _model_transform_deg(ha, dec, context)
+
+    sync_info = settings.runtime_settings['sync_info']
+    d_ha = _ha_delta_deg(sync_info['coord'].ha.deg, ha)
+    d_dec = dec - sync_info['coord'].dec.deg
+    steps_ha = sync_info['steps']['ha'] + (d_ha * settings.settings['ra_ticks_per_degree'])
+    steps_dec = sync_info['steps']['dec'] + (d_dec * settings.settings['dec_ticks_per_degree'])
+    return {'ha': steps_ha, 'dec': steps_dec}
+
+
+@metrics.timed('skyconv_seconds', function='steps_to_hadec_deg')
+def steps_to_hadec_deg(steps, context=None, use_model=True):
+    """
+    Steps to HA and Dec degrees with the fast conversions.
+    :param steps: keys ha, and dec, floats or arrays
+    :type steps: dict
+    :param context: Context to reuse, only needed when model works in altaz.
+    :type context: FastContext
+    :param use_model: If should apply the inverse pointing model.
+    :type use_model: bool
+    :return: (ha degrees, dec degrees)
+    :rtype: (numpy.ndarray, numpy.ndarray)
+    """
+    ha, dec = _steps_hadec_deg(steps)
+    if use_model:
+        ha, dec = _model_transform_deg(ha, dec, context, inverse=True)
+    return ha, dec
+
+
+def _steps_to_coord_array(steps, frame='icrs', obstime=None):
+    """
+    steps_to_coord for arrays of steps.
+    :param steps: keys ha, and dec with arrays of steps
+    :rtype steps: dict
+    :param frame: One of, 'icrs', 'altaz', 'hadec', 'tete', default 'icrs'
+    :param obstime: time of observation default now
+    :type obstime: Union[None, AstroTime]
+    :return: Array coordinate in specified frame
+    """
+    context = FastContext(obstime=obstime)
+    ha, dec = steps_to_hadec_deg(steps, context=context)
+    if frame == 'hadec':
+        return skyconv_hadec.HADec(ha=ha * u.deg, dec=dec * u.deg,
+                                   **get_frame_init_args('hadec', obstime=context.obstime))
+    elif frame == 'altaz':
+        alt, az = fast_hadec_to_altaz(ha, dec, context=context)
+        return AltAz(alt=alt * u.deg, az=az * u.deg, **get_frame_init_args('altaz', obstime=context.obstime))
+    elif frame == 'tete':
+        ra, dec = fast_hadec_to_tete(ha, dec, context=context)
+        return TETE(ra=ra * u.deg, dec=dec * u.deg, **get_frame_init_args('tete', obstime=context.obstime))
+    else:
+        ra, dec = fast_hadec_to_icrs(ha, dec, context=context)
+        return ICRS(ra=ra * u.deg, dec=dec * u.deg)
+
+
 def _clean_deg(deg, dec=False):
     """
     Cleans up dec or ra as degree when outside range [-90, 90], [0, 360].
     :param deg: The degree to cleanup.
-    :type deg: float
+    :type deg: Union[float, numpy.ndarray]
     :param dec: True if dec, false if ra.
     :type dec: bool
-    :return: Cleaned up value. Second argument exists only when dec is True.
-    :rtype: float, (int)
+    :return: Cleaned up value. Second argument exists only when dec is True, number of times it went over a pole.
+    :rtype: Union[float, numpy.ndarray], (Union[int, numpy.ndarray])
     """
+    deg = numpy.asarray(deg, dtype=float)
     if dec:
-        pole_count = 0
-        while deg > 90 or deg < -90:
-            if deg > 90:
-                pole_count += 1
-                deg = 90 - (deg - 90)
-            if deg < -90:
-                pole_count += 1
-                deg = -90 - (deg + 90)
+        in_range = (deg >= -90.0) & (deg <= 90.0)
+        pole_count = numpy.where(in_range, 0, numpy.ceil((numpy.abs(deg) - 90.0) / 180.0)).astype(int)
+        # Dec reflects off the poles, so it is a triangle wave with 360 period.
+        folded = numpy.mod(deg + 90.0, 360.0)
+        folded = numpy.where(folded <= 180.0, folded - 90.0, 270.0 - folded)
+        deg = numpy.where(in_range, deg, folded)
+        if deg.ndim == 0:
+            return float(deg), int(pole_count)
         return deg, pole_count
     else:
-        if deg < 0:
-            while deg < 0:
-                deg += 360.0
-        elif deg > 360.0:
-            deg = deg % 360
+        deg = numpy.where((deg >= 0) & (deg <= 360.0), deg, numpy.mod(deg, 360.0))
+        if deg.ndim == 0:
+            return float(deg)
         return deg
 
 
@@ -576,3 +712,299 @@ def _earth_location_to_pressure(earth_location=None):
     height = earth_location.height.to_value(u.m)
     # https://www.engineeringtoolbox.com/air-altitude-pressure-d_462.html
     return 101325.0 * ((1.0 - 2.2557e-5 * height) ** 5.25588) * usi.Pa
+
+
+class FastContext:
+    """
+    ERFA astrometry context for one observation time at the runtime earth location. The fast_* conversions share it
+    so they skip building astropy frames and walking the transform graph. They take and give degrees as plain
+    numpy float arrays.
+    """
+
+    def __init__(self, obstime=None, pressure=None):
+        """
+        :param obstime: Observation time, defaults to now.
+        :type obstime: AstroTime
+        :param pressure: Pressure to use for refraction, if None uses pressure from location.
+        :type pressure: u.Quantity
+        """
+        frame_args = get_frame_init_args('hadec', obstime=obstime, pressure=pressure)
+        self.obstime = frame_args['obstime']
+        self.location = frame_args['location']
+        self.atm = int(frame_args['pressure'].to_value(u.hPa)) != 0
+        self.astrom = skyconv_hadec.apco_args(self.obstime, self.location, frame_args['pressure'],
+                                              frame_args['temperature'], frame_args['relative_humidity'],
+                                              frame_args['obswl'])
+        # Same context with refraction turned off, used below ALT_ATM_THRESHOLD
+        self.astrom_noatm = self.astrom.copy()
+        self.astrom_noatm['refa'] = 0.0
+        self.astrom_noatm['refb'] = 0.0
+        self.astrom_tete, self.rbpn = skyconv_hadec.apcs_tete(self.obstime, self.location)
+
+
+def get_fast_context(obstime=None, context=None):
+    """
+    Gives context if given, otherwise makes a new FastContext for obstime.
+    :param obstime: Observation time, defaults to now.
+    :type obstime: AstroTime
+    :param context: Already made context to use.
+    :type context: FastContext
+    :rtype: FastContext
+    """
+    if context is not None:
+        return context
+    return FastContext(obstime=obstime)
+
+
+def _fast_deg_args(lon, lat):
+    """
+    Makes broadcasted 1d radian arrays out of degree arguments.
+    :return: (lon radians, lat radians, shape of broadcasted input)
+    :rtype: (numpy.ndarray, numpy.ndarray, tuple)
+    """
+    lon, lat = numpy.broadcast_arrays(numpy.asarray(lon, dtype=float), numpy.asarray(lat, dtype=float))
+    shape = lon.shape
+    return numpy.radians(lon.ravel()), numpy.radians(lat.ravel()), shape
+
+
+def _fast_observed(ri, di, context):
+    """
+    CIRS to observed with refraction where altitude is above ALT_ATM_THRESHOLD.
+    :return: (az, zenith distance, ha, dec) in radians
+    :rtype: Tuple[numpy.ndarray]
+    """
+    aob, zob, hob, dob, rob = erfa.atioq(ri, di, context.astrom_noatm)
+    if context.atm:
+        refract = (90.0 - numpy.degrees(zob)) > ALT_ATM_THRESHOLD
+        if refract.any():
+            aob_r, zob_r, hob_r, dob_r, rob_r = erfa.atioq(ri[refract], di[refract], context.astrom)
+            aob[refract] = aob_r
+            zob[refract] = zob_r
+            hob[refract] = hob_r
+            dob[refract] = dob_r
+    return aob, zob, hob, dob
+
+
+def _fast_cirs(coord_type, lon, lat, alt, context):
+    """
+    Observed to CIRS with refraction where altitude is above ALT_ATM_THRESHOLD.
+    :param coord_type: 'A' for az, zenith distance or 'H' for ha, dec
+    :param alt: Altitude in degrees used for threshold check.
+    :return: (CIRS ra, CIRS dec) in radians
+    """
+    ri, di = erfa.atoiq(coord_type, lon, lat, context.astrom_noatm)
+    if context.atm:
+        refract = alt > ALT_ATM_THRESHOLD
+        if refract.any():
+            ri[refract], di[refract] = erfa.atoiq(coord_type, lon[refract], lat[refract], context.astrom)
+    return ri, di
+
+
+def _fast_hadec_to_azzen(ha, dec, context):
+    """
+    Geometric HADec to AltAz, refraction doesn't matter between them.
+    :return: (az, zenith distance) radians
+    """
+    aob, zob, hob, dob, rob = erfa.atioq(*erfa.atoiq('H', ha, dec, context.astrom_noatm), context.astrom_noatm)
+    return aob, zob
+
+
+def fast_icrs_to_hadec(ra, dec, obstime=None, context=None):
+    """
+    Fast ICRS to HADec.
+    :param ra: ICRS RA degrees, float or array
+    :param dec: ICRS Dec degrees, float or array
+    :param obstime: Observation time if no context, defaults to now.
+    :type obstime: AstroTime
+    :param context: Context to reuse
+    :type context: FastContext
+    :return: (ha, dec) degrees
+    :rtype: (numpy.ndarray, numpy.ndarray)
+    """
+    context = get_fast_context(obstime, context)
+    ra, dec, shape = _fast_deg_args(ra, dec)
+    aob, zob, hob, dob = _fast_observed(*erfa.atciqz(ra, dec, context.astrom), context)
+    return numpy.degrees(erfa.anp(hob)).reshape(shape), numpy.degrees(dob).reshape(shape)
+
+
+def fast_icrs_to_altaz(ra, dec, obstime=None, context=None):
+    """
+    Fast ICRS to AltAz.
+    :param ra: ICRS RA degrees, float or array
+    :param dec: ICRS Dec degrees, float or array
+    :param obstime: Observation time if no context, defaults to now.
+    :type obstime: AstroTime
+    :param context: Context to reuse
+    :type context: FastContext
+    :return: (alt, az) degrees
+    :rtype: (numpy.ndarray, numpy.ndarray)
+    """
+    context = get_fast_context(obstime, context)
+    ra, dec, shape = _fast_deg_args(ra, dec)
+    aob, zob, hob, dob = _fast_observed(*erfa.atciqz(ra, dec, context.astrom), context)
+    return (90.0 - numpy.degrees(zob)).reshape(shape), numpy.degrees(aob).reshape(shape)
+
+
+def fast_icrs_to_tete(ra, dec, obstime=None, context=None):
+    """
+    Fast ICRS to TETE.
+    :param ra: ICRS RA degrees, float or array
+    :param dec: ICRS Dec degrees, float or array
+    :param obstime: Observation time if no context, defaults to now.
+    :type obstime: AstroTime
+    :param context: Context to reuse
+    :type context: FastContext
+    :return: (ra, dec) TETE degrees
+    :rtype: (numpy.ndarray, numpy.ndarray)
+    """
+    context = get_fast_context(obstime, context)
+    ra, dec, shape = _fast_deg_args(ra, dec)
+    gcrs = erfa.s2c(*erfa.atciqz(ra, dec, context.astrom_tete))
+    tra, tdec = erfa.c2s(numpy.einsum('ij,...j->...i', context.rbpn, gcrs))
+    return numpy.degrees(erfa.anp(tra)).reshape(shape), numpy.degrees(tdec).reshape(shape)
+
+
+def fast_hadec_to_icrs(ha, dec, obstime=None, context=None):
+    """
+    Fast HADec to ICRS.
+    :param ha: HA degrees, float or array
+    :param dec: Dec degrees, float or array
+    :param obstime: Observation time if no context, defaults to now.
+    :type obstime: AstroTime
+    :param context: Context to reuse
+    :type context: FastContext
+    :return: (ra, dec) ICRS degrees
+    :rtype: (numpy.ndarray, numpy.ndarray)
+    """
+    context = get_fast_context(obstime, context)
+    ha, dec, shape = _fast_deg_args(ha, dec)
+    aob, zob = _fast_hadec_to_azzen(ha, dec, context)
+    ri, di = _fast_cirs('H', ha, dec, 90.0 - numpy.degrees(zob), context)
+    ra, dec = erfa.aticq(ri, di, context.astrom)
+    return numpy.degrees(erfa.anp(ra)).reshape(shape), numpy.degrees(dec).reshape(shape)
+
+
+def fast_altaz_to_icrs(alt, az, obstime=None, context=None):
+    """
+    Fast AltAz to ICRS.
+    :param alt: Altitude degrees, float or array
+    :param az: Azimuth degrees, float or array
+    :param obstime: Observation time if no context, defaults to now.
+    :type obstime: AstroTime
+    :param context: Context to reuse
+    :type context: FastContext
+    :return: (ra, dec) ICRS degrees
+    :rtype: (numpy.ndarray, numpy.ndarray)
+    """
+    context = get_fast_context(obstime, context)
+    az, alt, shape = _fast_deg_args(az, alt)
+    ri, di = _fast_cirs('A', az, numpy.pi / 2.0 - alt, numpy.degrees(alt), context)
+    ra, dec = erfa.aticq(ri, di, context.astrom)
+    return numpy.degrees(erfa.anp(ra)).reshape(shape), numpy.degrees(dec).reshape(shape)
+
+
+def fast_tete_to_icrs(ra, dec, obstime=None, context=None):
+    """
+    Fast TETE to ICRS.
+    :param ra: TETE RA degrees, float or array
+    :param dec: TETE Dec degrees, float or array
+    :param obstime: Observation time if no context, defaults to now.
+    :type obstime: AstroTime
+    :param context: Context to reuse
+    :type context: FastContext
+    :return: (ra, dec) ICRS degrees
+    :rtype: (numpy.ndarray, numpy.ndarray)
+    """
+    context = get_fast_context(obstime, context)
+    ra, dec, shape = _fast_deg_args(ra, dec)
+    tete = erfa.s2c(ra, dec)
+    gra, gdec = erfa.c2s(numpy.einsum('ji,...j->...i', context.rbpn, tete))
+    ra, dec = erfa.aticq(gra, gdec, context.astrom_tete)
+    return numpy.degrees(erfa.anp(ra)).reshape(shape), numpy.degrees(dec).reshape(shape)
+
+
+def fast_hadec_to_altaz(ha, dec, obstime=None, context=None):
+    """
+    Fast HADec to AltAz.
+    :param ha: HA degrees, float or array
+    :param dec: Dec degrees, float or array
+    :param obstime: Observation time if no context, defaults to now.
+    :type obstime: AstroTime
+    :param context: Context to reuse
+    :type context: FastContext
+    :return: (alt, az) degrees
+    :rtype: (numpy.ndarray, numpy.ndarray)
+    """
+    context = get_fast_context(obstime, context)
+    ha, dec, shape = _fast_deg_args(ha, dec)
+    aob, zob = _fast_hadec_to_azzen(ha, dec, context)
+    return (90.0 - numpy.degrees(zob)).reshape(shape), numpy.degrees(aob).reshape(shape)
+
+
+def fast_altaz_to_hadec(alt, az, obstime=None, context=None):
+    """
+    Fast AltAz to HADec.
+    :param alt: Altitude degrees, float or array
+    :param az: Azimuth degrees, float or array
+    :param obstime: Observation time if no context, defaults to now.
+    :type obstime: AstroTime
+    :param context: Context to reuse
+    :type context: FastContext
+    :return: (ha, dec) degrees
+    :rtype: (numpy.ndarray, numpy.ndarray)
+    """
+    context = get_fast_context(obstime, context)
+    az, alt, shape = _fast_deg_args(az, alt)
+    ri, di = erfa.atoiq('A', az, numpy.pi / 2.0 - alt, context.astrom_noatm)
+    aob, zob, hob, dob, rob = erfa.atioq(ri, di, context.astrom_noatm)
+    return numpy.degrees(erfa.anp(hob)).reshape(shape), numpy.degrees(dob).reshape(shape)
+
+
+def fast_tete_to_hadec(ra, dec, obstime=None, context=None):
+    """
+    Fast TETE to HADec.
+    :return: (ha, dec) degrees
+    :rtype: (numpy.ndarray, numpy.ndarray)
+    """
+    context = get_fast_context(obstime, context)
+    return fast_icrs_to_hadec(*fast_tete_to_icrs(ra, dec, context=context), context=context)
+
+
+def fast_tete_to_altaz(ra, dec, obstime=None, context=None):
+    """
+    Fast TETE to AltAz.
+    :return: (alt, az) degrees
+    :rtype: (numpy.ndarray, numpy.ndarray)
+    """
+    context = get_fast_context(obstime, context)
+    return fast_icrs_to_altaz(*fast_tete_to_icrs(ra, dec, context=context), context=context)
+
+
+def fast_hadec_to_tete(ha, dec, obstime=None, context=None):
+    """
+    Fast HADec to TETE.
+    :return: (ra, dec) TETE degrees
+    :rtype: (numpy.ndarray, numpy.ndarray)
+    """
+    context = get_fast_context(obstime, context)
+    return fast_icrs_to_tete(*fast_hadec_to_icrs(ha, dec, context=context), context=context)
+
+
+def fast_altaz_to_tete(alt, az, obstime=None, context=None):
+    """
+    Fast AltAz to TETE.
+    :return: (ra, dec) TETE degrees
+    :rtype: (numpy.ndarray, numpy.ndarray)
+    """
+    context = get_fast_context(obstime, context)
+    return fast_icrs_to_tete(*fast_altaz_to_icrs(alt, az, context=context), context=context)
+
+
+def fast_sidereal_time(obstime=None, context=None):
+    """
+    Fast get_sidereal_time.
+    :return: meridian ra degrees
+    :rtype: float
+    """
+    context = get_fast_context(obstime, context)
+    return float(fast_altaz_to_tete(90.0, 0.0, context=context)[0])
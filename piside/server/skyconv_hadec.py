@@ -1,6 +1,10 @@
 """
 A HA-DEC frame to work in astropy 4.2
 """
+import collections
+import math
+import threading
+
 import astropy.units as u
 import erfa
 from astropy.coordinates import representation as r
@@ -10,12 +14,23 @@ from astropy.coordinates.attributes import (TimeAttribute,
 from astropy.coordinates.baseframe import BaseCoordinateFrame, RepresentationMapping
 from astropy.coordinates.builtin_frames.utils import atciqz, aticq
 from astropy.coordinates.builtin_frames.utils import (
-    get_jd12, get_cip, prepare_earth_position_vel, get_polar_motion
+    get_jd12, get_cip, prepare_earth_position_vel, get_polar_motion, pav2pv
+)
+from astropy.coordinates.builtin_frames.intermediate_rotation_transforms import (
+    get_location_gcrs, tete_to_itrs_mat
 )
 from astropy.coordinates.representation import (SphericalRepresentation,
                                                 CartesianRepresentation,
                                                 UnitSphericalRepresentation)
 
+# Astrom contexts are cached per location, refraction arguments and time bucket. Only the earth rotation angle is
+# refreshed for each call, everything else changes negligibly within a bucket.
+APCO_CACHE_BUCKET_SECONDS = 1.0
+APCO_CACHE_MAX_ENTRIES = 16
+_apco_cache = collections.OrderedDict()
+_apco_cache_lock = threading.Lock()
+apco_cache_stats = {'hits': 0, 'misses': 0}
+
 
 class HADec(BaseCoordinateFrame):
     frame_specific_representation_info = {
@@ -161,8 +176,117 @@ def apco(frame_or_coord):
     """
     # Also from master https://github.com/astropy/astropy/blob/master/astropy/coordinates/erfa_astrom.py
     # 4.3dev last commit 82a3ef4
-    lon, lat, height = frame_or_coord.location.to_geodetic('WGS84')
-    obstime = frame_or_coord.obstime
+    if hasattr(frame_or_coord, 'pressure'):
+        # this is an AltAz like frame. Calculate refraction
+        return apco_args(frame_or_coord.obstime, frame_or_coord.location, frame_or_coord.pressure,
+                         frame_or_coord.temperature, frame_or_coord.relative_humidity, frame_or_coord.obswl)
+    # This is not an AltAz frame, so don't bother computing refraction
+    return apco_args(frame_or_coord.obstime, frame_or_coord.location)
+
+
+def set_apco_cache(bucket_seconds=None, max_entries=None):
+    """
+    Configure the astrom context cache. Clears the cache.
+    :param bucket_seconds: Width of the time buckets in seconds, 0 disables caching.
+    :type bucket_seconds: float
+    :param max_entries: How many contexts to keep before evicting least recently used.
+    :type max_entries: int
+    """
+    global APCO_CACHE_BUCKET_SECONDS, APCO_CACHE_MAX_ENTRIES
+    if bucket_seconds is not None:
+        APCO_CACHE_BUCKET_SECONDS = bucket_seconds
+    if max_entries is not None:
+        APCO_CACHE_MAX_ENTRIES = max_entries
+    clear_apco_cache()
+
+
+def clear_apco_cache():
+    """
+    Removes all cached astrom contexts, for example when location or time has been changed.
+    """
+    with _apco_cache_lock:
+        _apco_cache.clear()
+
+
+def _apco_cache_key(kind, obstime, location, *args):
+    """
+    :return: Cache key or None if should not be cached.
+    :rtype: Union[tuple, None]
+    """
+    if APCO_CACHE_BUCKET_SECONDS <= 0 or not obstime.isscalar or not location.isscalar:
+        return None
+    bucket = math.floor((obstime.jd1 + obstime.jd2) * 86400.0 / APCO_CACHE_BUCKET_SECONDS)
+    xyz = tuple(location.get_itrs().cartesian.xyz.to_value(u.m))
+    return (kind, obstime.scale, bucket, xyz) + tuple(None if a is None else u.Quantity(a).value for a in args)
+
+
+def _apco_cache_get(key, make):
+    """
+    Get cached value for key, calling make() and storing the result on a miss.
+    """
+    if key is None:
+        return make()
+    with _apco_cache_lock:
+        if key in _apco_cache:
+            _apco_cache.move_to_end(key)
+            apco_cache_stats['hits'] += 1
+            return _apco_cache[key]
+    value = make()
+    with _apco_cache_lock:
+        apco_cache_stats['misses'] += 1
+        _apco_cache[key] = value
+        while len(_apco_cache) > APCO_CACHE_MAX_ENTRIES:
+            _apco_cache.popitem(last=False)
+    return value
+
+
+def apco_args(obstime, location, pressure=None, temperature=None, relative_humidity=None, obswl=None):
+    """
+    Same as apco but takes the frame attributes directly so callers don't need to build a frame. Uses the
+    astrom context cache.
+    :param obstime: Observation time
+    :type obstime: astropy.time.Time
+    :param location: Observer location
+    :type location: astropy.coordinates.EarthLocation
+    :param pressure: Pressure for refraction constants, if None no refraction.
+    :type pressure: u.Quantity
+    :param temperature: Temperature for refraction constants
+    :type temperature: u.Quantity
+    :param relative_humidity: Relative humidity for refraction constants
+    :type relative_humidity: float
+    :param obswl: Observation wavelength for refraction constants
+    :type obswl: u.Quantity
+    :return: ERFA astrom context
+    :rtype: numpy.ndarray
+    """
+    key = _apco_cache_key('apco', obstime, location, pressure, temperature, relative_humidity, obswl)
+    if key is None:
+        return _apco_args(obstime, location, pressure, temperature, relative_humidity, obswl)
+    astrom = _apco_cache_get(key, lambda: _apco_args(obstime, location, pressure, temperature,
+                                                     relative_humidity, obswl))
+    # Earth rotation angle moves 15"/s so refresh it for the actual obstime, returns a copy.
+    return erfa.aper13(*get_jd12(obstime, 'ut1'), astrom)
+
+
+def _apco_args(obstime, location, pressure=None, temperature=None, relative_humidity=None, obswl=None):
+    """
+    Uncached apco_args.
+    :param obstime: Observation time
+    :type obstime: astropy.time.Time
+    :param location: Observer location
+    :type location: astropy.coordinates.EarthLocation
+    :param pressure: Pressure for refraction constants, if None no refraction.
+    :type pressure: u.Quantity
+    :param temperature: Temperature for refraction constants
+    :type temperature: u.Quantity
+    :param relative_humidity: Relative humidity for refraction constants
+    :type relative_humidity: float
+    :param obswl: Observation wavelength for refraction constants
+    :type obswl: u.Quantity
+    :return: ERFA astrom context
+    :rtype: numpy.ndarray
+    """
+    lon, lat, height = location.to_geodetic('WGS84')
 
     jd1_tt, jd2_tt = get_jd12(obstime, 'tt')
     xp, yp = get_polar_motion(obstime)
@@ -172,16 +296,14 @@ def apco(frame_or_coord):
     earth_pv, earth_heliocentric = prepare_earth_position_vel(obstime)
 
     # refraction constants
-    if hasattr(frame_or_coord, 'pressure'):
-        # this is an AltAz like frame. Calculate refraction
+    if pressure is not None:
         refa, refb = erfa.refco(
-            frame_or_coord.pressure.to_value(u.hPa),
-            frame_or_coord.temperature.to_value(u.deg_C),
-            frame_or_coord.relative_humidity.value,
-            frame_or_coord.obswl.to_value(u.micron)
+            pressure.to_value(u.hPa),
+            temperature.to_value(u.deg_C),
+            u.Quantity(relative_humidity).value,
+            obswl.to_value(u.micron)
         )
     else:
-        # This is not an AltAz frame, so don't bother computing refraction
         refa, refb = 0.0, 0.0
 
     return erfa.apco(
@@ -191,3 +313,31 @@ def apco(frame_or_coord):
         height.to_value(u.m),
         xp, yp, sp, refa, refb
     )
+
+
+def apcs_tete(obstime, location):
+    """
+    Astrometry context for ICRS <-> topocentric GCRS, and the bias-precession-nutation matrix that takes GCRS to
+    TETE. Together they do the same as astropy's ICRS <-> TETE transform without walking the transform graph.
+    :param obstime: Observation time
+    :type obstime: astropy.time.Time
+    :param location: Observer location
+    :type location: astropy.coordinates.EarthLocation
+    :return: (ERFA astrom context, rbpn 3x3 matrix)
+    :rtype: (numpy.ndarray, numpy.ndarray)
+    """
+    return _apco_cache_get(_apco_cache_key('apcs_tete', obstime, location), lambda: _apcs_tete(obstime, location))
+
+
+def _apcs_tete(obstime, location):
+    """
+    Uncached apcs_tete.
+    """
+    jd1_tt, jd2_tt = get_jd12(obstime, 'tt')
+    # Classical NPB matrix, IAU 2006/2000A, same as astropy gcrs_to_tete
+    rbpn = erfa.pnm06a(jd1_tt, jd2_tt)
+    loc_gcrs = get_location_gcrs(location, obstime, tete_to_itrs_mat(obstime, rbpn=rbpn), rbpn)
+    obs_pv = pav2pv(loc_gcrs.obsgeoloc.get_xyz(xyz_axis=-1).to_value(u.m),
+                    loc_gcrs.obsgeovel.get_xyz(xyz_axis=-1).to_value(u.m / u.s))
+    earth_pv, earth_heliocentric = prepare_earth_position_vel(obstime)
+    return erfa.apcs(jd1_tt, jd2_tt, obs_pv, earth_pv, earth_heliocentric), rbpn
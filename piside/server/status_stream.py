@@ -0,0 +1,119 @@
+"""
+Pushes status changes to streaming (Server-Sent Events) clients instead of them polling /api/status.
+"""
+import json
+import threading
+import time
+
+MIN_INTERVAL = 0.25
+MAX_INTERVAL = 60.0
+KEEPALIVE_SECONDS = 15.0
+
+
+class StatusStream:
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._version = 0
+        self._status = {}
+        # (from_version, to_version) -> event data, shared by clients at the same version
+        self._delta_cache = {}
+
+    def publish(self, status):
+        """
+        Publish new status, wakes up clients if anything changed.
+        :param status: Status dictionary like control.last_status
+        :type status: dict
+        """
+        if status is None:
+            return
+        with self._cond:
+            if status == self._status:
+                return
+            self._status = dict(status)
+            self._version += 1
+            self._delta_cache.clear()
+            self._cond.notify_all()
+
+    def snapshot(self):
+        """
+        :return: (version, status)
+        :rtype: (int, dict)
+        """
+        with self._cond:
+            return self._version, self._status
+
+    def wait(self, version, timeout):
+        """
+        Waits until there is a status newer than version.
+        :param version: Version client has.
+        :type version: int
+        :param timeout: Seconds to wait at most.
+        :type timeout: float
+        :return: The current version.
+        :rtype: int
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._version != version, timeout)
+            return self._version
+
+    def delta(self, from_version, from_status):
+        """
+        Changes between from_status and current status.
+        :param from_version: Version of from_status
+        :type from_version: int
+        :param from_status: Status client already has.
+        :type from_status: dict
+        :return: (event data json str or None if nothing changed, current version, current status)
+        :rtype: (Union[str, None], int, dict)
+        """
+        with self._cond:
+            version = self._version
+            status = self._status
+            key = (from_version, version)
+            if key in self._delta_cache:
+                return self._delta_cache[key], version, status
+        changed = {}
+        for k, v in status.items():
+            if k not in from_status or from_status[k] != v:
+                changed[k] = v
+        removed = [k for k in from_status if k not in status]
+        data = None
+        if changed or removed:
+            data = json.dumps({'full': False, 'status': changed, 'removed': removed})
+        with self._cond:
+            if self._version == version:
+                self._delta_cache[key] = data
+        return data, version, status
+
+    def events(self, interval=1.0, on_tick=None):
+        """
+        Generator of Server-Sent Events. The first event has the full status, after only changes are sent, at most
+        once per interval.
+        :param interval: Minimum seconds between events for this client.
+        :type interval: float
+        :param on_tick: Called about every second while client is connected.
+        :type on_tick: Callable
+        :return: SSE formatted strings
+        :rtype: Generator[str]
+        """
+        interval = min(MAX_INTERVAL, max(MIN_INTERVAL, interval))
+        version, status = self.snapshot()
+        yield 'retry: 2000\nevent: status\ndata: %s\n\n' % json.dumps({'full': True, 'status': status, 'removed': []})
+        last_sent = time.time()
+        while True:
+            if on_tick:
+                on_tick()
+            # Rate limit, changes meanwhile are merged into one delta.
+            wait_left = last_sent + interval - time.time()
+            if wait_left > 0:
+                time.sleep(min(wait_left, 1.0))
+                continue
+            if self.wait(version, 1.0) == version:
+                if time.time() - last_sent > KEEPALIVE_SECONDS:
+                    last_sent = time.time()
+                    yield ': keepalive\n\n'
+                continue
+            data, version, status = self.delta(version, status)
+            if data is not None:
+                last_sent = time.time()
+                yield 'event: status\ndata: %s\n\n' % data
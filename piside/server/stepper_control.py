@@ -1,14 +1,252 @@
+import collections
 import traceback
 
 import serial
+import struct
 import threading
 import time
 
+import metrics
+import serial_reader
+
+COMMAND_TIMEOUT = 2.0
+COMMAND_KICK_AFTER = 0.1
+# set_var commands update_settings sends ahead of their prompts, all settings fit in the Teensy USB serial buffer.
+SETTINGS_PIPELINE_WINDOW = 32
+# qsb reads tried before giving up, a response without a frame resyncs the link first.
+STATUS_READ_TRIES = 3
+# Start of what the microcontroller answers unknown commands with, older firmware doesn't have qsb.
+HELP_TEXT = 'Commands:'
+
+# Binary status frame from qsb, see firmware command.h
+STATUS_FRAME_MAGIC = b'\xa5\x5a'
+STATUS_FRAME_BODY = struct.Struct('<H2f8i')
+STATUS_FRAME_KEYS = ['rs', 'ds', 'rp', 'dp', 're', 'de', 'ri', 'di', 'rl', 'dl']
+STATUS_FRAME_SIZE = len(STATUS_FRAME_MAGIC) + 1 + STATUS_FRAME_BODY.size + 2
+
+
+def fletcher16(data):
+    """
+    :param data: bytes to checksum
+    :type data: bytes
+    :return: Fletcher-16 checksum
+    :rtype: int
+    """
+    sum1 = 0
+    sum2 = 0
+    for b in data:
+        sum1 = (sum1 + b) % 255
+        sum2 = (sum2 + sum1) % 255
+    return (sum2 << 8) | sum1
+
+
+def encode_status_frame(seq, status):
+    """
+    Makes a binary status frame, what the microcontroller sends.
+    :param seq: Sequence number
+    :type seq: int
+    :param status: dict with STATUS_FRAME_KEYS
+    :type status: dict
+    :return: The frame
+    :rtype: bytes
+    """
+    body = STATUS_FRAME_BODY.pack(seq & 0xFFFF, status['rs'], status['ds'],
+                                  *[int(status[key]) for key in STATUS_FRAME_KEYS[2:]])
+    length_body = bytes([STATUS_FRAME_BODY.size]) + body
+    return STATUS_FRAME_MAGIC + length_body + struct.pack('<H', fletcher16(length_body))
+
+
+def decode_status_frame(frame):
+    """
+    Decodes one binary status frame.
+    :param frame: STATUS_FRAME_SIZE bytes starting with STATUS_FRAME_MAGIC
+    :type frame: bytes
+    :return: (sequence number, status dict same as text qs) or None if frame is invalid.
+    :rtype: Union[None, Tuple[int, Dict[str, float]]]
+    """
+    if len(frame) != STATUS_FRAME_SIZE or frame[0:2] != STATUS_FRAME_MAGIC or frame[2] != STATUS_FRAME_BODY.size:
+        return None
+    if fletcher16(frame[2:-2]) != struct.unpack('<H', frame[-2:])[0]:
+        return None
+    values = STATUS_FRAME_BODY.unpack(frame[3:-2])
+    status = {}
+    for key, value in zip(STATUS_FRAME_KEYS, values[1:]):
+        status[key] = float(value)
+    return values[0], status
+
+
+class ResponseParser:
+    """
+    Splits microcontroller output into ('frame', (seq, status)), ('bad_frame', bytes) and ('prompt', text) items.
+    A prompt item ends each command response, its text is what came before the prompt. Frames come from qsb responses
+    or are pushed between them after qs_stream.
+    """
+    def __init__(self):
+        self.buffer = b''
+        self.text = ''
+
+    def reset(self):
+        """
+        Drops partial input, called by SerialReader on resync.
+        """
+        self.buffer = b''
+        self.text = ''
+
+    def feed(self, data):
+        """
+        :param data: Bytes read from serial
+        :type data: bytes
+        :return: Parsed items
+        :rtype: List[Tuple[str, object]]
+        """
+        self.buffer += data
+        items = []
+        while self.buffer:
+            m = self.buffer.find(STATUS_FRAME_MAGIC)
+            p = self.buffer.find(b'$ ')
+            if m >= 0 and (p < 0 or m < p):
+                if len(self.buffer) - m < STATUS_FRAME_SIZE:
+                    break
+                self.text += self.buffer[:m].decode(errors='replace')
+                frame = self.buffer[m:m + STATUS_FRAME_SIZE]
+                decoded = decode_status_frame(frame)
+                if decoded is None:
+                    items.append(('bad_frame', frame))
+                    self.buffer = self.buffer[m + 1:]
+                else:
+                    items.append(('frame', decoded))
+                    self.buffer = self.buffer[m + STATUS_FRAME_SIZE:]
+            elif p >= 0:
+                items.append(('prompt', self.text + self.buffer[:p].decode(errors='replace')))
+                self.text = ''
+                self.buffer = self.buffer[p + 2:]
+            else:
+                # Keep what could be the start of a prompt or frame
+                keep = 1 if self.buffer[-1:] in (b'$', STATUS_FRAME_MAGIC[0:1]) else 0
+                self.text += self.buffer[:len(self.buffer) - keep].decode(errors='replace')
+                self.buffer = self.buffer[len(self.buffer) - keep:]
+                break
+        return items
+
+
+def is_prompt(item):
+    """
+    :param item: Item from ResponseParser
+    :return: True if item ends a response.
+    :rtype: bool
+    """
+    return item[0] == 'prompt'
+
+
+class StatusCache:
+    """
+    Shares status reads between threads. Results younger than max_age are reused and callers that come in while a
+    read is in progress wait for it instead of starting their own.
+    """
+    def __init__(self, fetch, max_age=0.05):
+        """
+        :param fetch: Function that reads status
+        :type fetch: Callable[[], dict]
+        :param max_age: Default seconds a status can be reused.
+        :type max_age: float
+        """
+        self.fetch = fetch
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.pushed = 0
+        self.__cond = threading.Condition()
+        self.__value = None
+        self.__time = 0
+        self.__generation = 0
+        self.__invalidations = 0
+        self.__fetching = False
+
+    def get(self, max_age=None):
+        """
+        :param max_age: Max seconds old the status can be, None uses self.max_age, 0 always reads.
+        :type max_age: float
+        :return: Copy of status
+        :rtype: dict
+        """
+        if max_age is None:
+            max_age = self.max_age
+        now = time.monotonic()
+        with self.__cond:
+            # A read that started after now - max_age is fresh enough
+            if self.__value is not None and self.__time >= now - max_age:
+                self.hits += 1
+                return dict(self.__value)
+            if self.__fetching:
+                # Share the read in progress
+                generation = self.__generation
+                self.__cond.wait_for(lambda: not self.__fetching or self.__generation != generation)
+                if self.__generation != generation and self.__value is not None:
+                    self.coalesced += 1
+                    return dict(self.__value)
+                # Read failed or was invalidated, read ourselves.
+                self.__cond.wait_for(lambda: not self.__fetching)
+            self.__fetching = True
+            self.misses += 1
+            invalidations = self.__invalidations
+        start = time.monotonic()
+        try:
+            value = self.fetch()
+        except BaseException:
+            with self.__cond:
+                self.__fetching = False
+                self.__cond.notify_all()
+            raise
+        with self.__cond:
+            # Don't keep a read that started before a write or a pushed status
+            if invalidations == self.__invalidations and start >= self.__time:
+                self.__value = value
+                self.__time = start
+            self.__generation += 1
+            self.__fetching = False
+            self.__cond.notify_all()
+        return dict(value)
+
+    def put(self, value):
+        """
+        Stores a status the microcontroller pushed, gets within max_age use it instead of reading.
+        :param value: Status dict
+        :type value: dict
+        """
+        with self.__cond:
+            self.__value = value
+            self.__time = time.monotonic()
+            self.pushed += 1
+
+    def invalidate(self):
+        """
+        Next get will read status.
+        """
+        with self.__cond:
+            self.__value = None
+            self.__invalidations += 1
+
+    def stats(self):
+        """
+        :return: {'hits': int, 'misses': int, 'coalesced': int, 'pushed': int}
+        :rtype: dict
+        """
+        with self.__cond:
+            return {'hits': self.hits, 'misses': self.misses, 'coalesced': self.coalesced, 'pushed': self.pushed}
+
 
 class StepperControl:
-    def __init__(self, port, baud):
+    def __init__(self, port, baud, status_max_age=0.05):
         self.serial = serial.Serial(port, baud, timeout=2)
-        self.serial_lock = threading.RLock()
+        # None until we know if microcontroller supports qsb
+        self.binary_status = None
+        self.last_status_seq = None
+        # Milliseconds between status frames the microcontroller pushes, 0 if not streaming.
+        self.status_stream_ms = 0
+        self.status_cache = StatusCache(self.__read_status, status_max_age)
+        self.reader = serial_reader.SerialReader(self.serial, ResponseParser(), is_prompt, name='stepper_serial',
+                                                 on_unsolicited=self.__push_status)
         self.__setting_keys = ['ra_max_tps', 'ra_guide_rate', 'ra_direction', 'dec_max_tps', 'dec_guide_rate',
                                'dec_direction', 'dec_disable', 'ra_disable', 'ra_accel_tpss',
                                'dec_accel_tpss', 'ra_run_current', 'dec_run_current', 'ra_med_current',
@@ -16,28 +254,96 @@ class StepperControl:
                                'ra_hold_current', 'dec_hold_current', 'ra_backlash', 'dec_backlash',
                                'ra_backlash_speed', 'dec_backlash_speed']
 
-    def __read_serial_until_prompt(self):
-        s = ""
-        t = time.time()
-        with self.serial_lock:
-            while True:
-                if self.serial.in_waiting > 0:
-                    s += self.serial.read(self.serial.in_waiting).decode()
-                    if '$' in s:
-                        break
-                elif time.time() - t > 0.02:
-                    self.serial.write(b'\r')
-                elif time.time() - t > 0.25:
-                    break
-                else:
-                    time.sleep(0.01)
-        return s
-
-    def get_status(self):
-        with self.serial_lock:
-            self.serial.reset_input_buffer()
-            self.serial.write(b'qs\r')
-            s = self.__read_serial_until_prompt()
+    def __command(self, cmd):
+        """
+        Sends a command and waits for the prompt.
+        :param cmd: Command line without line ending
+        :type cmd: str
+        :return: Response items from ResponseParser
+        :rtype: List[Tuple[str, object]]
+        """
+        with metrics.timer('stepper_command_seconds', command=cmd.split(' ', 1)[0]):
+            return self.__wait(self.reader.send((cmd + '\r').encode()))
+
+    def __wait(self, future):
+        """
+        :param future: From self.reader.send
+        :return: Response items from ResponseParser
+        :rtype: List[Tuple[str, object]]
+        """
+        # A lone return completes a command the microcontroller didn't get all of, it doesn't answer empty lines.
+        items = self.reader.wait(future, timeout=COMMAND_TIMEOUT, kick=b'\r', kick_after=COMMAND_KICK_AFTER)
+        if self.status_stream_ms:
+            # Streamed frames can land in any response, commands that move invalidate the cache after this.
+            for item in items:
+                if item[0] == 'frame':
+                    self.__push_status(item)
+        return items
+
+    def __push_status(self, item):
+        """
+        :param item: Item from ResponseParser that came in outside a command response, or a frame in one.
+        """
+        if item[0] == 'frame':
+            self.last_status_seq = item[1][0]
+            self.status_cache.put(item[1][1])
+        elif item[0] == 'bad_frame':
+            print('StepperControl - error: bad pushed status frame', item[1])
+
+    def start_status_stream(self, interval_ms):
+        """
+        Has the microcontroller push a status frame every interval_ms, get_status uses them instead of reading while
+        they are younger than max_age. Use an interval shorter than status_max_age.
+        :param interval_ms: Milliseconds between frames, 0 stops.
+        :type interval_ms: int
+        :return: False if the microcontroller doesn't have binary status.
+        :rtype: bool
+        """
+        if self.binary_status is None:
+            self.get_status(0)
+        if not self.binary_status:
+            return False
+        self.__command('qs_stream %d' % interval_ms)
+        self.status_stream_ms = interval_ms
+        return True
+
+    def __get_status_binary(self):
+        """
+        :return: status dict or None if microcontroller doesn't support binary status.
+        :rtype: Union[None, Dict[str, float]]
+        :raises IOError: If no frame was read after STATUS_READ_TRIES.
+        """
+        for i in range(STATUS_READ_TRIES):
+            items = self.__command('qsb')
+            frames = [item[1] for item in items if item[0] == 'frame']
+            if frames:
+                self.binary_status = True
+                self.last_status_seq = frames[-1][0]
+                return frames[-1][1]
+            if any(item[0] == 'prompt' and HELP_TEXT in item[1] for item in items):
+                self.binary_status = False
+                return None
+            # Bad frame or a prompt that belongs to another command, the qsb response would go to the next one.
+            print('StepperControl.get_status() - error: no status frame, resyncing', items)
+            self.reader.resync()
+        raise IOError('No status frame from qsb after %d tries' % STATUS_READ_TRIES)
+
+    def get_status(self, max_age=None):
+        """
+        :param max_age: Max seconds old the status can be, None uses status_max_age, 0 always reads.
+        :type max_age: float
+        :return: Status dict with keys rs, ds, rp, dp, re, de, ri, di
+        :rtype: Dict[str, float]
+        """
+        with metrics.timer('stepper_get_status_seconds'):
+            return self.status_cache.get(max_age)
+
+    def __read_status(self):
+        if self.binary_status is not False:
+            status = self.__get_status_binary()
+            if status is not None:
+                return status
+        s = self.__command('qs')[-1][1]
         # TODO: Might need to make a shorter status if transfer time longer than tracking tick interval
         # print(len(s))
         s = s.split()
@@ -60,38 +366,47 @@ class StepperControl:
     def update_setting(self, key, value):
         if key not in self.__setting_keys:
             raise KeyError('Invalid setting key')
-        with self.serial_lock:
-            self.serial.write(('set_var %s %f\r' % (key, value)).encode())
+        # Doesn't wait for the prompt
+        self.reader.send(('set_var %s %f\r' % (key, value)).encode())
+        self.status_cache.invalidate()
 
-    def update_settings(self, settings):
+    def update_settings(self, settings, window=SETTINGS_PIPELINE_WINDOW):
+        """
+        Sets microcontroller variables, up to window set_var commands are sent before waiting for their prompts.
+        :param settings: key: value
+        :type settings: Dict[str, float]
+        :param window: Max commands waiting for a prompt, 1 sends them one at a time.
+        :type window: int
+        """
         for setting in settings:
             if setting not in self.__setting_keys:
                 raise KeyError('Invalid setting key: ' + setting)
-        with self.serial_lock:
+        in_flight = collections.deque()
+        try:
             for setting in settings:
-                self.serial.write(('set_var %s %f\r' % (setting, settings[setting])).encode())
-                self.__read_serial_until_prompt()
+                if len(in_flight) >= window:
+                    self.__wait(in_flight.popleft())
+                in_flight.append(self.reader.send(('set_var %s %f\r' % (setting, settings[setting])).encode()))
+            while in_flight:
+                self.__wait(in_flight.popleft())
+        except BaseException:
+            # Prompts of the rest would go to later commands. A timeout already failed them and resynced.
+            if any(not future.done() for future in in_flight):
+                self.reader.resync()
+            raise
+        finally:
+            self.status_cache.invalidate()
 
     def autoguide_disable(self):
-        with self.serial_lock:
-            self.serial.reset_input_buffer()
-            self.serial.write('autoguide_disable\r'.encode())
-            self.__read_serial_until_prompt()
+        self.__command('autoguide_disable')
 
     def autoguide_enable(self):
-        with self.serial_lock:
-            self.serial.reset_input_buffer()
-            self.serial.write('autoguide_enable\r'.encode())
-            self.__read_serial_until_prompt()
+        self.__command('autoguide_enable')
 
     def set_speed_ra(self, speed):
-        with self.serial_lock:
-            self.serial.reset_input_buffer()
-            self.serial.write(('ra_set_speed %f\r' % speed).encode())
-            self.__read_serial_until_prompt()
+        self.__command('ra_set_speed %f' % speed)
+        self.status_cache.invalidate()
 
     def set_speed_dec(self, speed):
-        with self.serial_lock:
-            self.serial.reset_input_buffer()
-            self.serial.write(('dec_set_speed %f\r' % speed).encode())
-            self.__read_serial_until_prompt()
+        self.__command('dec_set_speed %f' % speed)
+        self.status_cache.invalidate()
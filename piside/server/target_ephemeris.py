@@ -0,0 +1,124 @@
+"""
+Predicts where a slew target is in steps over time. A few conversions at the start are fitted with a polynomial per
+axis, after that steps at a time are a polynomial evaluation instead of a coordinate conversion. Handles targets fixed
+on the sky, which move in HA at the sidereal rate, and solar system bodies, which also move against the stars.
+"""
+import time
+
+import astropy.units as u
+import numpy
+from astropy.time import Time as AstroTime
+
+import settings
+import skyconv
+
+# Seconds from start predictions are fitted over, longer than any slew.
+DEFAULT_SPAN_SECONDS = 180.0
+DEFAULT_SAMPLES = 5
+DEFAULT_DEGREE = 2
+
+
+def _horner(coeffs, t):
+    ret = 0.0
+    for c in coeffs:
+        ret = ret * t + c
+    return ret
+
+
+class TargetEphemeris:
+    def __init__(self, ha_coeffs, dec_coeffs, start, span, max_residual=0.0):
+        """
+        Use from_coord or fixed to make one.
+        :param ha_coeffs: HA steps polynomial coefficients in seconds from start, highest power first.
+        :type ha_coeffs: List[float]
+        :param dec_coeffs: Dec steps polynomial coefficients, highest power first.
+        :type dec_coeffs: List[float]
+        :param start: time.monotonic() of polynomial time 0
+        :type start: float
+        :param span: Seconds from start the fit is good for.
+        :type span: float
+        :param max_residual: Largest fit error at the samples in steps.
+        :type max_residual: float
+        """
+        self.ha_coeffs = [float(c) for c in ha_coeffs]
+        self.dec_coeffs = [float(c) for c in dec_coeffs]
+        self.ha_rate_coeffs = _derivative(self.ha_coeffs)
+        self.dec_rate_coeffs = _derivative(self.dec_coeffs)
+        self.start = start
+        self.span = span
+        self.max_residual = max_residual
+
+    @classmethod
+    def fixed(cls, steps):
+        """
+        :param steps: {'ha': steps, 'dec': steps} target that doesn't move.
+        :type steps: Dict[str, float]
+        :rtype: TargetEphemeris
+        """
+        return cls([steps['ha']], [steps['dec']], time.monotonic(), float('inf'))
+
+    @classmethod
+    def from_coord(cls, coord_at, span=DEFAULT_SPAN_SECONDS, samples=DEFAULT_SAMPLES, degree=DEFAULT_DEGREE,
+                   obstime=None):
+        """
+        Fits target steps over the next span seconds.
+        :param coord_at: Coordinate fixed on the sky, or function taking AstroTime giving the target coordinate then.
+        :type coord_at: Union[ICRS, TETE, Callable[[AstroTime], Union[ICRS, TETE]]]
+        :param span: Seconds to fit over.
+        :type span: float
+        :param samples: Number of conversions to fit, more than degree.
+        :type samples: int
+        :param degree: Polynomial degree
+        :type degree: int
+        :param obstime: Time of start, defaults to now.
+        :type obstime: AstroTime
+        :rtype: TargetEphemeris
+        """
+        if not callable(coord_at):
+            coord = coord_at
+            coord_at = lambda obstime: coord
+        start = time.monotonic()
+        if obstime is None:
+            obstime = AstroTime.now()
+        offsets = numpy.linspace(0.0, span, samples)
+        ha = numpy.zeros(samples)
+        dec = numpy.zeros(samples)
+        for i, offset in enumerate(offsets):
+            sample_time = obstime + offset * u.s
+            steps = skyconv.fast_to_steps(coord_at(sample_time), obstime=sample_time)
+            ha[i] = steps['ha']
+            dec[i] = steps['dec']
+        # Steps wrap around every full turn of HA
+        ha = numpy.unwrap(ha, period=360.0 * settings.settings['ra_ticks_per_degree'])
+        ha_coeffs = numpy.polyfit(offsets, ha, degree)
+        dec_coeffs = numpy.polyfit(offsets, dec, degree)
+        max_residual = max(numpy.max(numpy.abs(numpy.polyval(ha_coeffs, offsets) - ha)),
+                           numpy.max(numpy.abs(numpy.polyval(dec_coeffs, offsets) - dec)))
+        return cls(ha_coeffs, dec_coeffs, start, span, float(max_residual))
+
+    def steps(self, now=None):
+        """
+        :param now: time.monotonic() to get target position at, None for now.
+        :type now: float
+        :return: {'ha': steps, 'dec': steps}
+        :rtype: Dict[str, float]
+        """
+        t = (time.monotonic() if now is None else now) - self.start
+        return {'ha': _horner(self.ha_coeffs, t), 'dec': _horner(self.dec_coeffs, t)}
+
+    def velocity(self, now=None):
+        """
+        :param now: time.monotonic() to get target speed at, None for now.
+        :type now: float
+        :return: {'ha': steps/s, 'dec': steps/s}
+        :rtype: Dict[str, float]
+        """
+        t = (time.monotonic() if now is None else now) - self.start
+        return {'ha': _horner(self.ha_rate_coeffs, t), 'dec': _horner(self.dec_rate_coeffs, t)}
+
+
+def _derivative(coeffs):
+    degree = len(coeffs) - 1
+    if degree == 0:
+        return [0.0]
+    return [c * (degree - i) for i, c in enumerate(coeffs[:-1])]
@@ -0,0 +1,270 @@
+import math
+import threading
+import time
+import unittest
+
+import astropy.units as u
+import pendulum
+from astropy.coordinates import AltAz, EarthLocation
+from astropy.time import Time as AstroTime
+
+import control
+import horizon_limit
+import pointing_model
+import scheduler
+import settings
+import skyconv
+import target_ephemeris
+
+# Speeds are corrected with position error times SLEW_POSITION_GAIN, within close enough of the target.
+SPEED_DELTA = 50.0
+
+
+class TestAdaptiveInterval(unittest.TestCase):
+    def test_period_and_wake(self):
+        calls = []
+        period = [10.0]
+        called = threading.Event()
+
+        def func():
+            calls.append(time.monotonic())
+            called.set()
+
+        interval = control.AdaptiveInterval(func, lambda: period[0])
+        try:
+            self.assertTrue(called.wait(1))
+            called.clear()
+            # Long period, nothing more until woken with a shorter one
+            self.assertFalse(called.wait(0.2))
+            period[0] = 0.05
+            interval.wake()
+            self.assertTrue(called.wait(1))
+            time.sleep(0.3)
+            self.assertGreater(len(calls), 4)
+        finally:
+            interval.cancel()
+
+
+class TestStatusPeriod(unittest.TestCase):
+    def setUp(self):
+        self.is_alive = dict(control.is_alive)
+        self.tracking = settings.runtime_settings.get("tracking")
+        self.intervals = settings.settings["status_interval"]
+
+    def tearDown(self):
+        control.is_alive.clear()
+        control.is_alive.update(self.is_alive)
+        control.slewing = False
+        settings.runtime_settings["tracking"] = self.tracking
+
+    def test_status_period(self):
+        control.is_alive.clear()
+        settings.runtime_settings["tracking"] = True
+        self.assertEqual(control.status_period(), self.intervals["no_clients"])
+        control.is_alive["client"] = True
+        self.assertEqual(control.status_period(), self.intervals["tracking"])
+        control.slewing = True
+        self.assertEqual(control.status_period(), self.intervals["active"])
+
+
+class FakeStepper:
+    """
+    Axes accelerate to the commanded speeds at the microcontroller acceleration, positions integrate the speeds.
+    """
+
+    def __init__(self, stalled=()):
+        """
+        :param stalled: Axes, 'ra' or 'dec', that never move.
+        :type stalled: Iterable[str]
+        """
+        self.lock = threading.Lock()
+        self.stalled = set(stalled)
+        self.axes = {}
+        for axis in ['ra', 'dec']:
+            self.axes[axis] = {'position': 0.0, 'speed': 0.0, 'command': 0.0,
+                               'accel': settings.settings['micro'][axis + '_accel_tpss']}
+        self.last = time.monotonic()
+        self.commands = []
+
+    def __update(self):
+        now = time.monotonic()
+        dt = now - self.last
+        self.last = now
+        for axis, a in self.axes.items():
+            if axis in self.stalled:
+                continue
+            change = a['command'] - a['speed']
+            t_ramp = min(dt, abs(change) / a['accel'])
+            v_0 = a['speed']
+            a['speed'] += math.copysign(a['accel'] * t_ramp, change)
+            a['position'] += (v_0 + a['speed']) / 2.0 * t_ramp + a['speed'] * (dt - t_ramp)
+
+    def get_status(self, max_age=None):
+        with self.lock:
+            self.__update()
+            return {'rp': self.axes['ra']['position'], 'dp': self.axes['dec']['position'],
+                    'rs': self.axes['ra']['speed'], 'ds': self.axes['dec']['speed'],
+                    'ri': 0, 're': 0, 'di': 0, 'de': 0}
+
+    def position(self):
+        status = self.get_status()
+        return {'ha': status['rp'], 'dec': status['dp']}
+
+    def set_speed_ra(self, speed):
+        with self.lock:
+            self.__update()
+            self.axes['ra']['command'] = speed
+            self.commands.append(('ra', speed))
+
+    def set_speed_dec(self, speed):
+        with self.lock:
+            self.__update()
+            self.axes['dec']['command'] = speed
+            self.commands.append(('dec', speed))
+
+
+class TestFollowSlewTrajectory(unittest.TestCase):
+    def setUp(self):
+        self.stepper = control.stepper
+        self.slew_target = control._slew_target
+        self.settle_timeout = control.SLEW_SETTLE_TIMEOUT
+        control.cancel_slew = False
+        self.ha_close_enough = settings.settings['ra_track_rate']
+        self.dec_close_enough = settings.settings['dec_ticks_per_degree'] * control.SIDEREAL_RATE
+
+    def tearDown(self):
+        control.stepper = self.stepper
+        control._slew_target = self.slew_target
+        control.SLEW_SETTLE_TIMEOUT = self.settle_timeout
+        control.cancel_slew = False
+
+    def follow(self, target):
+        control._follow_slew_trajectory(target, False, self.ha_close_enough, self.dec_close_enough)
+
+    def assert_on_target(self, fake, ephemeris):
+        position = fake.position()
+        target = ephemeris.steps()
+        self.assertLess(abs(position['ha'] - target['ha']), self.ha_close_enough)
+        self.assertLess(abs(position['dec'] - target['dec']), self.dec_close_enough)
+
+    def test_fixed(self):
+        fake = FakeStepper()
+        control.stepper = fake
+        start = time.monotonic()
+        self.follow({'ha': 2000.0, 'dec': -1500.0})
+        self.assertLess(time.monotonic() - start, 3.0)
+        self.assert_on_target(fake, target_ephemeris.TargetEphemeris.fixed({'ha': 2000.0, 'dec': -1500.0}))
+
+    def test_drifting(self):
+        fake = FakeStepper()
+        control.stepper = fake
+        # Moves like a solar system body, faster than sidereal on both axes
+        ephemeris = target_ephemeris.TargetEphemeris([300.0, 2000.0], [-50.0, 1500.0], time.monotonic(),
+                                                     float('inf'))
+        control._slew_target = lambda wanted_skycoord, parking=False, body=None: ephemeris
+        start = time.monotonic()
+        self.follow(None)
+        self.assertLess(time.monotonic() - start, 3.0)
+        self.assert_on_target(fake, ephemeris)
+        # Left moving with the target
+        status = fake.get_status()
+        self.assertAlmostEqual(status['rs'], 300.0, delta=SPEED_DELTA)
+        self.assertAlmostEqual(status['ds'], -50.0, delta=SPEED_DELTA)
+
+    def test_cancel(self):
+        fake = FakeStepper()
+        control.stepper = fake
+        thread = threading.Thread(target=self.follow, args=({'ha': 500000.0, 'dec': 0.0},))
+        thread.start()
+        time.sleep(0.3)
+        control.cancel_slew = True
+        thread.join(0.5)
+        self.assertFalse(thread.is_alive())
+        self.assertGreater(abs(500000.0 - fake.position()['ha']), self.ha_close_enough)
+
+    def test_settle_timeout(self):
+        fake = FakeStepper(stalled=['dec'])
+        control.stepper = fake
+        control.SLEW_SETTLE_TIMEOUT = 0.3
+        target = {'ha': 2000.0, 'dec': -1500.0}
+        duration = max(control._slew_trajectory('ra', 2000.0, 0.0).duration,
+                       control._slew_trajectory('dec', -1500.0, 0.0).duration)
+        start = time.monotonic()
+        self.follow(target)
+        elapsed = time.monotonic() - start
+        self.assertGreater(elapsed, duration + 0.3)
+        self.assertLess(elapsed, duration + 0.3 + 0.5)
+        # RA still got there
+        self.assertLess(abs(fake.position()['ha'] - 2000.0), self.ha_close_enough)
+
+
+class TestGuideControl(unittest.TestCase):
+    def setUp(self):
+        self.stepper = control.stepper
+
+    def tearDown(self):
+        control.stepper = self.stepper
+
+    def test_pulse_ends_on_time(self):
+        fake = FakeStepper()
+        control.stepper = fake
+        # Manual control waiting on a status read holds up the default scheduler
+        released = threading.Event()
+        scheduler.call_later(0, released.wait, 2.0)
+        try:
+            control.guide_control('w', 100)
+            self.assertGreater(fake.commands[-1][1], 0)
+            time.sleep(0.3)
+            self.assertEqual(fake.commands[-1], ('ra', 0.0))
+        finally:
+            released.set()
+
+
+class TestSlewPathCheck(unittest.TestCase):
+    def setUp(self):
+        settings.runtime_settings['earth_location'] = EarthLocation(lat=38.9369 * u.deg, lon=-95.242 * u.deg,
+                                                                    height=266.0 * u.m)
+        settings.runtime_settings['tracking'] = False
+        settings.settings['pointing_model'] = 'single'
+        obstime = AstroTime(pendulum.now())
+        hadec = skyconv.to_hadec(AltAz(alt=45 * u.deg, az=180 * u.deg, **skyconv.get_frame_init_args('altaz')),
+                                 obstime=obstime)
+        settings.runtime_settings['sync_info'] = {'coord': hadec, 'steps': {'ha': 0, 'dec': 0}}
+        skyconv.model_real_stepper = pointing_model.PointingModelBuie()
+        control.current_horizon_limit = horizon_limit.HorizonLimit(points=[{'alt': 10.0, 'az': 0.0}])
+
+    def tearDown(self):
+        control.current_horizon_limit = None
+
+    def status_at(self, alt, az):
+        steps = skyconv.to_steps(AltAz(alt=alt * u.deg, az=az * u.deg, **skyconv.get_frame_init_args('altaz')))
+        return {'rep': steps['ha'], 'dep': steps['dec'], 'rs': 0.0, 'ds': 0.0}
+
+    def target(self, alt, az):
+        return AltAz(alt=alt * u.deg, az=az * u.deg, **skyconv.get_frame_init_args('altaz'))
+
+    def test_above(self):
+        self.assertTrue(control.slew_path_check(self.target(60, 200), self.status_at(30, 100)))
+        # Going back into the limit
+        self.assertFalse(control.slew_path_check(self.target(5, 260), self.status_at(30, 100)))
+
+    def test_start_below(self):
+        # Parked at the horizon can slew up and out of the limit
+        self.assertTrue(control.slew_path_check(self.target(60, 200), self.status_at(0, 100)))
+        self.assertTrue(control.slew_path_check(self.target(60, 200), self.status_at(0, 100), parking=True))
+        # But not back into it after leaving
+        self.assertFalse(control.slew_path_check(self.target(5, 260), self.status_at(0, 100)))
+
+    def test_crossing(self):
+        # Both ends above the limit, from low in the north the mount swings down under the pole to reach the south
+        self.assertFalse(control.slew_path_check(self.target(50, 180), self.status_at(15, 0)))
+        self.assertFalse(control.slew_path_check(self.target(60, 180), self.status_at(20, 0)))
+
+    def test_stays_clear(self):
+        # Dips a little below both ends but stays above the limit
+        self.assertTrue(control.slew_path_check(self.target(60, 200), self.status_at(20, 30)))
+        self.assertTrue(control.slew_path_check(self.target(20, 160), self.status_at(20, 100)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import unittest
+
+import numpy
+
+import horizon_limit
+
+POINTS = [{'alt': 10.0, 'az': 0.0}, {'alt': 30.0, 'az': 90.0}, {'alt': 20.0, 'az': 180.0}, {'alt': 10.0, 'az': 359.0}]
+
+
+class TestHorizonLimit(unittest.TestCase):
+    def test_disabled(self):
+        hl = horizon_limit.HorizonLimit(points=POINTS, enabled=False)
+        self.assertFalse(hl.below(-10.0, 45.0, 95.0))
+
+    def test_single_point(self):
+        hl = horizon_limit.HorizonLimit(points=[{'alt': 15.0, 'az': 0.0}])
+        self.assertTrue(hl.below(15.0, 200.0))
+        self.assertFalse(hl.below(15.1, 200.0))
+
+    def test_segments(self):
+        hl = horizon_limit.HorizonLimit(points=POINTS)
+        self.assertAlmostEqual(float(hl.limit_alt(45.0)), 20.0)
+        self.assertAlmostEqual(float(hl.limit_alt(135.0)), 25.0)
+        self.assertTrue(numpy.isnan(hl.limit_alt(359.5)))
+        self.assertTrue(hl.below(19.0, 45.0))
+        self.assertFalse(hl.below(21.0, 45.0))
+        # Outside of points has no limit
+        self.assertFalse(hl.below(-5.0, 359.5))
+
+    def test_unsorted_points(self):
+        hl = horizon_limit.HorizonLimit(points=list(reversed(POINTS)))
+        self.assertAlmostEqual(float(hl.limit_alt(45.0)), 20.0)
+
+    def test_dec(self):
+        hl = horizon_limit.HorizonLimit(points=POINTS, dec_greater_than=-30.0, dec_less_than=80.0)
+        self.assertTrue(hl.below(60.0, 45.0, 85.0))
+        self.assertTrue(hl.below(60.0, 45.0, -35.0))
+        self.assertFalse(hl.below(60.0, 45.0, 10.0))
+
+    def test_array(self):
+        hl = horizon_limit.HorizonLimit(points=POINTS, dec_greater_than=-30.0, dec_less_than=80.0)
+        below = hl.below([19.0, 21.0, 60.0, 24.0], [45.0, 45.0, 45.0, 135.0], [0.0, 0.0, 85.0, 0.0])
+        self.assertEqual(below.tolist(), [True, False, True, True])
+
+    def test_from_settings(self):
+        hl = horizon_limit.from_settings({'horizon_limit_points': POINTS, 'horizon_limit_enabled': True,
+                                          'horizon_limit_dec': {'greater_than': -10, 'less_than': 70}})
+        self.assertTrue(hl.below(60.0, 45.0, 75.0))
+        d = hl.to_dict(resolution=90.0)
+        self.assertEqual(d['lut']['az'], [0.0, 90.0, 180.0, 270.0])
+        self.assertEqual(d['lut']['alt'][1], 30.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
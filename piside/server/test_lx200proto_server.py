@@ -0,0 +1,75 @@
+import asyncio
+import unittest
+
+import lx200proto_server
+
+
+class TestParse(unittest.TestCase):
+    def test_parse(self):
+        client = lx200proto_server.LX200Client(None)
+        self.assertEqual(client.parse(b'\x06:GR'), [b'\x06'])
+        self.assertEqual(client.parse(b'#junk:Sr 12:34:56#:#:GD#'), [':GR#', ':Sr 12:34:56#', ':GD#'])
+        self.assertEqual(client.buf, b'')
+
+    def test_long_garbage(self):
+        client = lx200proto_server.LX200Client(None)
+        client.parse(b'x' * (lx200proto_server.MAX_COMMAND_LENGTH + 1))
+        self.assertEqual(client.buf, b'')
+
+
+class TestDispatch(unittest.TestCase):
+    def test_handler(self):
+        client = lx200proto_server.LX200Client(None)
+        self.assertIs(client.handler(':GR#'), lx200proto_server.LX200Client.cmd_get_ra)
+        self.assertIs(client.handler(':Sr 12:34:56#'), lx200proto_server.LX200Client.cmd_set_target_ra)
+        self.assertIs(client.handler(':Mgn0100#'), lx200proto_server.LX200Client.cmd_guide)
+        self.assertIs(client.handler(':D#'), lx200proto_server.LX200Client.cmd_distance_bars)
+        self.assertIsNone(client.handler(':GX#'))
+        self.assertIsNone(client.handler(':Z#'))
+
+    def test_set_target(self):
+        client = lx200proto_server.LX200Client(None)
+        client.process(':Sr 06:00:00#')
+        client.process(':Sd -05*30:00#')
+        self.assertEqual(client.take_replies(), b'11')
+        self.assertAlmostEqual(lx200proto_server.target['ra'], 90.0)
+        self.assertAlmostEqual(lx200proto_server.target['dec'], -5.5)
+
+
+class TestFormat(unittest.TestCase):
+    def test_cached_format(self):
+        for v in [0.0, 12.3456789, 359.99999, 123.456]:
+            for hp in [True, False]:
+                self.assertEqual(lx200proto_server.ra_format_cached(v, hp), lx200proto_server.ra_format(v, hp))
+                self.assertEqual(lx200proto_server.az_format_cached(v, hp), lx200proto_server.az_format(v, hp))
+        for v in [0.0, -0.00001, 0.00001, -45.12345, 89.99999, -12.5001]:
+            for hp in [True, False]:
+                self.assertEqual(lx200proto_server.dec_format_cached(v, hp), lx200proto_server.dec_format(v, hp))
+
+
+class TestServer(unittest.TestCase):
+    def test_clients(self):
+        async def run():
+            server = await asyncio.start_server(lx200proto_server.handle_client, '127.0.0.1', 0)
+            port = server.sockets[0].getsockname()[1]
+            async with server:
+                conns = [await asyncio.open_connection('127.0.0.1', port) for i in range(20)]
+                for reader, writer in conns:
+                    writer.write(b'\x06:GVP#:Sw3#')
+                for reader, writer in conns:
+                    self.assertEqual(await asyncio.wait_for(reader.readexactly(10), 5), b'PSSTEQ25#1')
+                self.assertEqual(len(lx200proto_server.lx200_clients), 20)
+                for reader, writer in conns:
+                    writer.close()
+                    await writer.wait_closed()
+                for i in range(100):
+                    if not lx200proto_server.lx200_clients:
+                        break
+                    await asyncio.sleep(0.01)
+                self.assertEqual(len(lx200proto_server.lx200_clients), 0)
+
+        asyncio.run(run())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,195 @@
+import math
+import threading
+import unittest
+
+import astropy.units as u
+import numpy
+import pendulum
+from astropy.coordinates import EarthLocation
+from astropy.time import Time as AstroTime
+
+import control
+import horizon_limit
+import mapping_run
+import settings
+import skyconv
+from skyconv_hadec import HADec
+
+el = EarthLocation(lat=38.9369 * u.deg, lon=-95.242 * u.deg, height=266.0 * u.m)
+obstime = AstroTime(pendulum.parse("2019-07-18T05:35:23.053Z"))
+
+
+class FakeControl:
+    """
+    Records the control calls a mapping run makes, slews finish right away.
+    """
+
+    def __init__(self):
+        self.slews = []
+        self.syncs = []
+        self.fits = []
+        self.saved = {}
+
+    def __enter__(self):
+        for name in ['set_slew', 'sync', 'fit_pointing_model', 'cancel_slews']:
+            self.saved[name] = getattr(control, name)
+            setattr(control, name, getattr(self, name))
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        for name, func in self.saved.items():
+            setattr(control, name, func)
+        return False
+
+    def set_slew(self, alt, az):
+        self.slews.append((alt, az))
+        thread = threading.Thread(target=lambda: None)
+        thread.start()
+        return thread
+
+    def sync(self, coord, fit=True):
+        self.syncs.append((coord, fit))
+
+    def fit_pointing_model(self, wait=False):
+        self.fits.append(len(self.syncs))
+
+    def cancel_slews(self):
+        pass
+
+
+class SlowClearEvent(threading.Event):
+    """
+    Event that is slow to clear, so a submit right after the run starts solving lands before the clear.
+    """
+
+    def clear(self):
+        threading.Event().wait(0.2)
+        super().clear()
+
+
+class TestMappingRun(unittest.TestCase):
+    def setUp(self):
+        settings.runtime_settings['earth_location'] = el
+        settings.runtime_settings['tracking'] = False
+        control.current_horizon_limit = horizon_limit.HorizonLimit(enabled=False)
+
+    def tearDown(self):
+        control.current_horizon_limit = None
+
+    def test_grid_points(self):
+        points = mapping_run.grid_points(40, 20.0, 80.0)
+        self.assertEqual(len(points), 40)
+        alt = numpy.array([p[0] for p in points])
+        az = numpy.array([p[1] for p in points])
+        self.assertTrue(numpy.all(alt >= 20.0))
+        self.assertTrue(numpy.all(alt <= 80.0))
+        # Spread all the way around
+        self.assertGreater(numpy.max(az) - numpy.min(az), 300.0)
+        # Nearest neighbor path is shorter than lattice order
+        self.assertLess(self.path_length(points), self.path_length(sorted(points, key=lambda p: p[1])))
+
+    def test_grid_points_start(self):
+        points = mapping_run.grid_points(20, 20.0, 80.0, start=(85.0, 0.0))
+        self.assertEqual(max(points, key=lambda p: p[0]), points[0])
+
+    def test_grid_points_horizon_limit(self):
+        control.current_horizon_limit = horizon_limit.HorizonLimit(
+            points=[{'alt': 50.0, 'az': 0.0}, {'alt': 50.0, 'az': 180.0}, {'alt': 0.0, 'az': 180.1},
+                    {'alt': 0.0, 'az': 360.0}])
+        points = mapping_run.grid_points(30, 20.0, 80.0)
+        # More candidates are made to replace blocked ones
+        self.assertEqual(len(points), 30)
+        for alt, az in points:
+            self.assertTrue(az > 180.0 or alt > 50.0)
+
+    def path_length(self, points):
+        ret = 0.0
+        for (alt1, az1), (alt2, az2) in zip(points, points[1:]):
+            ret += math.degrees(math.acos(min(1.0, math.sin(math.radians(alt1)) * math.sin(math.radians(alt2)) +
+                                              math.cos(math.radians(alt1)) * math.cos(math.radians(alt2)) *
+                                              math.cos(math.radians(az1 - az2)))))
+        return ret
+
+    def test_run(self):
+        points = [(30.0, 10.0), (40.0, 50.0), (50.0, 90.0), (60.0, 130.0), (70.0, 170.0)]
+        solved = []
+
+        def solver(target):
+            solved.append(target)
+            # Skip one
+            return None if len(solved) == 3 else target
+
+        with FakeControl() as fake:
+            run = mapping_run.MappingRun(points, solver=solver, settle_seconds=0.0, refit_every=2)
+            run.start()
+            run.join(10.0)
+        self.assertEqual(fake.slews, points)
+        self.assertEqual([(t.alt.deg, t.az.deg) for t in solved], points)
+        self.assertEqual(len(fake.syncs), 4)
+        self.assertTrue(all(not fit for coord, fit in fake.syncs))
+        # Every two syncs and at end
+        self.assertEqual(fake.fits, [2, 4, 4])
+        progress = run.progress()
+        self.assertEqual(progress['state'], 'done')
+        self.assertEqual(progress['synced'], 4)
+        self.assertEqual(progress['skipped'], 1)
+
+    def test_submit_solution(self):
+        hadec = HADec(ha=10.0 * u.deg, dec=20.0 * u.deg, **(skyconv.get_frame_init_args('hadec', obstime=obstime)))
+        with FakeControl() as fake:
+            run = mapping_run.MappingRun([(30.0, 10.0), (40.0, 50.0)], settle_seconds=0.0, solve_timeout=10.0)
+            self.assertFalse(run.submit_solution(hadec))
+            run.start()
+            self.wait_for_solving(run)
+            self.assertTrue(run.submit_solution(hadec))
+            self.wait_for_solving(run, 1)
+            # Skipped
+            self.assertTrue(run.submit_solution(None))
+            run.join(10.0)
+        self.assertEqual(fake.syncs, [(hadec, False)])
+        self.assertEqual(run.progress()['skipped'], 1)
+        self.assertEqual(run.progress()['state'], 'done')
+
+    def test_cancel(self):
+        with FakeControl() as fake:
+            run = mapping_run.MappingRun([(30.0, 10.0), (40.0, 50.0)], settle_seconds=0.0, solve_timeout=10.0)
+            run.start()
+            self.wait_for_solving(run)
+            run.cancel()
+            run.join(10.0)
+        self.assertEqual(fake.syncs, [])
+        # Still fitted with what was synced
+        self.assertEqual(fake.fits, [0])
+        self.assertEqual(run.progress()['state'], 'cancelled')
+
+    def test_submit_while_clearing(self):
+        hadec = HADec(ha=10.0 * u.deg, dec=20.0 * u.deg, **(skyconv.get_frame_init_args('hadec', obstime=obstime)))
+        with FakeControl() as fake:
+            run = mapping_run.MappingRun([(30.0, 10.0)], settle_seconds=0.0, solve_timeout=3.0)
+            run._solution_ready = SlowClearEvent()
+            run.start()
+            self.wait_for_solving(run)
+            self.assertTrue(run.submit_solution(hadec))
+            run.join(1.5)
+            self.assertFalse(run.running())
+        self.assertEqual(fake.syncs, [(hadec, False)])
+
+    def test_cancel_while_clearing(self):
+        with FakeControl() as fake:
+            run = mapping_run.MappingRun([(30.0, 10.0), (40.0, 50.0)], settle_seconds=0.0, solve_timeout=3.0)
+            run._solution_ready = SlowClearEvent()
+            run.start()
+            self.wait_for_solving(run)
+            run.cancel()
+            run.join(1.5)
+            self.assertFalse(run.running())
+        self.assertEqual(fake.syncs, [])
+        self.assertEqual(run.progress()['state'], 'cancelled')
+
+    def wait_for_solving(self, run, index=0):
+        for i in range(1000):
+            progress = run.progress()
+            if progress['waiting_solution'] and progress['index'] == index:
+                return
+            threading.Event().wait(0.01)
+        self.fail('Run never waited for solution')
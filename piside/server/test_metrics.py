@@ -0,0 +1,57 @@
+import time
+import unittest
+
+import metrics
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.registry = metrics.Registry()
+
+    def test_histogram(self):
+        histogram = self.registry.histogram('test_seconds', 'Test', buckets=(0.001, 0.01))
+        self.assertIs(self.registry.histogram('test_seconds'), histogram)
+        self.assertIsNot(self.registry.histogram('test_seconds', axis='ra'), histogram)
+        for v in [0.0005, 0.005, 0.005, 1.0]:
+            histogram.observe(v)
+        snapshot = histogram.snapshot()
+        self.assertEqual(snapshot['count'], 4)
+        self.assertAlmostEqual(snapshot['sum'], 1.0105)
+        self.assertEqual(snapshot['max'], 1.0)
+        self.assertEqual([count for le, count in snapshot['buckets']], [1, 3, 4])
+
+    def test_timed(self):
+        @self.registry.timed('func_seconds', function='sleep')
+        def sleep():
+            time.sleep(0.01)
+            return 5
+
+        self.assertEqual(sleep(), 5)
+        with self.registry.timer('block_seconds'):
+            pass
+        snapshot = self.registry.snapshot()['histograms']
+        self.assertEqual(snapshot['func_seconds'][0]['count'], 1)
+        self.assertEqual(snapshot['func_seconds'][0]['labels'], {'function': 'sleep'})
+        self.assertGreaterEqual(snapshot['func_seconds'][0]['sum'], 0.01)
+        self.assertEqual(snapshot['block_seconds'][0]['count'], 1)
+
+    def test_prometheus(self):
+        self.registry.histogram('cmd_seconds', 'Command time', buckets=(0.1,), command='qs').observe(0.05)
+        self.registry.register_collector('cache', lambda: {'hits': 3, 'name': 'ignored'}, 'Cache counts')
+        text = self.registry.prometheus_text()
+        self.assertIn('# HELP ssteq_cmd_seconds Command time\n', text)
+        self.assertIn('# TYPE ssteq_cmd_seconds histogram\n', text)
+        self.assertIn('ssteq_cmd_seconds_bucket{command="qs",le="0.1"} 1\n', text)
+        self.assertIn('ssteq_cmd_seconds_bucket{command="qs",le="+Inf"} 1\n', text)
+        self.assertIn('ssteq_cmd_seconds_count{command="qs"} 1\n', text)
+        self.assertIn('# TYPE ssteq_cache_hits gauge\nssteq_cache_hits 3\n', text)
+        self.assertNotIn('ignored', text)
+
+    def test_collector_error(self):
+        self.registry.register_collector('bad', lambda: 1 / 0)
+        self.registry.register_collector('good', lambda: {'x': 1.5})
+        self.assertEqual(self.registry.snapshot()['gauges'], {'good_x': 1.5})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,157 @@
+import threading
+import unittest
+
+import astropy.units as u
+
+import model_fitter
+import pointing_model
+import settings
+import skyconv
+from skyconv_hadec import HADec
+
+
+class FakeModel:
+    """
+    Model whose fit can be held up or made to fail.
+    """
+
+    def __init__(self, converge=True):
+        self.points = []
+        self.fitted = 0
+        self.converge = converge
+        self.hold = None
+
+    def add_point(self, from_point, to_point, fit=True):
+        # Like a sync close to an old point, same from_point replaces it.
+        self.points = [point for point in self.points if point[0] != from_point]
+        self.points.append((from_point, to_point))
+
+    def fit(self):
+        if self.hold is not None:
+            self.hold.wait(10.0)
+        self.fitted = len(self.points)
+        return self.converge
+
+    def size(self):
+        return len(self.points)
+
+    def __deepcopy__(self, memo):
+        ret = FakeModel(self.converge)
+        ret.points = list(self.points)
+        ret.fitted = self.fitted
+        # Shared so a held fit can be let go
+        ret.hold = self.hold
+        return ret
+
+
+class TestModelFitter(unittest.TestCase):
+    def setUp(self):
+        settings.settings['pointing_model_points'] = -1
+        settings.settings['pointing_model_remember'] = False
+        self.saved = []
+        self.save_pointing_model = settings.save_pointing_model
+        settings.save_pointing_model = self.saved.append
+        self.fitter = model_fitter.ModelFitter()
+
+    def tearDown(self):
+        settings.save_pointing_model = self.save_pointing_model
+
+    def test_publish(self):
+        model = pointing_model.PointingModelBuie()
+        model.add_point(HADec(ha=10 * u.deg, dec=20 * u.deg), HADec(ha=10 * u.deg, dec=20 * u.deg))
+        skyconv.model_real_stepper = model
+        expected = pointing_model.PointingModelBuie()
+        expected.add_point(HADec(ha=10 * u.deg, dec=20 * u.deg), HADec(ha=10 * u.deg, dec=20 * u.deg))
+        for ha, dec in [(30, 40), (-20, 10), (60, -10)]:
+            from_point = HADec(ha=ha * u.deg, dec=dec * u.deg)
+            to_point = HADec(ha=(ha + 0.5) * u.deg, dec=(dec - 0.2) * u.deg)
+            self.fitter.add_point(from_point, to_point)
+            expected.add_point(from_point, to_point)
+        self.assertTrue(self.fitter.wait(30.0))
+        published = skyconv.model_real_stepper
+        self.assertIsNot(published, model)
+        self.assertEqual(published.size(), 4)
+        # Old model was not changed
+        self.assertEqual(model.size(), 1)
+        # Same as fitting after each point
+        point = published.transform_point(HADec(ha=30 * u.deg, dec=40 * u.deg))
+        expected_point = expected.transform_point(HADec(ha=30 * u.deg, dec=40 * u.deg))
+        self.assertAlmostEqual(point.ha.deg, expected_point.ha.deg, places=6)
+        self.assertAlmostEqual(point.dec.deg, expected_point.dec.deg, places=6)
+        # Points that come in while fitting are batched, how many depends on timing.
+        self.assertEqual(self.fitter.stats()['points'], 3)
+        self.assertGreaterEqual(self.fitter.stats()['published'], 1)
+
+    def test_no_fit(self):
+        model = FakeModel()
+        skyconv.model_real_stepper = model
+        self.fitter.add_point(1, 1, fit=False)
+        self.fitter.add_point(2, 2, fit=False)
+        self.assertTrue(self.fitter.wait(10.0))
+        # Not published until fitted, counted in size
+        self.assertIs(skyconv.model_real_stepper, model)
+        self.assertEqual(self.fitter.size(), 2)
+        self.fitter.fit()
+        self.assertTrue(self.fitter.wait(10.0))
+        self.assertEqual(skyconv.model_real_stepper.points, [(1, 1), (2, 2)])
+        self.assertEqual(skyconv.model_real_stepper.fitted, 2)
+        self.assertEqual(self.fitter.size(), 2)
+
+    def test_size_replaced(self):
+        model = FakeModel()
+        model.add_point(1, 1)
+        skyconv.model_real_stepper = model
+        self.fitter.add_point(1, 2, fit=False)
+        self.fitter.add_point(2, 2, fit=False)
+        self.assertTrue(self.fitter.wait(10.0))
+        self.assertEqual(self.fitter.size(), 2)
+        self.fitter.fit()
+        self.assertTrue(self.fitter.wait(10.0))
+        self.assertEqual(skyconv.model_real_stepper.points, [(1, 2), (2, 2)])
+        self.assertEqual(self.fitter.size(), 2)
+
+    def test_failed_fit(self):
+        model = FakeModel(converge=False)
+        skyconv.model_real_stepper = model
+        self.fitter.add_point(1, 1)
+        self.assertTrue(self.fitter.wait(10.0))
+        # Old model kept
+        self.assertIs(skyconv.model_real_stepper, model)
+        self.assertEqual(self.fitter.stats()['failed'], 1)
+        self.assertEqual(self.fitter.size(), 1)
+
+    def test_old_model_in_service(self):
+        model = FakeModel()
+        model.hold = threading.Event()
+        skyconv.model_real_stepper = model
+        self.fitter.add_point(1, 1)
+        # Added while fit is held
+        self.fitter.add_point(2, 2)
+        self.assertFalse(self.fitter.wait(0.1))
+        self.assertIs(skyconv.model_real_stepper, model)
+        self.assertEqual(self.fitter.size(), 2)
+        model.hold.set()
+        self.assertTrue(self.fitter.wait(10.0))
+        self.assertEqual(skyconv.model_real_stepper.points, [(1, 1), (2, 2)])
+
+    def test_reset(self):
+        settings.settings['pointing_model_remember'] = True
+        model = FakeModel()
+        model.hold = threading.Event()
+        skyconv.model_real_stepper = model
+        self.fitter.add_point(1, 1)
+        self.assertFalse(self.fitter.wait(0.1))
+        # Model replaced while fitting
+        self.fitter.reset()
+        new_model = FakeModel()
+        skyconv.model_real_stepper = new_model
+        model.hold.set()
+        self.assertTrue(self.fitter.wait(10.0))
+        self.assertIs(skyconv.model_real_stepper, new_model)
+        self.assertEqual(self.saved, [])
+        self.assertEqual(self.fitter.stats()['discarded'], 1)
+        # Next point goes on the new model
+        self.fitter.add_point(3, 3)
+        self.assertTrue(self.fitter.wait(10.0))
+        self.assertEqual(skyconv.model_real_stepper.points, [(3, 3)])
+        self.assertEqual(self.saved, [skyconv.model_real_stepper])
@@ -1,5 +1,7 @@
 import unittest
 
+import numpy
+
 import motion
 
 
@@ -28,6 +30,46 @@ class TestMotion(unittest.TestCase):
         v = motion.v_at_t(-3, 4, -20, 20)
         self.assertAlmostEqual(v, -20, places=2)
 
+    def test_speed_sleeps_positions(self):
+        speed_sleeps = motion.calc_speed_sleeps(1000.0, 1000.0, 0.0, 5000.0, 0.0, 'ra')
+        x = motion.speed_sleeps_positions(speed_sleeps, 1000.0, 0.0, [0.0, 0.5, 1.0, 2.0, 3.0])
+        self.assertAlmostEqual(x[0], 0.0)
+        self.assertAlmostEqual(x[1], 125.0)
+        self.assertAlmostEqual(x[2], 500.0)
+        self.assertAlmostEqual(x[3], 1000.0)
+        self.assertAlmostEqual(x[4], 1000.0)
+        speed_sleeps = motion.calc_speed_sleeps(-300000.0, 1000.0, 0.0, 5000.0, 0.0, 'ra')
+        x = motion.speed_sleeps_positions(speed_sleeps, 1000.0, 0.0, [65.0])
+        self.assertAlmostEqual(x[0], -300000.0)
+
+    def test_trajectory_triangle(self):
+        traj = motion.AxisTrajectory(1000.0, 0.0, 1000.0, 5000.0)
+        self.assertAlmostEqual(traj.duration, 2.0)
+        self.assertAlmostEqual(traj.position(0.5), 125.0)
+        self.assertAlmostEqual(traj.position(1.0), 500.0)
+        self.assertAlmostEqual(traj.velocity(1.0), 1000.0)
+        self.assertAlmostEqual(traj.position(3.0), 1000.0)
+        self.assertAlmostEqual(traj.command_velocity(0.5), 1000.0)
+        self.assertAlmostEqual(traj.command_velocity(1.5), 0.0)
+        self.assertAlmostEqual(traj.next_change(0.5), 1.0)
+        self.assertTrue(traj.ramping(1.5))
+        self.assertFalse(traj.ramping(2.5))
+        self.assertIsNone(traj.next_change(2.5))
+
+    def test_trajectory_moving_target(self):
+        # Start tracking, target ahead and moving at tracking speed
+        for delta, v_0 in [(-300000.0, 15.0), (300000.0, 15.0), (20.0, 15.0), (-5.0, 15.0), (1000.0, -4000.0)]:
+            traj = motion.AxisTrajectory(delta, v_0, 1000.0, 5000.0, 15.0)
+            t = numpy.linspace(0, traj.duration, 200)
+            v = traj.velocity(t)
+            self.assertLessEqual(numpy.max(numpy.abs(v)), 5000.0 + 1e-6)
+            self.assertLessEqual(numpy.max(numpy.abs(numpy.diff(v) / numpy.diff(t))), 1000.0 + 1e-6)
+            self.assertAlmostEqual(traj.velocity(0.0), v_0)
+            self.assertAlmostEqual(traj.position(traj.duration), traj.target_position(traj.duration), places=6)
+            self.assertAlmostEqual(traj.velocity(traj.duration + 1.0), 15.0)
+            self.assertAlmostEqual(traj.position(traj.duration + 10.0), traj.target_position(traj.duration + 10.0),
+                                   places=6)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,4 +1,6 @@
+import io
 import unittest
+import affine_fit
 import pointing_model
 from astropy.coordinates import AltAz, EarthLocation, SkyCoord
 from skyconv_hadec import HADec
@@ -174,6 +176,19 @@ class TestPointingModelBuie(unittest.TestCase):
             (tpt.ha.deg, tpt.dec.deg), (94.99997885310887, 49.999988412567774), 4
         )
 
+    def test_array_points(self):
+        self.test_twop_stretch()
+        points = HADec(dec=[50, -20] * u.deg, ha=[95, 300] * u.deg)
+        tpts = self.pm.transform_point(points)
+        for i in range(2):
+            tpt = self.pm.transform_point(points[i])
+            numpy.testing.assert_almost_equal(
+                (tpts.ha.deg[i], tpts.dec.deg[i]), (tpt.ha.deg, tpt.dec.deg), 8
+            )
+        ipts = self.pm.inverse_transform_point(tpts)
+        numpy.testing.assert_almost_equal(ipts.ha.deg, [95.0, 300.0], 4)
+        numpy.testing.assert_almost_equal(ipts.dec.deg, [50.0, -20.0], 4)
+
     def test_single(self):
         point1 = HADec(dec=10 * u.deg, ha=90 * u.deg)
         point2 = HADec(dec=60 * u.deg, ha=95 * u.deg)
@@ -191,6 +206,92 @@ class TestPointingModelBuie(unittest.TestCase):
         self.pm.clear()
         self.test_one_degree()
 
+    def test_jacobian(self):
+        x = numpy.array([[95.0, 50.0], [300.0, -20.0], [10.0, 88.0]])
+        p0 = numpy.array([0.01, -0.02, 0.003, 0.004, 0.005, -0.006, 0.007, 0.008, -0.009, 0.01])
+        y = pointing_model.buie_model(x, *numpy.zeros(10))
+        jac = pointing_model.buie_model_jacobian(p0, x, y)
+        for i in range(10):
+            step = numpy.zeros(10)
+            step[i] = 1e-7
+            numeric = (pointing_model.buie_model_error(p0 + step, x, y) -
+                       pointing_model.buie_model_error(p0 - step, x, y)) / 2e-7
+            numpy.testing.assert_allclose(jac[:, i], numeric, rtol=1e-5, atol=1e-5)
+        self.assertEqual(pointing_model.buie_model_jacobian(p0[:4], x).shape, (6, 4))
+
+    def test_many_points(self):
+        # More points than initial capacity, ha across 0/360.
+        true = [0.001, -0.002, 0.0005, 0.0003, 0.001, 0.0007, 0.0004, -0.0006, 0.0008, 0.0002]
+        for i in range(40):
+            ha = (i * 37.0) % 360.0
+            dec = -70.0 + (i * 53.0) % 150.0
+            to = pointing_model.buie_model(numpy.array([[ha, dec]]), *true)[0]
+            self.pm.add_point(HADec(ha=ha * u.deg, dec=dec * u.deg), HADec(ha=to[0] * u.deg, dec=to[1] * u.deg))
+        self.assertEqual(self.pm.size(), len(self.pm.get_from_points()))
+        self.assertGreater(self.pm.size(), pointing_model.INITIAL_POINT_CAPACITY)
+        point = HADec(dec=50 * u.deg, ha=359.5 * u.deg)
+        expected = pointing_model.buie_model(numpy.array([[359.5, 50.0]]), *true)[0]
+        tpt = self.pm.transform_point(point)
+        self.assertAlmostEqual(tpt.ha.wrap_at(360 * u.deg).deg, expected[0] % 360.0, places=6)
+        self.assertAlmostEqual(tpt.dec.deg, expected[1], places=6)
+
+    def test_rank_deficient(self):
+        # Index errors only, points at one dec can't tell index error in dec from dec scale error.
+        for ha in [60.0, 90.0, 120.0]:
+            self.pm.add_point(HADec(ha=ha * u.deg, dec=20 * u.deg), HADec(ha=(ha + 0.5) * u.deg, dec=20.2 * u.deg))
+        last = self.pm.to_arrays()["params"]
+        self.assertAlmostEqual(last[1], numpy.radians(0.2))
+        self.pm.add_point(HADec(ha=150 * u.deg, dec=20 * u.deg), HADec(ha=150.5 * u.deg, dec=20.2 * u.deg))
+        # Starts from the last fit, not a mix of both
+        params = self.pm.to_arrays()["params"]
+        self.assertEqual(len(params), 4)
+        numpy.testing.assert_almost_equal(params[:3], last, 8)
+        self.assertAlmostEqual(params[3], 0.0, 8)
+
+    def assert_same_model(self, pm, loaded):
+        self.assertEqual(loaded.size(), pm.size())
+        points = HADec(ha=[50, 300, 10] * u.deg, dec=[20, -30, 75] * u.deg)
+        numpy.testing.assert_almost_equal(loaded.transform_point(points).ha.deg, pm.transform_point(points).ha.deg, 8)
+        numpy.testing.assert_almost_equal(
+            loaded.transform_point(points).dec.deg, pm.transform_point(points).dec.deg, 8
+        )
+        numpy.testing.assert_almost_equal(
+            [p.ha.deg for p in loaded.get_from_points()], [p.ha.deg for p in pm.get_from_points()], 12
+        )
+
+    def test_save_load(self):
+        self.pm = pointing_model.PointingModelBuie(max_points=7)
+        self.test_one_degree()
+        f = io.BytesIO()
+        pointing_model.save_model(self.pm, f)
+        f.seek(0)
+        loaded = pointing_model.load_model(f)
+        self.assertIsInstance(loaded, pointing_model.PointingModelBuie)
+        self.assertEqual(loaded.to_arrays()["max_points"], 7)
+        self.assert_same_model(self.pm, loaded)
+        # Without fitted values it is fitted on load, not when used
+        arrays = self.pm.to_arrays()
+        arrays["params"] = numpy.zeros(0)
+        loaded = pointing_model.PointingModelBuie.from_arrays(arrays)
+        numpy.testing.assert_almost_equal(loaded.to_arrays()["params"], self.pm.to_arrays()["params"], 8)
+        self.assert_same_model(self.pm, loaded)
+
+    def test_legacy(self):
+        self.test_one_degree()
+        from_points = self.pm.get_from_points()
+        legacy = pointing_model.PointingModelBuie.__new__(pointing_model.PointingModelBuie)
+        legacy.__dict__.update(
+            {
+                "_PointingModelBuie__from_points": HADec(
+                    ha=[p.ha.deg for p in from_points] * u.deg, dec=[p.dec.deg for p in from_points] * u.deg
+                ),
+                "_PointingModelBuie__to_points": self.pm.to_arrays()["to"].tolist(),
+                "_PointingModelBuie__buie_vals": None,
+                "_PointingModelBuie__max_points": -1,
+            }
+        )
+        self.assert_same_model(self.pm, pointing_model.from_legacy(legacy))
+
 
 class PointingModelAffine(unittest.TestCase):
     def setUp(self):
@@ -241,12 +342,12 @@ class PointingModelAffine(unittest.TestCase):
         self.pm.add_point(sync_point, stepper_point)
         point = AltAz(alt=50 * u.deg, az=95 * u.deg)
         tpt = self.pm.transform_point(point)
-        self.assertEqual(
-            (tpt.alt.deg, tpt.az.deg), (50.80120905913654, 95.09687722671514)
+        numpy.testing.assert_almost_equal(
+            (tpt.alt.deg, tpt.az.deg), (50.80120905913654, 95.09687722671514), 10
         )
         tpt = self.pm.inverse_transform_point(tpt)
-        self.assertEqual(
-            (tpt.alt.deg, tpt.az.deg), (49.999999999999986, 94.99999999999999)
+        numpy.testing.assert_almost_equal(
+            (tpt.alt.deg, tpt.az.deg), (49.999999999999986, 94.99999999999999), 10
         )
 
     def test_one_degree(self):
@@ -263,12 +364,12 @@ class PointingModelAffine(unittest.TestCase):
         self.pm.add_point(sync_point, stepper_point)
         point = AltAz(alt=50 * u.deg, az=95 * u.deg)
         tpt = self.pm.transform_point(point)
-        self.assertEqual(
-            (tpt.alt.deg, tpt.az.deg), (50.08108010292904, 94.4534133318961)
+        numpy.testing.assert_almost_equal(
+            (tpt.alt.deg, tpt.az.deg), (50.08108010292904, 94.4534133318961), 10
         )
         tpt = self.pm.inverse_transform_point(tpt)
-        self.assertEqual(
-            (tpt.alt.deg, tpt.az.deg), (49.99999999999997, 94.99999999999999)
+        numpy.testing.assert_almost_equal(
+            (tpt.alt.deg, tpt.az.deg), (49.99999999999997, 94.99999999999999), 10
         )
 
     def test_clear(self):
@@ -276,6 +377,94 @@ class PointingModelAffine(unittest.TestCase):
         self.pm.clear()
         self.test_one_degree()
 
+    def test_affine_fit_np(self):
+        from_pts = [[0.1, 0.2], [0.5, -0.3], [-0.4, 0.6], [0.2, 0.2]]
+        to_pts = [[0.12, 0.19], [0.51, -0.28], [-0.41, 0.63], [0.21, 0.22]]
+        expected = affine_fit.affine_fit(from_pts, to_pts)
+        got = affine_fit.affine_fit_np(from_pts, to_pts)
+        for pt in [[0.0, 0.0], [0.3, -0.7]]:
+            numpy.testing.assert_almost_equal(got.Transform(pt), expected.Transform(pt), 12)
+            numpy.testing.assert_almost_equal(got.transform([pt])[0], expected.Transform(pt), 12)
+        # Collinear points
+        self.assertFalse(affine_fit.affine_fit_np([[0, 0], [1, 1], [2, 2]], [[0, 0], [1, 1], [2, 2]]))
+        self.assertFalse(affine_fit.affine_fit_np([[0, 0]], [[0, 0]]))
+
+    def test_array_points(self):
+        points = AltAz(alt=[50, 20, 75] * u.deg, az=[95, 300, 10] * u.deg)
+        # Two point nearest offsets then affine
+        for add in [self.test_two_point_unit, self.test_one_degree]:
+            self.pm.clear()
+            add()
+            tpts = self.pm.transform_point(points)
+            self.assertEqual(tpts.shape, (3,))
+            for i in range(3):
+                tpt = self.pm.transform_point(points[i])
+                numpy.testing.assert_almost_equal((tpts.alt.deg[i], tpts.az.deg[i]), (tpt.alt.deg, tpt.az.deg), 10)
+            ipts = self.pm.inverse_transform_point(tpts)
+            numpy.testing.assert_almost_equal(ipts.alt.deg, points.alt.deg, 8)
+            numpy.testing.assert_almost_equal(ipts.az.deg, points.az.deg, 8)
+
+    def assert_same_model(self, pm, loaded):
+        self.assertEqual(loaded.size(), pm.size())
+        points = AltAz(alt=[50, 20, 75] * u.deg, az=[95, 300, 10] * u.deg)
+        for transform in ["transform_point", "inverse_transform_point"]:
+            expected = getattr(pm, transform)(points)
+            got = getattr(loaded, transform)(points)
+            numpy.testing.assert_almost_equal(got.alt.deg, expected.alt.deg, 8)
+            numpy.testing.assert_almost_equal(got.az.deg, expected.az.deg, 8)
+        self.assertEqual(
+            [(p.alt.deg, p.az.deg) for p in loaded.get_from_points()],
+            [(p.alt.deg, p.az.deg) for p in pm.get_from_points()],
+        )
+
+    def test_save_load(self):
+        # Two point nearest offsets then affine
+        for add in [self.test_two_point_unit, self.test_one_degree]:
+            self.pm.clear()
+            add()
+            f = io.BytesIO()
+            pointing_model.save_model(self.pm, f)
+            f.seek(0)
+            loaded = pointing_model.load_model(f)
+            self.assertIsInstance(loaded, pointing_model.PointingModelAffine)
+            self.assert_same_model(self.pm, loaded)
+            # Points still added after load
+            loaded.add_point(AltAz(alt=40 * u.deg, az=200 * u.deg), AltAz(alt=40.5 * u.deg, az=200 * u.deg))
+            self.assertEqual(loaded.size(), self.pm.size() + 1)
+
+    def test_load_version(self):
+        f = io.BytesIO()
+        numpy.savez(f, version=numpy.array(pointing_model.MODEL_FORMAT_VERSION + 1), model=numpy.array("affine"))
+        f.seek(0)
+        self.assertRaises(ValueError, pointing_model.load_model, f)
+
+    def test_legacy(self):
+        self.test_one_degree()
+        legacy = pointing_model.PointingModelAffine.__new__(pointing_model.PointingModelAffine)
+        legacy_inverse = pointing_model.PointingModelAffine.__new__(pointing_model.PointingModelAffine)
+        from_points = self.pm.get_from_points()
+        to_points = self.pm.to_arrays()["to"]
+        sync_points = [
+            {"from_point": from_point, "to_point": SkyCoord(AltAz(alt=to[0] * u.deg, az=to[1] * u.deg))}
+            for from_point, to in zip(from_points, to_points)
+        ]
+        legacy_inverse.__dict__.update(
+            {"_PointingModelAffine__sync_points": [{"from_point": p["to_point"], "to_point": p["from_point"]}
+                                                   for p in sync_points]}
+        )
+        legacy.__dict__.update(
+            {
+                "_PointingModelAffine__sync_points": sync_points,
+                "_PointingModelAffine__max_points": -1,
+                "_PointingModelAffine__affineAll": object(),
+                "_PointingModelAffine__inverseModel": legacy_inverse,
+            }
+        )
+        loaded = pointing_model.from_legacy(legacy)
+        # Refitted on load
+        numpy.testing.assert_almost_equal(loaded.to_arrays()["matrix"], self.pm.to_arrays()["matrix"], 8)
+        self.assert_same_model(self.pm, loaded)
+
 
 if __name__ == "__main__":
     unittest.main()
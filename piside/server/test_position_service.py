@@ -0,0 +1,51 @@
+import unittest
+
+import position_service
+
+STATUS = {'tete_ra': 100.0, 'tete_dec': 20.0, 'hadec_ha': 30.0, 'hadec_dec': 20.0, 'alt': 50.0, 'az': 240.0,
+          'rs': 0.0, 'ds': 0.0}
+RA_TPD = 1000.0
+DEC_TPD = 1000.0
+
+
+class TestPositionService(unittest.TestCase):
+    def setUp(self):
+        self.service = position_service.PositionService()
+
+    def test_no_position(self):
+        self.assertIsNone(self.service.position())
+        self.service.update(dict(STATUS, tete_ra=None), RA_TPD, DEC_TPD, 40.0, now=0.0)
+        self.assertIsNone(self.service.position())
+
+    def test_stopped(self):
+        # Not moving, sky moves
+        self.service.update(STATUS, RA_TPD, DEC_TPD, 40.0, now=0.0)
+        p = self.service.position(now=1.0)
+        self.assertAlmostEqual(p['tete_ra'], 100.0 + position_service.SIDEREAL_DEG_PER_SECOND)
+        self.assertAlmostEqual(p['hadec_ha'], 30.0)
+        self.assertAlmostEqual(p['alt'], 50.0)
+        self.assertEqual(self.service.position(now=0.0)['tete_ra'], 100.0)
+
+    def test_tracking(self):
+        rs = position_service.SIDEREAL_DEG_PER_SECOND * RA_TPD
+        self.service.update(dict(STATUS, rs=rs), RA_TPD, DEC_TPD, 40.0, now=0.0)
+        p = self.service.position(now=0.5)
+        self.assertAlmostEqual(p['tete_ra'], 100.0)
+        self.assertAlmostEqual(p['hadec_ha'], 30.0 + position_service.SIDEREAL_DEG_PER_SECOND / 2)
+        # West of meridian a tracked object sets
+        self.assertLess(p['alt'], 50.0)
+
+    def test_dec_rate_and_limit(self):
+        self.service.update(dict(STATUS, ds=100.0), RA_TPD, DEC_TPD, 40.0, now=0.0)
+        self.assertAlmostEqual(self.service.position(now=1.0)['tete_dec'], 20.1)
+        self.assertAlmostEqual(self.service.position(now=100.0)['tete_dec'],
+                               20.0 + 0.1 * position_service.MAX_EXTRAPOLATION_SECONDS)
+
+    def test_altaz(self):
+        alt, az = position_service.hadec_to_altaz_deg(0.0, 0.0, 40.0)
+        self.assertAlmostEqual(alt, 50.0)
+        self.assertAlmostEqual(az, 180.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import threading
+import time
+import unittest
+
+import scheduler
+
+
+class TestScheduler(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = scheduler.Scheduler(name='test-scheduler')
+
+    def tearDown(self):
+        self.scheduler.stop()
+
+    def test_order(self):
+        calls = []
+        done = threading.Event()
+        self.scheduler.call_later(0.06, done.set)
+        self.scheduler.call_later(0.04, calls.append, 'b')
+        self.scheduler.call_later(0.02, calls.append, 'a')
+        self.assertTrue(done.wait(2))
+        self.assertEqual(calls, ['a', 'b'])
+        stats = self.scheduler.stats()
+        self.assertEqual(stats['run'], 3)
+        self.assertEqual(stats['pending'], 0)
+        self.assertGreaterEqual(stats['late_max'], stats['late_mean'])
+
+    def test_cancel(self):
+        calls = []
+        done = threading.Event()
+        handle = self.scheduler.call_later(0.02, calls.append, 'cancelled')
+        self.scheduler.call_later(0.04, done.set)
+        handle.cancel()
+        self.assertTrue(done.wait(2))
+        self.assertEqual(calls, [])
+        self.assertEqual(self.scheduler.stats()['cancelled'], 1)
+        # Cancel after run doesn't count
+        handle = self.scheduler.call_later(0, done.set)
+        time.sleep(0.05)
+        handle.cancel()
+        self.assertEqual(self.scheduler.stats()['cancelled'], 1)
+
+    def test_call_every(self):
+        calls = []
+        handle = self.scheduler.call_every(0.01, calls.append, 1)
+        time.sleep(0.1)
+        handle.cancel()
+        count = len(calls)
+        self.assertGreater(count, 3)
+        time.sleep(0.05)
+        self.assertEqual(len(calls), count)
+        self.assertEqual(self.scheduler.pending(), 0)
+
+    def test_error(self):
+        done = threading.Event()
+        self.scheduler.call_later(0, lambda: 1 / 0)
+        self.scheduler.call_later(0.01, done.set)
+        self.assertTrue(done.wait(2))
+        self.assertEqual(self.scheduler.stats()['errors'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,155 @@
+import queue
+import threading
+import time
+import unittest
+
+import serial_reader
+import stepper_control
+
+STATUS = {'rs': 12.5, 'ds': -3.25, 'rp': 1000, 'dp': -2000, 're': 5, 'de': -6, 'ri': 7, 'di': 8, 'rl': 9, 'dl': 10}
+
+
+class FakeSerial:
+    """
+    Answers writes with respond(data).
+    """
+    def __init__(self, respond):
+        self.respond = respond
+        self.written = []
+        self.incoming = queue.Queue()
+        self.timeout = 0.5
+
+    def write(self, data):
+        self.written.append(data)
+        response = self.respond(data)
+        if response:
+            self.incoming.put(response)
+
+    @property
+    def in_waiting(self):
+        return 0
+
+    def read(self, size=1):
+        try:
+            return self.incoming.get(timeout=self.timeout)
+        except queue.Empty:
+            return b''
+
+    def cancel_read(self):
+        self.incoming.put(b'')
+
+
+def line_parser():
+    class Parser:
+        buffer = b''
+
+        def feed(self, data):
+            self.buffer += data
+            lines = self.buffer.split(b'\n')
+            self.buffer = lines.pop()
+            return lines
+    return Parser()
+
+
+class TestSerialReader(unittest.TestCase):
+    def test_in_order(self):
+        ser = FakeSerial(lambda data: b'partial ' + data[:-1] + b'\nend\n')
+        reader = serial_reader.SerialReader(ser, line_parser(), lambda line: line == b'end')
+        try:
+            futures = [reader.send(b'%d\n' % i) for i in range(5)]
+            for i, future in enumerate(futures):
+                self.assertEqual(future.result(1), [b'partial %d' % i, b'end'])
+            self.assertTrue(reader.unsolicited.empty())
+        finally:
+            reader.close()
+
+    def test_unsolicited(self):
+        ser = FakeSerial(lambda data: None)
+        reader = serial_reader.SerialReader(ser, line_parser(), lambda line: True)
+        try:
+            ser.incoming.put(b'hello\n')
+            self.assertEqual(reader.unsolicited.get(timeout=1), b'hello')
+        finally:
+            reader.close()
+
+    def test_timeout_kick(self):
+        # Only answers after it gets a kick
+        ser = FakeSerial(lambda data: b'ok\n' if data == b'\r' else None)
+        reader = serial_reader.SerialReader(ser, line_parser(), lambda line: True)
+        try:
+            self.assertRaises(TimeoutError, reader.request, b'cmd', 0.05)
+            self.assertEqual(reader.request(b'cmd', 1.0, kick=b'\r', kick_after=0.05), [b'ok'])
+        finally:
+            reader.close()
+
+
+    def test_late_response(self):
+        # Answers in order like a microcontroller, slow takes longer than the timeout.
+        ser = FakeSerial(lambda data: None)
+        busy_until = [time.monotonic()]
+
+        def respond(data):
+            start = max(time.monotonic(), busy_until[0])
+            busy_until[0] = start + (0.15 if data == b'slow\n' else 0.0)
+            reply = b'reply ' + data[:-1] + b'\nend\n'
+            threading.Timer(busy_until[0] - time.monotonic(), ser.incoming.put, [reply]).start()
+        ser.respond = respond
+        reader = serial_reader.SerialReader(ser, line_parser(), lambda line: line == b'end', resync_quiet=0.3)
+        try:
+            slow = reader.send(b'slow\n')
+            queued = reader.send(b'queued\n')
+            self.assertRaises(TimeoutError, reader.wait, slow, 0.05)
+            # Everything pending fails
+            self.assertRaises(TimeoutError, reader.wait, queued, 1.0)
+            self.assertEqual(reader.request(b'next\n', 1.0), [b'reply next', b'end'])
+            self.assertEqual(reader.request(b'after\n', 1.0), [b'reply after', b'end'])
+            self.assertEqual(reader.resyncs, 1)
+        finally:
+            reader.close()
+
+    def test_resync_max(self):
+        # Port that is never quiet
+        ser = FakeSerial(lambda data: b'ok\n' if data == b'cmd\n' else None)
+        reader = serial_reader.SerialReader(ser, line_parser(), lambda line: line == b'ok', resync_quiet=0.1,
+                                            resync_max=0.3)
+        running = [True]
+
+        def stream():
+            while running[0]:
+                ser.incoming.put(b'noise\n')
+                time.sleep(0.02)
+        thread = threading.Thread(target=stream)
+        thread.start()
+        try:
+            self.assertRaises(TimeoutError, reader.request, b'none\n', 0.05)
+            start = time.monotonic()
+            self.assertEqual(reader.request(b'cmd\n', 1.0)[-1], b'ok')
+            self.assertLess(time.monotonic() - start, 0.9)
+        finally:
+            running[0] = False
+            thread.join()
+            reader.close()
+
+
+class TestResponseParser(unittest.TestCase):
+    def test_split(self):
+        parser = stepper_control.ResponseParser()
+        frame = stepper_control.encode_status_frame(3, STATUS)
+        data = b'$ qs\r\nqsb\r\n' + frame + b'$ rs:1.5 rp:10\r\n$ '
+        items = []
+        for i in range(len(data)):
+            items += parser.feed(data[i:i + 1])
+        self.assertEqual([item[0] for item in items], ['prompt', 'frame', 'prompt', 'prompt'])
+        self.assertEqual(items[1][1], (3, STATUS))
+        self.assertEqual(items[3][1].split(), ['rs:1.5', 'rp:10'])
+
+    def test_bad_frame(self):
+        parser = stepper_control.ResponseParser()
+        frame = bytearray(stepper_control.encode_status_frame(3, STATUS))
+        frame[10] ^= 0x01
+        items = parser.feed(bytes(frame) + b'$ ')
+        self.assertEqual([item[0] for item in items], ['bad_frame', 'prompt'])
+
+
+if __name__ == '__main__':
+    unittest.main()
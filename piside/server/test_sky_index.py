@@ -0,0 +1,88 @@
+import unittest
+
+import numpy
+from astropy.coordinates import angular_separation
+
+import sky_index
+
+
+def brute_separation(points, lon, lat):
+    points = numpy.array(points)
+    return numpy.degrees(angular_separation(numpy.radians(points[:, 0]), numpy.radians(points[:, 1]),
+                                            numpy.radians(lon), numpy.radians(lat)))
+
+
+class TestSkyIndex(unittest.TestCase):
+    def setUp(self):
+        self.rng = numpy.random.default_rng(3)
+        self.index = sky_index.SkyIndex()
+        self.points = []
+
+    def random_point(self):
+        return [self.rng.uniform(0.0, 360.0), numpy.degrees(numpy.arcsin(self.rng.uniform(-1.0, 1.0)))]
+
+    def check(self):
+        self.assertEqual(len(self.index), len(self.points))
+        for i in range(20):
+            lon, lat = self.random_point()
+            separation = brute_separation(self.points, lon, lat)
+            idx, sep = self.index.nearest(lon, lat)
+            self.assertEqual(idx, numpy.argmin(separation))
+            self.assertAlmostEqual(sep, numpy.min(separation), places=6)
+            expected = numpy.where(separation < 20.0)[0]
+            numpy.testing.assert_array_equal(self.index.within(lon, lat, 20.0), expected)
+
+    def test_few(self):
+        for i in range(5):
+            self.points.append(self.random_point())
+            self.index.add(*self.points[-1])
+        self.check()
+
+    def test_many(self):
+        for i in range(500):
+            self.points.append(self.random_point())
+            self.index.add(*self.points[-1])
+            if i % 7 == 0:
+                idx = int(self.rng.integers(len(self.points)))
+                self.points[idx] = self.random_point()
+                self.index.replace(idx, *self.points[idx])
+            if i % 100 == 50:
+                self.check()
+        self.check()
+        del self.points[0]
+        self.index.delete(0)
+        self.check()
+        self.index.clear()
+        self.assertEqual(len(self.index), 0)
+
+    def test_set(self):
+        for count in [5, 300]:
+            self.points = [self.random_point() for i in range(count)]
+            self.index.set(numpy.array([p[0] for p in self.points]), numpy.array([p[1] for p in self.points]))
+            self.assertEqual(len(self.index), count)
+            self.check()
+            # Still takes more points
+            self.points.append(self.random_point())
+            self.index.add(*self.points[-1])
+            self.check()
+
+    def test_array_nearest(self):
+        for i in range(100):
+            self.points.append(self.random_point())
+            self.index.add(*self.points[-1])
+        lon = numpy.array([[10.0, 200.0], [359.9, 0.1]])
+        lat = numpy.array([[-80.0, 5.0], [45.0, 45.0]])
+        idx, sep = self.index.nearest(lon, lat)
+        self.assertEqual(idx.shape, (2, 2))
+        for i in numpy.ndindex(lon.shape):
+            self.assertEqual(idx[i], self.index.nearest(lon[i], lat[i])[0])
+            self.assertAlmostEqual(sep[i], numpy.min(brute_separation(self.points, lon[i], lat[i])), places=6)
+
+    def test_empty(self):
+        self.assertEqual(len(self.index.within(10.0, 10.0, 5.0)), 0)
+        with self.assertRaises(ValueError):
+            self.index.nearest(10.0, 10.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,7 @@
 import unittest
 
 import astropy.units as u
+import numpy
 import pendulum
 from astropy.coordinates import EarthLocation, ICRS, AltAz, TETE
 from astropy.time import Time as AstroTime
@@ -9,6 +10,7 @@ from astropy.units import si as usi
 import pointing_model
 import settings
 import skyconv
+import skyconv_hadec
 from skyconv_hadec import HADec
 
 # 38d23m48.8s  95d14m31.2s
@@ -308,6 +310,122 @@ class TestSkyConv(unittest.TestCase):
         r = skyconv._clean_deg(20.0, False)
         self.assertEqual(r, 20.0)
 
+    def test_clean_deg_array(self):
+        r, pole_count = skyconv._clean_deg([91.0, -91.0, -190.0, 190.0, 390.0, 20.0], True)
+        for a, b in zip(r, [89.0, -89.0, 10.0, -10.0, 30.0, 20.0]):
+            self.assertAlmostEqual(a, b)
+        self.assertEqual(list(pole_count), [1, 1, 1, 1, 2, 0])
+        r = skyconv._clean_deg([390.0, -390.0, 20.0, 360.0])
+        for a, b in zip(r, [30.0, 330.0, 20.0, 360.0]):
+            self.assertAlmostEqual(a, b)
+
+    def test_ha_delta_deg_array(self):
+        r = skyconv._ha_delta_deg([359.0, 359.0, 90.0, -20.0], [370.0, -5.0, 92.0, -5.0])
+        for a, b in zip(r, [11.0, -4.0, 2.0, 15.0]):
+            self.assertAlmostEqual(a, b)
+
+    def test_to_steps_array(self):
+        settings.runtime_settings['sync_info'] = {'coord': m75_hadec, 'steps': {'ha': 0, 'dec': 0}}
+        settings.settings['ra_ticks_per_degree'] = 450
+        settings.settings['dec_ticks_per_degree'] = 200
+        settings.settings['pointing_model'] = 'single'
+        skyconv.model_real_stepper = pointing_model.PointingModelBuie()
+        frame_args = skyconv.get_frame_init_args('hadec', frame_copy=m75_hadec)
+        hadec = HADec(ha=(m75_hadec.ha.deg + numpy.array([1.0, -2.0, 20.0])) * u.deg,
+                      dec=(m75_hadec.dec.deg + numpy.array([1.0, 3.0, -5.0])) * u.deg, **frame_args)
+        steps = skyconv.to_steps(hadec)
+        for a, b in zip(steps['ha'], [450, -900, 9000]):
+            self.assertAlmostEqual(a, b, places=6)
+        for a, b in zip(steps['dec'], [200, 600, -1000]):
+            self.assertAlmostEqual(a, b, places=6)
+
+        altaz = AltAz(alt=[m75_altaz.alt.deg, ngc722_altaz.alt.deg] * u.deg,
+                      az=[m75_altaz.az.deg, ngc722_altaz.az.deg] * u.deg,
+                      **skyconv.get_frame_init_args('altaz', obstime=obstime))
+        steps = skyconv.to_steps(altaz)
+        for i, coord in enumerate([m75_altaz, ngc722_altaz]):
+            scalar_steps = skyconv.to_steps(coord)
+            self.assertAlmostEqual(steps['ha'][i], scalar_steps['ha'], places=1)
+            self.assertAlmostEqual(steps['dec'][i], scalar_steps['dec'], places=1)
+
+    def test_steps_to_coord_array(self):
+        settings.runtime_settings['sync_info'] = {'coord': m75_hadec, 'steps': {'ha': 0, 'dec': 0}}
+        settings.settings['ra_ticks_per_degree'] = 450
+        settings.settings['dec_ticks_per_degree'] = 200
+        settings.settings['pointing_model'] = 'single'
+        skyconv.model_real_stepper = pointing_model.PointingModelBuie()
+        coord = skyconv.steps_to_coord({'ha': [450, 900], 'dec': [200, -400]}, frame='hadec', obstime=obstime)
+        self.assertAlmostEqual(coord.ha.deg[0], m75_hadec.ha.deg + 1.0)
+        self.assertAlmostEqual(coord.dec.deg[1], m75_hadec.dec.deg - 2.0)
+        coord = skyconv.steps_to_coord({'ha': [0, 450], 'dec': [0, 200]}, frame='icrs', obstime=obstime)
+        self.assertAlmostEqual(coord.ra.deg[0], m75_icrs.ra.deg, places=ALMOST_PLACES)
+        self.assertAlmostEqual(coord.dec.deg[0], m75_icrs.dec.deg, places=ALMOST_PLACES)
+
+    def test_fast_icrs_to_hadec(self):
+        context = skyconv.FastContext(obstime=obstime)
+        ha, dec = skyconv.fast_icrs_to_hadec([m75_icrs.ra.deg, ngc722_icrs.ra.deg],
+                                             [m75_icrs.dec.deg, ngc722_icrs.dec.deg], context=context)
+        self.assertAlmostEqual(ha[0], m75_hadec.ha.deg, places=ALMOST_PLACES)
+        self.assertAlmostEqual(dec[0], m75_hadec.dec.deg, places=ALMOST_PLACES)
+        self.assertAlmostEqual(ha[1], ngc722_hadec.ha.deg, places=ALMOST_PLACES)
+        self.assertAlmostEqual(dec[1], ngc722_hadec.dec.deg, places=ALMOST_PLACES)
+
+    def test_fast_icrs_to_altaz(self):
+        context = skyconv.FastContext(obstime=obstime)
+        alt, az = skyconv.fast_icrs_to_altaz([m75_icrs.ra.deg, ngc722_icrs.ra.deg],
+                                             [m75_icrs.dec.deg, ngc722_icrs.dec.deg], context=context)
+        self.assertAlmostEqual(alt[0], m75_altaz.alt.deg, places=ALMOST_PLACES)
+        self.assertAlmostEqual(az[0], m75_altaz.az.deg, places=ALMOST_PLACES)
+        self.assertAlmostEqual(alt[1], ngc722_altaz.alt.deg, places=ALMOST_PLACES)
+        self.assertAlmostEqual(az[1], ngc722_altaz.az.deg, places=ALMOST_PLACES)
+
+    def test_fast_icrs_to_tete(self):
+        ra, dec = skyconv.fast_icrs_to_tete(m75_icrs.ra.deg, m75_icrs.dec.deg, obstime=obstime)
+        self.assertAlmostEqual(float(ra), m75_tete.ra.deg, places=ALMOST_PLACES)
+        self.assertAlmostEqual(float(dec), m75_tete.dec.deg, places=ALMOST_PLACES)
+
+    def test_fast_to_icrs(self):
+        context = skyconv.FastContext(obstime=obstime)
+        for icrs, tete, altaz, hadec in [(m75_icrs, m75_tete, m75_altaz, m75_hadec),
+                                         (ngc722_icrs, ngc722_tete, ngc722_altaz, ngc722_hadec)]:
+            for ra, dec in [skyconv.fast_hadec_to_icrs(hadec.ha.deg, hadec.dec.deg, context=context),
+                            skyconv.fast_altaz_to_icrs(altaz.alt.deg, altaz.az.deg, context=context),
+                            skyconv.fast_tete_to_icrs(tete.ra.deg, tete.dec.deg, context=context)]:
+                self.assertAlmostEqual(float(ra), icrs.ra.deg, places=ALMOST_PLACES)
+                self.assertAlmostEqual(float(dec), icrs.dec.deg, places=ALMOST_PLACES)
+
+    def test_fast_hadec_altaz(self):
+        context = skyconv.FastContext(obstime=obstime)
+        alt, az = skyconv.fast_hadec_to_altaz(ngc722_hadec.ha.deg, ngc722_hadec.dec.deg, context=context)
+        self.assertAlmostEqual(float(alt), ngc722_altaz.alt.deg, places=ALMOST_PLACES)
+        self.assertAlmostEqual(float(az), ngc722_altaz.az.deg, places=ALMOST_PLACES)
+        ha, dec = skyconv.fast_altaz_to_hadec(m75_altaz.alt.deg, m75_altaz.az.deg, context=context)
+        self.assertAlmostEqual(float(ha), m75_hadec.ha.deg, places=ALMOST_PLACES)
+        self.assertAlmostEqual(float(dec), m75_hadec.dec.deg, places=ALMOST_PLACES)
+
+    def test_apco_cache(self):
+        skyconv_hadec.clear_apco_cache()
+        hits = skyconv_hadec.apco_cache_stats['hits']
+        later = obstime + 0.4 * u.s
+        a = skyconv_hadec.apco_args(obstime, el)
+        b = skyconv_hadec.apco_args(later, el)
+        self.assertEqual(skyconv_hadec.apco_cache_stats['hits'], hits + 1)
+        uncached = skyconv_hadec._apco_args(later, el)
+        self.assertAlmostEqual(float(b['eral']), float(uncached['eral']), places=12)
+        self.assertNotAlmostEqual(float(a['eral']), float(b['eral']), places=7)
+        ha, dec = skyconv.fast_icrs_to_hadec(m75_icrs.ra.deg, m75_icrs.dec.deg, obstime=obstime)
+        self.assertAlmostEqual(float(ha), m75_hadec.ha.deg, places=ALMOST_PLACES)
+        self.assertAlmostEqual(float(dec), m75_hadec.dec.deg, places=ALMOST_PLACES)
+
+    def test_apco_cache_eviction(self):
+        skyconv_hadec.set_apco_cache(max_entries=2)
+        try:
+            for i in range(4):
+                skyconv_hadec.apco_args(obstime + i * 10 * u.s, el)
+            self.assertEqual(len(skyconv_hadec._apco_cache), 2)
+        finally:
+            skyconv_hadec.set_apco_cache(max_entries=16)
+
     def test_earth_location_to_pressure(self):
         p = skyconv._earth_location_to_pressure(el).to_value(usi.Pa)
         self.assertAlmostEqual(p, 98170.13549856932)
@@ -0,0 +1,72 @@
+import json
+import threading
+import time
+import unittest
+
+import status_stream
+
+
+def parse_event(event):
+    for line in event.splitlines():
+        if line.startswith('data: '):
+            return json.loads(line[len('data: '):])
+    return None
+
+
+class TestStatusStream(unittest.TestCase):
+    def setUp(self):
+        self.stream = status_stream.StatusStream()
+
+    def test_publish_unchanged(self):
+        self.stream.publish({'a': 1})
+        version, status = self.stream.snapshot()
+        self.stream.publish({'a': 1})
+        self.assertEqual(self.stream.snapshot()[0], version)
+        self.stream.publish({'a': 2})
+        self.assertEqual(self.stream.snapshot()[0], version + 1)
+
+    def test_delta(self):
+        self.stream.publish({'a': 1, 'b': 2, 'alert': 'x'})
+        version, status = self.stream.snapshot()
+        self.stream.publish({'a': 1, 'b': 3})
+        data, new_version, new_status = self.stream.delta(version, status)
+        self.assertEqual(json.loads(data), {'full': False, 'status': {'b': 3}, 'removed': ['alert']})
+        # Shared by other clients at same version
+        data2, new_version2, new_status2 = self.stream.delta(version, status)
+        self.assertIs(data, data2)
+
+    def test_events(self):
+        status_stream.MIN_INTERVAL = 0.05
+        self.stream.publish({'a': 1, 'b': 2})
+        events = self.stream.events(interval=0.05)
+        first = parse_event(next(events))
+        self.assertTrue(first['full'])
+        self.assertEqual(first['status'], {'a': 1, 'b': 2})
+
+        def later():
+            time.sleep(0.1)
+            self.stream.publish({'a': 1, 'b': 5})
+
+        threading.Thread(target=later).start()
+        second = parse_event(next(events))
+        self.assertFalse(second['full'])
+        self.assertEqual(second['status'], {'b': 5})
+
+    def test_rate_limit(self):
+        status_stream.MIN_INTERVAL = 0.05
+        self.stream.publish({'a': 0})
+        events = self.stream.events(interval=0.3)
+        next(events)
+        start = time.time()
+        for i in range(1, 4):
+            self.stream.publish({'a': i})
+        event = parse_event(next(events))
+        self.assertGreaterEqual(time.time() - start, 0.25)
+        self.assertEqual(event['status'], {'a': 3})
+
+    def tearDown(self):
+        status_stream.MIN_INTERVAL = 0.25
+
+
+if __name__ == '__main__':
+    unittest.main()
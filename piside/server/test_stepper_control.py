@@ -0,0 +1,273 @@
+import threading
+import time
+import unittest
+
+import stepper_control
+from test_serial_reader import FakeSerial
+
+STATUS = {'rs': 12.5, 'ds': -3.25, 'rp': 1000, 'dp': -2000, 're': 5, 'de': -6, 'ri': 7, 'di': 8, 'rl': 9, 'dl': 10}
+
+
+class TestStatusFrame(unittest.TestCase):
+    def test_round_trip(self):
+        frame = stepper_control.encode_status_frame(42, STATUS)
+        self.assertEqual(len(frame), stepper_control.STATUS_FRAME_SIZE)
+        seq, status = stepper_control.decode_status_frame(frame)
+        self.assertEqual(seq, 42)
+        self.assertEqual(status, STATUS)
+
+    def test_bad_checksum(self):
+        frame = bytearray(stepper_control.encode_status_frame(1, STATUS))
+        frame[10] ^= 0x01
+        self.assertIsNone(stepper_control.decode_status_frame(bytes(frame)))
+        self.assertIsNone(stepper_control.decode_status_frame(b'Commands:\r\n'))
+
+    def test_fletcher16(self):
+        self.assertEqual(stepper_control.fletcher16(b'abcde'), 0xC8F0)
+
+    def test_streamed(self):
+        parser = stepper_control.ResponseParser()
+        data = b'$ \xa5junk' + stepper_control.encode_status_frame(1, STATUS) + b'$ ' + \
+            stepper_control.encode_status_frame(2, STATUS)
+        items = parser.feed(data[:30])
+        items += parser.feed(data[30:])
+        self.assertEqual([item[0] for item in items], ['prompt', 'frame', 'prompt', 'frame'])
+        self.assertEqual([items[1][1][0], items[3][1][0]], [1, 2])
+        self.assertEqual(parser.buffer, b'')
+
+
+class TestStatusCache(unittest.TestCase):
+    def setUp(self):
+        self.calls = 0
+
+    def fetch(self):
+        self.calls += 1
+        time.sleep(0.05)
+        return dict(STATUS, rp=self.calls)
+
+    def test_max_age(self):
+        cache = stepper_control.StatusCache(self.fetch, max_age=10)
+        self.assertEqual(cache.get()['rp'], 1)
+        status = cache.get()
+        self.assertEqual(status['rp'], 1)
+        # Callers get copies
+        status['rp'] = 100
+        self.assertEqual(cache.get()['rp'], 1)
+        self.assertEqual(cache.get(max_age=0)['rp'], 2)
+        cache.invalidate()
+        self.assertEqual(cache.get()['rp'], 3)
+        self.assertEqual(cache.stats(), {'hits': 2, 'misses': 3, 'coalesced': 0, 'pushed': 0})
+
+    def test_put(self):
+        cache = stepper_control.StatusCache(self.fetch, max_age=10)
+        cache.put(dict(STATUS, rp=-1))
+        self.assertEqual(cache.get()['rp'], -1)
+        self.assertEqual(self.calls, 0)
+        cache.invalidate()
+        self.assertEqual(cache.get()['rp'], 1)
+        self.assertEqual(cache.stats()['pushed'], 1)
+
+    def test_single_flight(self):
+        cache = stepper_control.StatusCache(self.fetch, max_age=0)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get())) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(results), 8)
+        # Those that waited share the read that was in progress
+        self.assertLess(self.calls, 8)
+        stats = cache.stats()
+        self.assertEqual(stats['misses'], self.calls)
+        self.assertEqual(stats['misses'] + stats['coalesced'], 8)
+
+    def test_fetch_error(self):
+        def bad_fetch():
+            raise ValueError('bad')
+        cache = stepper_control.StatusCache(bad_fetch)
+        self.assertRaises(ValueError, cache.get)
+        cache.fetch = self.fetch
+        self.assertEqual(cache.get()['rp'], 1)
+
+
+class TestStatusStream(unittest.TestCase):
+    def setUp(self):
+        self.ser = FakeSerial(self.respond)
+        self.serial_class = stepper_control.serial.Serial
+        stepper_control.serial.Serial = lambda port, baud, timeout: self.ser
+        self.stepper = stepper_control.StepperControl('fake', 115200, status_max_age=10)
+
+    def tearDown(self):
+        stepper_control.serial.Serial = self.serial_class
+        self.stepper.reader.close()
+
+    def respond(self, data):
+        if data == b'qsb\r':
+            return stepper_control.encode_status_frame(1, STATUS) + b'$ '
+        return b'$ '
+
+    def test_stream(self):
+        self.assertTrue(self.stepper.start_status_stream(20))
+        self.assertEqual(self.ser.written, [b'qsb\r', b'qs_stream 20\r'])
+        self.ser.incoming.put(stepper_control.encode_status_frame(7, dict(STATUS, rp=5)))
+        for i in range(100):
+            if self.stepper.status_cache.stats()['pushed']:
+                break
+            time.sleep(0.01)
+        # Pushed frame is used without reading
+        self.assertEqual(self.stepper.get_status()['rp'], 5)
+        self.assertEqual(self.stepper.last_status_seq, 7)
+        self.assertEqual(len(self.ser.written), 2)
+
+
+class TestStatusRead(unittest.TestCase):
+    def setUp(self):
+        self.serial_class = stepper_control.serial.Serial
+        self.stepper = None
+
+    def tearDown(self):
+        stepper_control.serial.Serial = self.serial_class
+        if self.stepper:
+            self.stepper.reader.close()
+
+    def start(self, respond):
+        ser = FakeSerial(respond)
+        stepper_control.serial.Serial = lambda port, baud, timeout: ser
+        self.stepper = stepper_control.StepperControl('fake', 115200)
+        return self.stepper
+
+    def test_misaligned(self):
+        replies = [b'$ ' + stepper_control.encode_status_frame(1, STATUS) + b'$ ']
+
+        def respond(data):
+            if data == b'qsb\r':
+                # Late prompt of an earlier command comes first once
+                return replies.pop() if replies else stepper_control.encode_status_frame(2, STATUS) + b'$ '
+        stepper = self.start(respond)
+        self.assertEqual(stepper.get_status(0), STATUS)
+        self.assertTrue(stepper.binary_status)
+        self.assertEqual(stepper.last_status_seq, 2)
+        self.assertEqual(stepper.reader.resyncs, 1)
+
+    def test_old_firmware(self):
+        def respond(data):
+            if data == b'qsb\r':
+                return b'Commands:\r\n  set_var [variable_name] [value] Sets variable\r\n$ '
+            if data == b'qs\r':
+                return b'rs:1.5 rp:10\r\n$ '
+        stepper = self.start(respond)
+        self.assertEqual(stepper.get_status(0), {'rs': 1.5, 'rp': 10.0})
+        self.assertFalse(stepper.binary_status)
+        self.assertEqual(stepper.reader.resyncs, 0)
+
+
+class FakeMicro:
+    """
+    Answers commands in order after delay seconds each, like the microcontroller with a slow link.
+    """
+    def __init__(self, delay=0.005, slow=None, slow_delay=0.0):
+        self.ser = FakeSerial(self.respond)
+        self.delay = delay
+        self.slow = slow
+        self.slow_delay = slow_delay
+        self.busy_until = time.monotonic()
+        self.lock = threading.Lock()
+        self.unanswered = 0
+        self.max_unanswered = 0
+        self.answered = []
+
+    def respond(self, data):
+        command = data.decode().strip()
+        if not command:
+            return None
+        with self.lock:
+            self.unanswered += 1
+            self.max_unanswered = max(self.max_unanswered, self.unanswered)
+            delay = self.slow_delay if self.slow and self.slow in command else self.delay
+            self.busy_until = max(time.monotonic(), self.busy_until) + delay
+            wait = self.busy_until - time.monotonic()
+        if command == 'qsb':
+            reply = stepper_control.encode_status_frame(1, STATUS) + b'$ '
+        else:
+            reply = command.encode() + b'\r\n$ '
+        threading.Timer(wait, self.answer, [command, reply]).start()
+        return None
+
+    def answer(self, command, reply):
+        with self.lock:
+            self.unanswered -= 1
+            self.answered.append(command)
+        self.ser.incoming.put(reply)
+
+
+class TestUpdateSettings(unittest.TestCase):
+    def setUp(self):
+        self.serial_class = stepper_control.serial.Serial
+        self.command_timeout = stepper_control.COMMAND_TIMEOUT
+        self.stepper = None
+
+    def tearDown(self):
+        stepper_control.serial.Serial = self.serial_class
+        stepper_control.COMMAND_TIMEOUT = self.command_timeout
+        if self.stepper:
+            self.stepper.reader.close()
+
+    def start(self, micro):
+        stepper_control.serial.Serial = lambda port, baud, timeout: micro.ser
+        self.stepper = stepper_control.StepperControl('fake', 115200)
+        return self.stepper
+
+    def settings(self):
+        return {'ra_max_tps': 1000.0, 'ra_guide_rate': 0.5, 'ra_direction': 1.0, 'dec_max_tps': 900.0,
+                'dec_guide_rate': 0.25, 'dec_direction': -1.0, 'ra_accel_tpss': 100.0, 'dec_accel_tpss': 110.0}
+
+    def test_order(self):
+        micro = FakeMicro(delay=0.05)
+        stepper = self.start(micro)
+        stepper.update_settings(self.settings())
+        expected = ['set_var %s %f' % item for item in self.settings().items()]
+        self.assertEqual(micro.answered, expected)
+        self.assertEqual([w.decode().strip() for w in micro.ser.written], expected)
+        # Pipelined, all sent before the first prompt
+        self.assertEqual(micro.max_unanswered, len(expected))
+        # Link still lined up
+        self.assertEqual(stepper.get_status(0), STATUS)
+
+    def test_window(self):
+        micro = FakeMicro(delay=0.05)
+        stepper = self.start(micro)
+        stepper.update_settings(self.settings(), window=3)
+        self.assertEqual(micro.max_unanswered, 3)
+        self.assertEqual(len(micro.answered), len(self.settings()))
+        stepper.update_settings(self.settings(), window=1)
+        self.assertEqual(micro.max_unanswered, 3)
+        self.assertEqual(stepper.get_status(0), STATUS)
+
+    def test_timeout(self):
+        stepper_control.COMMAND_TIMEOUT = 0.2
+        # Prompts of dec_max_tps and everything after it come late
+        micro = FakeMicro(slow='dec_max_tps', slow_delay=0.3)
+        stepper = self.start(micro)
+        self.assertRaises(TimeoutError, stepper.update_settings, self.settings(), 3)
+        # Waited on dec_max_tps with the window full behind it
+        commands = [w for w in micro.ser.written if w.strip()]
+        self.assertEqual(len(commands), 6)
+        # Late prompts are dropped, next command gets its own response.
+        self.assertEqual(stepper.get_status(0), STATUS)
+        self.assertEqual(stepper.reader.resyncs, 1)
+        self.assertTrue(stepper.binary_status)
+
+    def test_error(self):
+        micro = FakeMicro(delay=0.05)
+        stepper = self.start(micro)
+        settings = self.settings()
+        settings['ra_direction'] = 'bad'
+        # Fails sending the third with two in flight
+        self.assertRaises(TypeError, stepper.update_settings, settings)
+        self.assertEqual(stepper.reader.resyncs, 1)
+        self.assertEqual(stepper.get_status(0), STATUS)
+
+
+if __name__ == '__main__':
+    unittest.main()
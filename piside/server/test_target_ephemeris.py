@@ -0,0 +1,66 @@
+import unittest
+
+import astropy.units as u
+import pendulum
+from astropy.coordinates import EarthLocation, ICRS
+from astropy.time import Time as AstroTime
+
+import db
+import pointing_model
+import settings
+import skyconv
+from skyconv_hadec import HADec
+from target_ephemeris import TargetEphemeris
+
+el = EarthLocation(lat=38.9369 * u.deg, lon=-95.242 * u.deg, height=266.0 * u.m)
+settings.runtime_settings['earth_location'] = el
+obstime = AstroTime(pendulum.parse("2019-07-18T05:35:23.053Z"))
+m75_icrs = ICRS(ra=301.52017083 * u.deg, dec=-21.92226111 * u.deg)
+m75_hadec = HADec(ha=342.54699618235094 * u.deg, dec=-21.835812539832737 * u.deg,
+                  **(skyconv.get_frame_init_args('hadec', obstime=obstime)))
+
+
+class TestTargetEphemeris(unittest.TestCase):
+    def setUp(self):
+        settings.runtime_settings['earth_location'] = el
+        settings.runtime_settings['sync_info'] = {'coord': m75_hadec, 'steps': {'ha': 0, 'dec': 0}}
+        settings.settings['ra_ticks_per_degree'] = 450
+        settings.settings['dec_ticks_per_degree'] = 200
+        settings.settings['pointing_model'] = 'single'
+        skyconv.model_real_stepper = pointing_model.PointingModelBuie()
+
+    def assert_matches(self, ephemeris, coord_at, offset):
+        sample_time = obstime + offset * u.s
+        expected = skyconv.fast_to_steps(coord_at(sample_time), obstime=sample_time)
+        got = ephemeris.steps(ephemeris.start + offset)
+        # Within a tenth of a step
+        self.assertAlmostEqual(got['ha'], expected['ha'], delta=0.1)
+        self.assertAlmostEqual(got['dec'], expected['dec'], delta=0.1)
+
+    def test_fixed(self):
+        ephemeris = TargetEphemeris.fixed({'ha': 100.0, 'dec': -50.0})
+        self.assertEqual(ephemeris.steps(ephemeris.start + 1000.0), {'ha': 100.0, 'dec': -50.0})
+        self.assertEqual(ephemeris.velocity(), {'ha': 0.0, 'dec': 0.0})
+
+    def test_sky_fixed(self):
+        ephemeris = TargetEphemeris.from_coord(m75_icrs, obstime=obstime)
+        for offset in [0.0, 17.3, 71.0, 123.4, 180.0]:
+            self.assert_matches(ephemeris, lambda t: m75_icrs, offset)
+        # HA steps move at about sidereal rate
+        velocity = ephemeris.velocity(ephemeris.start + 30.0)
+        self.assertAlmostEqual(velocity['ha'], 450 * 360.0 / 86164.0905, delta=0.05)
+        self.assertAlmostEqual(velocity['dec'], 0.0, delta=0.05)
+
+    def test_planet(self):
+        def moon_at(t):
+            return db.planet_coord('moon', t, el)
+
+        ephemeris = TargetEphemeris.from_coord(moon_at, obstime=obstime)
+        for offset in [0.0, 45.5, 99.9, 160.0]:
+            self.assert_matches(ephemeris, moon_at, offset)
+        # Moon moves against the stars, in Dec too.
+        self.assertGreater(abs(ephemeris.velocity()['dec']), 0.001)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,4 +1,5 @@
 import serial
+import struct
 import time
 import sys
 
@@ -35,6 +36,9 @@ configvars = {
 }
 
 
+status_stream = {'interval': 0, 'last': 0, 'seq': 0}
+
+
 def swrite(str):
     serialcom.write(str.encode())
 
@@ -50,10 +54,12 @@ def print_prompt():
 def command_set_var(args):
     if len(args) < 1:
         swrite("ERROR: Missing [variable_name] argument.\r")
+        print_prompt()
         return
 
     if len(args) < 2:
         swrite("ERROR: Missing [value] argument.\r")
+        print_prompt()
         return
     arg_name = args[0]
     arg_val = args[1]
@@ -66,9 +72,7 @@ def command_set_var(args):
         else:
             configvars[arg_name] = value
     else:
-        serialcom.write("ERROR: Invalid variable name '".encode())
-        serialcom.write(arg_name.encode())
-        serialcom.write.println("'\r".encode())
+        swrite("ERROR: Invalid variable name '" + arg_name + "'\r")
 
     print_prompt()
 
@@ -96,6 +100,48 @@ def command_qs(args):
     print_prompt()
 
 
+def fletcher16(data):
+    sum1 = 0
+    sum2 = 0
+    for b in data:
+        sum1 = (sum1 + b) % 255
+        sum2 = (sum2 + sum1) % 255
+    return (sum2 << 8) | sum1
+
+
+def write_status_frame():
+    rap = round(getRAPosition())
+    decp = round(getDECPosition())
+    # TODO: Simulate encoder better
+    body = struct.pack('<H2f8i', status_stream['seq'], getRASpeed(), getDECSpeed(), rap, decp, 0, 0, rap, decp,
+                       0, 0)
+    status_stream['seq'] = (status_stream['seq'] + 1) & 0xFFFF
+    length_body = bytes([len(body)]) + body
+    serialcom.write(b'\xa5\x5a' + length_body + struct.pack('<H', fletcher16(length_body)))
+
+
+def command_qsb(args):
+    write_status_frame()
+    print_prompt()
+
+
+def command_qs_stream(args):
+    if len(args) < 1:
+        swrite("ERROR: Missing [ms] argument.\r")
+        print_prompt()
+        return
+    status_stream['interval'] = int(float(args[0]))
+    status_stream['last'] = millis()
+    print_prompt()
+
+
+def run_status_stream():
+    if status_stream['interval'] > 0 and millis() - status_stream['last'] >= status_stream['interval']:
+        status_stream['last'] = millis()
+        run_steppers()
+        write_status_frame()
+
+
 def command_status(args):
     swrite("ra_max_tps=")
     swrite("%.7f\r" % configvars['ra_max_tps'])
@@ -230,6 +276,8 @@ def command_help(args):
     swrite("  autoguide_enable             Enables Autoguiding prot input\r")
     swrite("  status                       Shows status/variable info\r")
     swrite("  qs                           Shows speed/position info\r")
+    swrite("  qsb                          Binary speed/position frame\r")
+    swrite("  qs_stream [ms]               Push qsb frames every ms, 0 stops\r")
     swrite("  help                         This help info\r")
     print_prompt()
 
@@ -280,13 +328,22 @@ def main(sport):
     cmd_funcs = {'set_var': command_set_var, 'ra_set_speed': command_ra_set_speed,
                  'dec_set_speed': command_dec_set_speed,
                  'autoguide_disable': command_autoguide_disable, 'autoguide_enable': command_autoguide_enable,
-                 'status': command_status, 'qs': command_qs, 'help': command_help}
-    serialcom = serial.Serial(port=sport, baudrate=115200)
+                 'status': command_status, 'qs': command_qs, 'qsb': command_qsb,
+                 'qs_stream': command_qs_stream, 'help': command_help}
+    # Timeout so status stream frames still go out when no commands come in
+    serialcom = serial.Serial(port=sport, baudrate=115200, timeout=0.005)
     line = b''
     while True:
         # while serialcom.in_waiting > 0:
         c = serialcom.read(1)
+        run_status_stream()
+        if not c:
+            continue
         if c == b'\r' or c == b'\n':
+            # Like the firmware, empty lines get no answer.
+            if not line.strip():
+                line = b''
+                continue
             run_steppers()
             line = line.decode()
             line_split = line.split(' ')